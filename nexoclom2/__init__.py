@@ -4,21 +4,47 @@ Documentation will be online at readthedocs.org"""
 from nexoclom2 import __path__
 path = __path__[0]
 import os
-from importlib.metadata import version
-from nexoclom2.initial_state.Input import Input
-from nexoclom2.particle_tracking.Output import Output
-# from nexoclom2.data_simulation.LOSResult import LOSResult
-# from nexoclom2.data_simulation.LOSResultFitted import LOSResultFitted
-from nexoclom2.data_simulation.ModelImage import ModelImage
-from nexoclom2.solarsystem.SSObject import SSObject
-from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
-
-
-config = NexoclomConfig()
-if not os.path.exists(config.savepath):
-    os.makedirs(config.savepath)
- 
+import importlib
+
+# Classes available from the top level and the modules they are in. They are
+# imported the first time they are used, so importing nexoclom2 (e.g., for
+# path, or in a worker process) does not import the whole package.
+_lazy = {'Input': 'nexoclom2.initial_state.Input',
+         'Output': 'nexoclom2.particle_tracking.Output',
+         # 'LOSResult': 'nexoclom2.data_simulation.LOSResult',
+         # 'LOSResultFitted': 'nexoclom2.data_simulation.LOSResultFitted',
+         'ModelImage': 'nexoclom2.data_simulation.ModelImage',
+         'SSObject': 'nexoclom2.solarsystem.SSObject',
+         'NexoclomConfig': 'nexoclom2.utilities.NexoclomConfig'}
+
+__all__ = ['path', 'config'] + list(_lazy.keys())
+
+
+def __getattr__(name):
+    if name in _lazy:
+        value = getattr(importlib.import_module(_lazy[name]), name)
+    elif name == 'config':
+        # Read the configuration file when it is first needed
+        from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
+        value = NexoclomConfig()
+        if not os.path.exists(value.savepath):
+            os.makedirs(value.savepath)
+        else:
+            pass
+    elif name == '__version__':
+        from importlib.metadata import version
+        value = version('nexoclom2')
+    else:
+        raise AttributeError(f"module 'nexoclom2' has no attribute '{name}'")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__) | {'__version__'})
+
+
 __name__ = 'nexoclom2'
 __author__ = 'Matthew Burger'
 __email__ = 'mburger@stsci.edu'
-__version__ = version("nexoclom2")
@@ -1,10 +1,8 @@
-import os
+from functools import cached_property
 import numpy as np
 import periodictable as pt
-import pickle
 import astropy.units as u
-from astropy.table import QTable
-from nexoclom2 import path
+from nexoclom2.atomicdata.atomic_data_store import read_photorates
 from nexoclom2.atomicdata.eimp_emission_coef import EImpEmissionCoef
 from nexoclom2.atomicdata.eimp_ionization_coef import EimpIonizationCoef
 from nexoclom2.atomicdata.charge_exchange import load_charge_exchange
@@ -62,54 +60,70 @@ class Atom:
     
     eimp_emission: nexoclom2 EimpEmissionCoef object
     """
+    # Attributes of each species, set up once per process. The atomic data
+    # tables are shared by all Atoms of a species and are read from the
+    # atomic data store the first time they are used.
+    _registry = {}
+    
     def __init__(self, species: str):
-        charge = species.count('+') - species.count('-')
-        spec = species.replace('+', '')
-        
-        self._atom = pt.__dict__[spec]
-        self.charge = charge
-        self.symbol = self._atom.symbol + '+'*self.charge
-        self.name = self._atom.name + '+'*self.charge
-        self.number = self._atom.number
-        self.mass = self._atom.mass * u.u
-        
-        # g-values
-        self.gvalues = gValue(self.symbol)
-        
-        # Photoionization
-        photofile = os.path.join(path, 'data', 'photorates.ecsv')
-        photorates = QTable.read(photofile)
-        sub = photorates[photorates['species'] == self.symbol]
-        
-        if len(sub) > 0:
-            self.photo_rate = np.sum(sub['rate'])
-            self.photo_reactions = [(str(row['reaction']), row['rate'])
-                                    for row in sub]
-        else:
-            self.photo_rate = 1e-30*u.s
-            self.photo_reactions = None
-        self.photo_refpt = 1*u.au
-        
-        # Load electron impact excitation cross sections
-        
-        # electron impact excitation rate coefs
-        self.eimp_ionization = EimpIonizationCoef(self)
-        
-        if self.gvalues.wavelengths != (0*u.AA, ):
-            waves = list(self.gvalues.wavelengths)
+        if species in Atom._registry:
+            self.__dict__.update(Atom._registry[species])
         else:
-            waves = []
+            charge = species.count('+') - species.count('-')
+            spec = species.replace('+', '')
             
-        self.eimp_emission = EImpEmissionCoef(self)
-        if self.eimp_emission.wavelengths is not None:
-            waves.extend(list(self.eimp_emission.wavelengths))
+            self._atom = pt.__dict__[spec]
+            self.charge = charge
+            self.symbol = self._atom.symbol + '+'*self.charge
+            self.name = self._atom.name + '+'*self.charge
+            self.number = self._atom.number
+            self.mass = self._atom.mass * u.u
+            self.photo_refpt = 1*u.au
+            self._tables = AtomicTables(self.symbol, self.charge)
+            
+            Atom._registry[species] = dict(self.__dict__)
+    
+    @classmethod
+    def clear_registry(cls):
+        """Forget the species already loaded in this process"""
+        cls._registry.clear()
+    
+    @property
+    def gvalues(self):
+        return self._tables.gvalues
+    
+    @property
+    def photo_rate(self):
+        # A copy so that in-place changes (e.g., Output applying the
+        # photoionization factor) do not change the shared table
+        if '_photo_rate' in self.__dict__:
+            return self._photo_rate
         else:
-            pass
-        
-        self.wavelengths = set(wave for wave in waves if wave is not None)
-        
-        # charge exchange rates
-        self.charge_exchange = load_charge_exchange(self.symbol)
+            return self._tables.photo_rate.copy()
+    
+    @photo_rate.setter
+    def photo_rate(self, value):
+        self._photo_rate = value
+    
+    @property
+    def photo_reactions(self):
+        return self._tables.photo_reactions
+    
+    @property
+    def eimp_ionization(self):
+        return self._tables.eimp_ionization
+    
+    @property
+    def eimp_emission(self):
+        return self._tables.eimp_emission
+    
+    @property
+    def wavelengths(self):
+        return self._tables.wavelengths
+    
+    @property
+    def charge_exchange(self):
+        return self._tables.charge_exchange
         
     def __str__(self):
         return self.symbol
@@ -124,3 +138,63 @@ class Atom:
             return self.symbol == other
         else:
             return False
+
+
+class AtomicTables:
+    """Atomic data tables for a species, each loaded when first used.
+    
+    Parameters
+    ----------
+    symbol : str
+        Chemical symbol with the charge, e.g., 'Na' or 'S+'
+    charge : int
+    """
+    def __init__(self, symbol, charge):
+        self.symbol = symbol
+        self.charge = charge
+    
+    @cached_property
+    def gvalues(self):
+        return gValue(self.symbol)
+    
+    @cached_property
+    def _photo(self):
+        reactions = read_photorates(self.symbol)
+        if len(reactions) > 0:
+            return u.Quantity([rate for _, rate in reactions]).sum(), reactions
+        else:
+            return 1e-30/u.s, None
+    
+    @property
+    def photo_rate(self):
+        return self._photo[0]
+    
+    @property
+    def photo_reactions(self):
+        return self._photo[1]
+    
+    @cached_property
+    def eimp_ionization(self):
+        return EimpIonizationCoef(self)
+    
+    @cached_property
+    def eimp_emission(self):
+        return EImpEmissionCoef(self)
+    
+    @cached_property
+    def wavelengths(self):
+        if self.gvalues.wavelengths != (0*u.AA, ):
+            waves = list(self.gvalues.wavelengths)
+        else:
+            waves = []
+            
+        if self.eimp_emission.wavelengths is not None:
+            waves.extend(list(self.eimp_emission.wavelengths))
+        else:
+            pass
+        
+        return set(wave for wave in waves if wave is not None)
+    
+    @cached_property
+    def charge_exchange(self):
+        return load_charge_exchange(self.symbol)
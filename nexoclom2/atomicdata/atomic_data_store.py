@@ -0,0 +1,156 @@
+"""Compiled store of the atomic data used by nexoclom2.
+
+The g-values (``data/gvalues/*.ecsv``), photoionization rates
+(``data/photorates.ecsv``), electron impact rate coefficients
+(``data/EImpRates/*.pkl``), and charge exchange rate coefficients
+(``data/ChXRates/*.pkl``) are collected into one HDF5 file,
+``data/atomicdata.hdf5``, by build_atomic_data. Each table is read from the
+store only when it is needed.
+
+Run build_atomic_data after changing any of the source files::
+
+    python -m nexoclom2.atomicdata.atomic_data_store
+"""
+import os
+import glob
+import pickle
+import numpy as np
+import h5py
+import astropy.units as u
+from astropy.table import QTable
+from nexoclom2 import path
+
+
+STOREFILE = os.path.join(path, 'data', 'atomicdata.hdf5')
+
+
+def _write_quantity(group, name, quantity):
+    dataset = group.create_dataset(name, data=np.asarray(quantity.value),
+                                   compression='gzip')
+    dataset.attrs['unit'] = quantity.unit.to_string()
+
+
+def _read_quantity(dataset):
+    return dataset[()]*u.Unit(dataset.attrs['unit'])
+
+
+def build_atomic_data(filename=STOREFILE):
+    """Compile the atomic data source files into one HDF5 file"""
+    datapath = os.path.join(path, 'data')
+    tempfile = f'{filename}.{os.getpid()}.tmp'
+    with h5py.File(tempfile, 'w') as store:
+        # g-values
+        gvalues = store.create_group('gvalues')
+        for datafile in sorted(glob.glob(os.path.join(datapath, 'gvalues',
+                                                      '*.ecsv'))):
+            species = os.path.basename(datafile)[:-5]
+            table = QTable.read(datafile)
+            group = gvalues.create_group(species)
+            group.attrs['columns'] = table.colnames[1:]
+            group.attrs['wavelengths'] = [wave.to_value(u.AA) for wave
+                                          in table.meta['wavelengths']]
+            for col in table.colnames:
+                _write_quantity(group, col, table[col])
+
+        # Photoionization rates
+        table = QTable.read(os.path.join(datapath, 'photorates.ecsv'))
+        group = store.create_group('photorates')
+        group.create_dataset('species', data=[str(x) for x in table['species']])
+        group.create_dataset('reaction', data=[str(x) for x in table['reaction']])
+        _write_quantity(group, 'rate', table['rate'])
+
+        # Electron impact rate coefficients. Names are <SYMBOL>_<charge+1>
+        eimp = store.create_group('eimp')
+        for ratefile in sorted(glob.glob(os.path.join(datapath, 'EImpRates',
+                                                      '*.pkl'))):
+            with open(ratefile, 'rb') as file:
+                rates = pickle.load(file)
+            group = eimp.create_group(os.path.basename(ratefile)[:-4].upper())
+            for key, value in rates.items():
+                _write_quantity(group, key, value)
+
+        # Charge exchange rate coefficients for each neutral and ion
+        chx = store.create_group('charge_exchange')
+        for chxfile in sorted(glob.glob(os.path.join(datapath, 'ChXRates',
+                                                     '*.pkl'))):
+            with open(chxfile, 'rb') as file:
+                reactions = pickle.load(file)
+            neutral = chx.create_group(os.path.basename(chxfile)[:-4])
+            for ion, params in reactions.items():
+                group = neutral.create_group(ion)
+                group.attrs['reaction'] = params['reaction']
+                group.attrs['file'] = params['file']
+                for key in ('v_rel', 'T_i', 'kappa'):
+                    if params[key] is not None:
+                        _write_quantity(group, key, params[key])
+                    else:
+                        pass
+
+    os.replace(tempfile, filename)
+
+
+def read_gvalues(species):
+    """g-value table for a species as a QTable, or None if not available"""
+    with h5py.File(STOREFILE, 'r') as store:
+        if species not in store['gvalues']:
+            return None
+        else:
+            pass
+
+        group = store['gvalues'][species]
+        columns = ['velocity'] + list(group.attrs['columns'])
+        wavelengths = tuple(group.attrs['wavelengths']*u.AA)
+        return QTable([_read_quantity(group[col]) for col in columns],
+                      names=columns, meta={'wavelengths': wavelengths})
+
+
+def read_photorates(species):
+    """List of (reaction, rate) photoionization reactions for a species"""
+    with h5py.File(STOREFILE, 'r') as store:
+        group = store['photorates']
+        q = group['species'].asstr()[()] == species
+        reactions = group['reaction'].asstr()[()][q]
+        rates = _read_quantity(group['rate'])[q]
+
+    return [(str(reaction), rate) for reaction, rate in zip(reactions, rates)]
+
+
+def read_eimp(symbol, charge):
+    """Electron impact rate coefficients as a dict of Quantities, or None.
+
+    Parameters
+    ----------
+    symbol : str
+        Chemical symbol without the charge
+    charge : int
+    """
+    name = f'{symbol.upper()}_{charge+1}'
+    with h5py.File(STOREFILE, 'r') as store:
+        if name in store['eimp']:
+            group = store['eimp'][name]
+            return {key: _read_quantity(group[key]) for key in group.keys()}
+        else:
+            return None
+
+
+def read_charge_exchange(neutral):
+    """Charge exchange parameters for each ion as a dict, or None"""
+    with h5py.File(STOREFILE, 'r') as store:
+        if neutral not in store['charge_exchange']:
+            return None
+        else:
+            pass
+
+        params = {}
+        for ion, group in store['charge_exchange'][neutral].items():
+            params[ion] = {'reaction': group.attrs['reaction'],
+                           'file': group.attrs['file']}
+            for key in ('v_rel', 'T_i', 'kappa'):
+                params[ion][key] = (_read_quantity(group[key])
+                                    if key in group else None)
+
+        return params
+
+
+if __name__ == '__main__':
+    build_atomic_data()
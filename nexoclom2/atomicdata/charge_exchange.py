@@ -1,9 +1,7 @@
-import os
 import numpy as np
 import astropy.units as u
-import pickle
 from scipy.interpolate import RegularGridInterpolator, CubicSpline
-from nexoclom2 import path
+from nexoclom2.atomicdata.atomic_data_store import read_charge_exchange
 
 
 class ChargeExchange:
@@ -23,27 +21,30 @@ class ChargeExchange:
             self.interp = RegularGridInterpolator(pts, self.kappa.value)
 
     def ratecoef(self, v_rel, T_i):
-        v_rel_ = np.abs(v_rel.to(self.v_rel.unit))
-        v_rel_[v_rel_ > self.v_rel.max()] = self.v_rel.max()
-        v_rel_[v_rel_ < self.v_rel.min()] = self.v_rel.min()
+        T_i_ = None if T_i is None else T_i.to_value(self.T_i.unit)
+        rate = self.ratecoef_value(v_rel.to_value(self.v_rel.unit), T_i_)
+        return rate*u.cm**3/u.s
+    
+    def ratecoef_value(self, v_rel, T_i):
+        """Unitless rate coefficient used by the integrator.
+        
+        v_rel and T_i are floats in the units of the tables (km/s and eV).
+        Returns the rate coefficient in cm**3/s.
+        """
+        v_rel_ = np.clip(np.abs(v_rel), self.v_rel.value.min(),
+                         self.v_rel.value.max())
         
         if self.T_i is None:
-            result = self.interp(v_rel_.value)*u.cm**3/u.s
-            return result
+            return self.interp(v_rel_)
         else:
-            T_i_ = T_i.copy()
-            T_i_[T_i_ > self.T_i.max()] = self.T_i.max()
-            T_i_[T_i_ < self.T_i.min()] = self.T_i.min()
-            pts = np.column_stack([v_rel_.value, T_i_.value])
-            return self.interp(pts)*u.cm**3/u.s
+            T_i_ = np.clip(T_i, self.T_i.value.min(), self.T_i.value.max())
+            pts = np.column_stack([v_rel_, T_i_])
+            return self.interp(pts)
 
 
 def load_charge_exchange(neutral):
-    chxfile = os.path.join(path, 'Data', 'ChXRates', f'{neutral}.pkl')
-    if os.path.exists(chxfile):
-        with open(chxfile, 'rb') as file:
-            params = pickle.load(file)
-            
+    params = read_charge_exchange(neutral)
+    if params is not None:
         reactions = {}
         for ion in params:
              reactions[ion] = ChargeExchange(neutral, ion, params[ion])
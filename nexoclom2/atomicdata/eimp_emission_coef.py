@@ -1,9 +1,7 @@
-import os
 import numpy as np
 import astropy.units as u
 from scipy.interpolate import RegularGridInterpolator
-import pickle
-from nexoclom2 import path
+from nexoclom2.atomicdata.atomic_data_store import read_eimp
 
 
 class EImpEmissionCoef:
@@ -53,13 +51,9 @@ class EImpEmissionCoef:
     not necessary to specify vacuum versus air wavelength.
     """
     def __init__(self, species):
-        atom_name = f'{species.symbol.replace('+', '')}_{species.charge+1}.pkl'
-        ratefile = os.path.join(path, 'Data', 'EimpRates', atom_name)
+        rate_info = read_eimp(species.symbol.replace('+', ''), species.charge)
         self.species = species.symbol
-        if os.path.exists(ratefile):
-            with open(ratefile, 'rb') as file:
-                rate_info = pickle.load(file)
-        
+        if rate_info is not None:
             if 'wavelengths' in rate_info:
                 self._wavelengths = rate_info['wavelengths']
                 self.wavelengths = tuple(np.round(wave)
@@ -1,8 +1,6 @@
-import os
 import numpy as np
-import pickle
 import astropy.units as u
-from nexoclom2 import path
+from nexoclom2.atomicdata.atomic_data_store import read_eimp
 
 
 class EimpIonizationCoef:
@@ -24,14 +22,10 @@ class EimpIonizationCoef:
         Returns rate coefficients as function of input ``T_e``.
     """
     def __init__(self, species):
-        atom_name = f'{species.symbol.replace('+', '')}_{species.charge+1}.pkl'
-        ratefile = os.path.join(path, 'Data', 'EimpRates', atom_name)
+        rate = read_eimp(species.symbol.replace('+', ''), species.charge)
         self.species = species.symbol
         
-        if os.path.exists(ratefile):
-            with open(ratefile, 'rb') as file:
-                rate = pickle.load(file)
-            
+        if rate is not None:
             self.T_e = rate['T_e']
             self.kappa = rate['kappa_ion']
         else:
@@ -1,10 +1,8 @@
-import os
 import numpy as np
 import astropy.units as u
 import astropy.constants as c
-from astropy.table import QTable
 import periodictable as pt
-from nexoclom2 import path
+from nexoclom2.atomicdata.atomic_data_store import read_gvalues
 
 
 class gValue:
@@ -58,10 +56,10 @@ class gValue:
     def __init__(self, species):
         self.species = species
 
-        datafile = os.path.join(path, 'data', 'gvalues', f'{species}.ecsv')
-        if os.path.exists(datafile):
+        data = read_gvalues(species)
+        if data is not None:
             self._ref_dist = 0.352 * u.au
-            self._data = QTable.read(datafile)
+            self._data = data
             self.wavelengths = tuple([np.round(wave)
                                       for wave in self._data.meta['wavelengths']])
             
@@ -1,6 +1,5 @@
 import numpy as np
 import astropy.units as u
-import h5py
 from scipy.spatial.transform import Rotation
 from nexoclom2.solarsystem.SSObject import SSObject
 from nexoclom2.data_simulation.ModelResult import ModelResult
@@ -55,7 +54,7 @@ class ModelImage(ModelResult):
 
         ybins = np.linspace(*self.yrange, self.dimensions[0]+1)
         zbins = np.linspace(*self.zrange, self.dimensions[1]+1)
-        store = h5py.File(output.savefile, 'r')
+        store = output.layout.open(output.savefile)
         it, ct = 0, 0
         nchunks = int(output.n_final_packets/chunksize)+1
         
@@ -83,8 +82,8 @@ class ModelImage(ModelResult):
     
         while ct < output.n_final_packets:
             print(f'Chunk {it+1} of {nchunks}')
-            ind = np.arange(ct, ct+chunksize).astype(int)
-            ind = ind[ind < output.n_final_packets]
+            # Contiguous slices are read a chunk at a time
+            ind = slice(ct, min(ct+chunksize, output.n_final_packets))
             
             time = store['final_state/time'][ind]*u.s
             x = store['final_state/x'][ind]*output.unit
@@ -15,6 +15,7 @@ class Geometry(InputClass):
     * center
     * startpoint
     * included
+    * ephemeris: spice or kepler, Default = spice
     
     See :ref:`geometry` for more information.
     
@@ -37,12 +38,22 @@ class Geometry(InputClass):
         
     include : tuple of str
         Objects included in calculations.
+        
+    ephemeris : str
+        Source of positions and rotations. 'spice' uses the SPICE kernels.
+        'kepler' uses the analytic Keplerian orbits in
+        nexoclom2.solarsystem.kepler, which do not need kernels. The Jovian
+        system is not available with 'kepler'.
     """
     def __init__(self, gparam: (dict, Document)):
         super().__init__(gparam)
         self.__name__ = 'Geometry'
         if isinstance(gparam, Document):
-            pass
+            if 'ephemeris' not in gparam:
+                # Saved before the ephemeris could be chosen
+                self.ephemeris = 'spice'
+            else:
+                pass
         else:
             obj = gparam.get('center', None)
             if obj is None:
@@ -50,11 +61,24 @@ class Geometry(InputClass):
                                      'Central object not defined in inputfile.')
             else:
                 self.center = obj.title()
+            
+            self.ephemeris = gparam.get('ephemeris', 'spice').lower()
+            if self.ephemeris not in ('spice', 'kepler'):
+                raise InputfileError('Geometry.__init__',
+                                     f'Invalid ephemeris {self.ephemeris}')
+            else:
+                pass
                 
-            center = SSObject(self.center)
+            center = SSObject(self.center, self.ephemeris)
             if center.type == 'Unknown':
                 raise InputfileError('geometry.__init__',
                                      f'Object {obj} does not exist')
+            elif ((self.ephemeris == 'kepler') and
+                  ('Jupiter' in (center.object, center.orbits))):
+                raise InputfileError('geometry.__init__',
+                    'The kepler ephemeris is not available for the Jovian system')
+            else:
+                pass
             
             # Get list of objects (center + satellites)
             objlist = [self.center]
@@ -94,6 +118,7 @@ class Geometry(InputClass):
         output = f'Class: {self.__name__}\n'
         output += f'Center: {self.center}\nStart Point: {self.startpoint}\n'
         output += f'Included: {", ".join(self.included)}\n'
+        output += f'Ephemeris: {self.ephemeris}\n'
         
         return output
     
@@ -102,6 +127,7 @@ class Geometry(InputClass):
             return ((self.__name__ == other.__name__) and
                     (self.center == other.center) and
                     (self.startpoint == other.startpoint) and
-                    (self.included == other.included))
+                    (self.included == other.included) and
+                    (self.ephemeris == other.ephemeris))
         else:
             return False
@@ -24,6 +24,7 @@ class GeometryNoTime(Geometry):
     * center
     * startpoint: Default = center
     * included: Default = (center, startpoint)
+    * ephemeris: Default = spice
     
     See :ref:`geometry` for more information.
     
@@ -74,8 +75,8 @@ class GeometryNoTime(Geometry):
                 pass
             self.dtaa = 0*u.deg
         else:
-            center = SSObject(self.center)
-            startpoint = SSObject(self.startpoint)
+            center = SSObject(self.center, self.ephemeris)
+            startpoint = SSObject(self.startpoint, self.ephemeris)
             if (center.type == 'Moon') and (center != startpoint):
                 raise InputfileError('input_class.Geometry',
                     'If geometry.center is a moon, it must be the startpoint')
@@ -115,7 +116,7 @@ class GeometryNoTime(Geometry):
             subs = gparam.get('subsolarpoint', '0, 0').split(',')
             self.subsolarpoint = (float(subs[0])*u.deg, float(subs[1])*u.deg)
             
-            jupiter = SSObject('Jupiter')
+            jupiter = SSObject('Jupiter', self.ephemeris)
             if ((self.startpoint == 'Jupiter') or
                 (self.startpoint in jupiter.satellites)):
                 cml = gparam.get('cml', None)
@@ -4,8 +4,10 @@ import astropy.units as u
 from astropy.time import Time, TimeDelta
 import copy
 import h5py
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from nexoclom2.atomicdata import Atom
-from nexoclom2.solarsystem import SSObject, IoTorus, SSPosition
+from nexoclom2.solarsystem import SSObject, IoTorus, SSPosition, Ephemeris
 from nexoclom2.solarsystem.find_modeltime import find_modeltime
 from nexoclom2.solarsystem.frames import Frame
 from nexoclom2.particle_tracking.ConstantIntegrator import ConstantIntegrator
@@ -13,7 +15,12 @@ from nexoclom2.particle_tracking.VariableIntegrator import VariableIntegrator
 from nexoclom2.particle_tracking.state_vectors import StateVector
 from nexoclom2.particle_tracking.starting_point import StartingPoint
 from nexoclom2.particle_tracking.starting_point_saved import StartingPointSaved
+from nexoclom2.particle_tracking.packet_refill import PacketRefill
 from nexoclom2.particle_tracking.final_state import FinalState
+from nexoclom2.particle_tracking.final_state_writer import FinalStateWriter
+from nexoclom2.particle_tracking.storage_layout import StorageLayout
+from nexoclom2.particle_tracking import shards
+from nexoclom2.particle_tracking.internal_units import InternalUnits
 from nexoclom2.utilities import DatabaseOperations
 
 
@@ -24,7 +31,23 @@ class Output:
     ----------
     inputs : Input
     n_packets : int
+    n_iterations : int, Default=1
     compress : bool, Default=True
+    overwrite : bool, Default=False
+    n_workers : int, Default=1
+        Number of processes used to run iterations. If greater than 1,
+        iterations run concurrently, each writing its own shard file, and
+        the shards are merged into the savefile in iteration order.
+    n_threads : int, Default=1
+        Number of threads used to evaluate forces and loss rates within each
+        integration step.
+    refill : float, Default=0
+        Only used with a variable step size when iterations are run in this
+        process. If greater than 0, the next iteration is started as soon as
+        fewer than refill times the packets per iteration are still running
+        in the current one, so that the integrator does not spend most of its
+        steps on a few long-lived packets. Results are saved by iteration and
+        packet number as usual.
     
     Attributes
     ----------
@@ -50,10 +73,11 @@ class Output:
     
     """
     def __init__(self, inputs, n_packets=0,  n_iterations=1, compress=True,
-                 overwrite=False):
+                 overwrite=False, n_workers=1, n_threads=1, refill=0.):
         # sets up outputs, restores existing results, does not run anything
         self.inputs = copy.deepcopy(inputs)
         self.compress = compress
+        self.n_threads = int(n_threads)
        
         # Search for previous results
         db = DatabaseOperations()
@@ -82,25 +106,124 @@ class Output:
                     self.completed_iterations = int(
                         store['starting_point/iteration'][:].max() + 1)
                     
-        self.randgen = np.random.default_rng(self.inputs.options.random_seed)
+        # Each iteration has its own random stream derived from the entropy
+        self.entropy = self._random_entropy()
+        self.randgen = iteration_randgen(self.entropy, self.completed_iterations)
+        self.tempfile = self.savefile+'_temp'
         
         # Initialization - This is done regardless of whether any packets to run
+        self._setup()
+        
+        # Surface accommodation - not done yet
+        n_total_to_run = int(n_packets)
+        n_to_do = (n_total_to_run - self.completed_packets)
+        print(f'Requested {n_total_to_run} packets.')
+        print(f'Found {self.completed_packets} packets.')
+        
+        if hasattr(self.inputs.options, 'step_size'):
+            nsteps = int(np.ceil(self.inputs.options.runtime/
+                                 self.inputs.options.step_size) + 1)
+        else:
+            nsteps = 1
+    
+        if n_to_do <= 0:
+            print('Do not need to run more packets.')
+        else:
+            # Determine number of packets to run in each iteration
+            n_iterations = int(n_iterations)
+            pperit = int(np.ceil(n_to_do//n_iterations))
+            packets_per_it = [pperit for _ in range(n_iterations)]
+            total_packets = sum(packets_per_it)
+            packets_per_it[-1] += n_to_do - total_packets
+            assert sum(packets_per_it) == n_to_do
+            
+            print(f'Will run {n_to_do} more packets.')
+            print(f'Running {n_iterations} iterations of {packets_per_it[0]} each')
+            
+            if int(n_workers) > 1:
+                self._run_parallel(inputs, packets_per_it, int(n_workers))
+            elif ((refill > 0) and (n_iterations > 1) and
+                  (not hasattr(self.inputs.options, 'step_size'))):
+                feed = PacketRefill(self, packets_per_it, refill)
+                try:
+                    VariableIntegrator(self, feed.next_state(), refill=feed)
+                finally:
+                    self._close_writers()
+            else:
+                for it in range(n_iterations):
+                    if os.path.exists(self.tempfile):
+                        os.remove(self.tempfile)
+                    else:
+                        pass
+    
+                    start_time = Time.now()
+                    print(f'{start_time.iso}: Starting iteration {it+1} '
+                          f'of {n_iterations}')
+                    
+                    self.randgen = iteration_randgen(self.entropy,
+                                                     self.completed_iterations)
+                    self._run_iteration(packets_per_it[it])
+    
+                    self.completed_packets += packets_per_it[it]
+                    self.completed_iterations += 1
+                    
+                    self._close_iteration()
+                    
+                    end_time = Time.now()
+                    print(f'End Time: {end_time.iso}')
+                    print(f'Elapsed Time: {(end_time - start_time).quantity_str}')
+        
+        if n_packets > 0:
+            pack = u.def_unit('packet', 1.0* u.dimensionless_unscaled)
+            atoms = u.def_unit('atom', 1.0* u.dimensionless_unscaled)
+            with h5py.File(self.savefile, 'r') as store:
+                self.total_source = (store['starting_point/frac'][:].sum() *
+                                     nsteps * pack)
+                self.n_starting_packets = len(store['starting_point/time'][:])
+                self.n_final_packets = len(store['final_state/time'][:])
+                self.n_iterations = len(set(store['starting_point/iteration'][:]))
+            self.model_rate = self.total_source/self.inputs.options.runtime
+            self.sourcerate = 1.* u.def_unit('10**23 atoms/s', 1e23*atoms/u.s)
+            self.atoms_per_packet = 10**23*atoms/u.s/self.model_rate
+        else:
+            self.total_source = None
+            self.model_rate = None
+            self.atoms_per_packet = None
+            self.sourcerate = None
+            self.n_final_packets = 0.
+    
+    def _setup(self, modeltime=None):
+        """Set up the objects, positions, and frames needed to run the model.
+        
+        Modifies self.inputs in place, so needs to start from an unmodified
+        copy of the inputs. modeltime is used instead of searching for the
+        modeltime of a GeometryNoTime if given.
+        """
+        inputs = self.inputs
         self.center = self.inputs.geometry.center
         self.startpoint = self.inputs.geometry.startpoint
         self.species = Atom(self.inputs.options.species)
         
-        self.objects = {obj: SSObject(obj)
+        self.objects = {obj: SSObject(obj, inputs.geometry.ephemeris)
                         for obj in self.inputs.geometry.included}
         self.unit = self.objects[self.center].unit
         
         if inputs.geometry.__name__ == 'GeometryTime':
             self.modeltime = inputs.geometry.modeltime
+        elif modeltime is not None:
+            self.modeltime = modeltime
+            self.inputs.geometry.modeltime = self.modeltime
         else:
             self.modeltime = find_modeltime(inputs.geometry)
             self.inputs.geometry.modeltime = self.modeltime
         
+        # Buffered writers for the final states keyed by tempfile
+        self._writers = {}
+        self.layout = StorageLayout()
+        
         self.positions = {}
         self.initialize_objects()
+        self.ephemeris = Ephemeris(self.positions)
         
         edge_origin = self.inputs.options.edge_origin
         if edge_origin == 'center':
@@ -140,194 +263,200 @@ class Output:
         else:
             pass
         
-        # Surface accommodation - not done yet
-        n_total_to_run = int(n_packets)
-        n_to_do = (n_total_to_run - self.completed_packets)
-        print(f'Requested {n_total_to_run} packets.')
-        print(f'Found {self.completed_packets} packets.')
+        # Constants in the unit system used by the integrator
+        self.internal = InternalUnits(self)
         
-        if hasattr(self.inputs.options, 'step_size'):
-            nsteps = int(np.ceil(self.inputs.options.runtime/
-                                 self.inputs.options.step_size) + 1)
+    def _random_entropy(self):
+        """Entropy for the random streams.
+        
+        This is options.random_seed if given. Otherwise it is taken from the
+        savefile so that a resumed run continues the same sequence, or
+        generated for a new run.
+        """
+        if self.inputs.options.random_seed is not None:
+            return self.inputs.options.random_seed
+        elif self.completed_iterations > 0:
+            with h5py.File(self.savefile, 'r') as store:
+                entropy = store.attrs.get('random_entropy', None)
+            if entropy is not None:
+                return int(entropy)
+            else:
+                pass
         else:
-            nsteps = 1
+            pass
+        
+        return np.random.SeedSequence().entropy
     
-        if n_to_do <= 0:
-            print('Do not need to run more packets.')
-        else:
-            # Determine number of packets to run in each iteration
-            n_iterations = int(n_iterations)
-            pperit = int(np.ceil(n_to_do//n_iterations))
-            packets_per_it = [pperit for _ in range(n_iterations)]
-            total_packets = sum(packets_per_it)
-            packets_per_it[-1] += n_to_do - total_packets
-            assert sum(packets_per_it) == n_to_do
-            
-            print(f'Will run {n_to_do} more packets.')
-            print(f'Running {n_iterations} iterations of {packets_per_it[0]} each')
+    def _start_iteration(self, iteration, n_packets, first_packet):
+        """Save the starting point of an iteration to self.tempfile and
+        return its initial state"""
+        self.randgen = iteration_randgen(self.entropy, iteration)
+        
+        # StartingPoint numbers the packets from the completed counts
+        completed = self.completed_iterations, self.completed_packets
+        self.completed_iterations = iteration
+        self.completed_packets = first_packet
+        startpoint = StartingPoint(self, n_packets)
+        self.completed_iterations, self.completed_packets = completed
+        
+        self._save_start_point(startpoint)
+        
+        return StateVector(self, startpoint)
+        
+    def _run_iteration(self, n_packets):
+        """Run one iteration and save it to self.tempfile"""
+        startpoint = StartingPoint(self, n_packets)
+        initial_state = StateVector(self, startpoint)
+        self._save_start_point(startpoint)
+        
+        try:
+            if hasattr(self.inputs.options, 'step_size'):
+                ConstantIntegrator(self, initial_state)
+            else:
+                VariableIntegrator(self, initial_state)
+        finally:
+            # Packets saved before an error are kept in the tempfile
+            self._close_writer()
             
-            for it, it_number in enumerate(range(self.completed_iterations,
-                                           self.completed_iterations+n_iterations)):
-                if os.path.exists(self.savefile+'_temp'):
-                    os.remove(self.savefile+'_temp')
-                else:
-                    pass
-
-                start_time = Time.now()
-                startpoint = StartingPoint(self, packets_per_it[it])
-                initial_state = StateVector(self, startpoint)
-                self._save_start_point(startpoint)
-                
-                print(f'{start_time.iso}: Starting iteration {it+1} '
-                      f'of {n_iterations}')
-                
-                if hasattr(self.inputs.options, 'step_size'):
-                    ConstantIntegrator(self, initial_state)
-                else:
-                    VariableIntegrator(self, initial_state)
-
+        del startpoint, initial_state
+        
+    def _run_parallel(self, inputs, packets_per_it, n_workers):
+        """Run iterations in a process pool.
+        
+        Each worker sets up its own copy of the model from the original
+        inputs and the modeltime found here, and writes each iteration to a separate shard file. The shards
+        are merged in iteration order as they finish.
+        """
+        n_iterations = len(packets_per_it)
+        first_packet = self.completed_packets + np.cumsum([0] + packets_per_it)
+        tasks = [(self.completed_iterations + it, packets_per_it[it],
+                  int(first_packet[it])) for it in range(n_iterations)]
+        
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(n_workers, n_iterations),
+                                 mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(inputs, self.savefile,
+                                           self.entropy, self.n_threads,
+                                           self.modeltime)) as pool:
+            for it, tempfile in enumerate(pool.map(_run_worker, tasks)):
+                self.tempfile = tempfile
                 self.completed_packets += packets_per_it[it]
                 self.completed_iterations += 1
-                
                 self._close_iteration()
-                
-                end_time = Time.now()
-                print(f'End Time: {end_time.iso}')
-                print(f'Elapsed Time: {(end_time - start_time).quantity_str}')
-                
-                del startpoint, initial_state
-        
-        if n_packets > 0:
-            pack = u.def_unit('packet', 1.0* u.dimensionless_unscaled)
-            atoms = u.def_unit('atom', 1.0* u.dimensionless_unscaled)
-            with h5py.File(self.savefile, 'r') as store:
-                self.total_source = (store['starting_point/frac'][:].sum() *
-                                     nsteps * pack)
-                self.n_starting_packets = len(store['starting_point/time'][:])
-                self.n_final_packets = len(store['final_state/time'][:])
-                self.n_iterations = len(set(store['starting_point/iteration'][:]))
-            self.model_rate = self.total_source/self.inputs.options.runtime
-            self.sourcerate = 1.* u.def_unit('10**23 atoms/s', 1e23*atoms/u.s)
-            self.atoms_per_packet = 10**23*atoms/u.s/self.model_rate
-        else:
-            self.total_source = None
-            self.model_rate = None
-            self.atoms_per_packet = None
-            self.sourcerate = None
-            self.n_final_packets = 0.
+                print(f'{Time.now().iso}: Finished iteration {it+1} '
+                      f'of {n_iterations}')
         
+        self.tempfile = self.savefile+'_temp'
+    
     def initialize_objects(self):
+        # All positions are sampled at the same times so that they can be
+        # interpolated together (see Ephemeris)
+        runtime = self.inputs.options.runtime
+        ntimes = max(SSPosition.n_samples(self.objects[obj], runtime)
+                     for obj in self.inputs.geometry.included)
         for obj in self.inputs.geometry.included:
             self.positions[obj] = SSPosition(self.objects[obj],
                                              self.inputs.geometry,
-                                             self.inputs.options.runtime)
+                                             runtime, ntimes)
             self.objects[obj].GM = self.objects[obj].GM.to(self.unit**3/u.s**2)
             self.objects[obj].radius = self.objects[obj].radius.to(self.unit)
             
     def _remove(self):
         if hasattr(self, 'savefile'):
-            if os.path.exists(self.savefile):
-                os.remove(self.savefile)
-            else:
-                pass
+            shards.remove(self.savefile)
         else:
             pass
         
     def _save_start_point(self, start_point):
         # Create a template for saved outputs. Each iteration is saved in a
         # temporary file in case the run crashes.
-        with h5py.File(self.savefile+'_temp', 'w') as store:
+        with h5py.File(self.tempfile, 'w') as store:
             for key in start_point.__dict__:
                 if key == 'ut':
-                    store.create_dataset(f'starting_point/{key}',
-                                         shape=((len(start_point), )),
-                                         maxshape=(None, ),
-                                         dtype=h5py.string_dtype())
-                    ut = [x.iso for x in start_point.ut]
-                    store[f'starting_point/{key}'][:] = ut
+                    # Seconds from the epoch saved in the attributes.
+                    # StartingPointSaved makes the Time objects when needed.
+                    ut = (start_point.ut - self.modeltime).to_value(u.s)
+                    self.layout.create(store, f'starting_point/{key}', ut)
                 elif key == 'frame':
                     store['starting_point'].attrs['frame'] = start_point.frame.frame
                 else:
-                    store.create_dataset(f'starting_point/{key}',
-                                         shape=((len(start_point), )),
-                                         maxshape=(None, ))
-                    store[f'starting_point/{key}'][:] = start_point.__dict__[key]
+                    self.layout.create(store, f'starting_point/{key}',
+                                       start_point.__dict__[key])
             store['starting_point'].attrs['unit'] = start_point.x.unit.name
+            epoch = Time(self.modeltime, precision=9)
+            store['starting_point'].attrs['ut_epoch'] = epoch.isot
+            store['starting_point'].attrs['ut_scale'] = epoch.scale
+            
+            # Entropy is stored as a string since it can exceed 64 bits
+            store.attrs['random_entropy'] = str(self.entropy)
         
             final_keys = ['time', 'x', 'y', 'z', 'vx', 'vy', 'vz', 'frac',
                           'escaped', 'ionized', 'packet_number', 'iteration']
             for key in final_keys:
-                store.create_dataset(f'final_state/{key}', shape=(0, ),
-                                     maxshape=(None, ))
+                self.layout.create(store, f'final_state/{key}')
             
             for objname in self.objects:
-                store.create_dataset(f'/final_state/hit/{objname}',
-                                     shape=(0, ), maxshape=(None, ))
+                self.layout.create(store, f'final_state/hit/{objname}')
+            store['final_state'].attrs['unit'] = self.unit.name
     
     
     def save_final_state(self, final_state):
-        X, V = final_state.X, final_state.V
-        
-        with h5py.File(self.savefile+'_temp', 'a') as store:
-            old_len = store['final_state/time'].shape[0]
-            new_len = len(final_state)
-            for key in final_state.__dict__:
-                if key == 'X':
-                    store['final_state/x'].resize((old_len + new_len, ))
-                    store['final_state/x'][old_len:] = X[:,0]
-                    
-                    store['final_state/y'].resize((old_len + new_len, ))
-                    store['final_state/y'][old_len:] = X[:,1]
-                    
-                    store['final_state/z'].resize((old_len + new_len, ))
-                    store['final_state/z'][old_len:] = X[:,2]
-                elif key == 'V':
-                    store['final_state/vx'].resize((old_len + new_len, ))
-                    store['final_state/vx'][old_len:] = V[:,0]
-                    
-                    store['final_state/vy'].resize((old_len + new_len, ))
-                    store['final_state/vy'][old_len:] = V[:,1]
+        """Add packets to the final state in self.tempfile.
+        
+        The packets are buffered and written in the background by a
+        FinalStateWriter, which stays open until the iteration is closed.
+        """
+        if self.tempfile not in self._writers:
+            self._writers[self.tempfile] = FinalStateWriter(self.tempfile)
+        else:
+            pass
+        
+        self._writers[self.tempfile].write(final_state)
+    
+    def _close_writer(self):
+        """Finish writing the final state in self.tempfile"""
+        writer = self._writers.pop(self.tempfile, None)
+        if writer is not None:
+            writer.close()
+        else:
+            pass
+    
+    def _close_writers(self):
+        """Finish writing the final states of every iteration"""
+        while len(self._writers) > 0:
+            _, writer = self._writers.popitem()
+            writer.close()
                     
-                    store['final_state/vz'].resize((old_len + new_len, ))
-                    store['final_state/vz'][old_len:] = V[:,2]
-                elif key == 'hit':
-                    for objname in final_state.hit:
-                        store[f'final_state/hit/{objname}'].resize((old_len +
-                                                                    new_len, ))
-                        store[f'final_state/hit/{objname}'][old_len:] = final_state.hit[objname]
+    def _sort_final_state(self):
+        """Put the final state in self.tempfile in packet_number order"""
+        self._close_writer()
+        with h5py.File(self.tempfile, 'a') as store:
+            order = np.argsort(store['final_state/packet_number'][:],
+                               kind='stable')
+            if np.all(order == np.arange(len(order))):
+                return
+            else:
+                pass
+            
+            for key in store['final_state'].keys():
+                if key == 'hit':
+                    for objname in store['final_state/hit'].keys():
+                        data = store[f'final_state/hit/{objname}']
+                        data[:] = data[:][order]
                 else:
-                    store[f'final_state/{key}'].resize((old_len + new_len, ))
-                    store[f'final_state/{key}'][old_len:] = final_state.__dict__[key]
-                    
+                    data = store[f'final_state/{key}']
+                    data[:] = data[:][order]
+    
     def _close_iteration(self):
-        if self.completed_iterations == 1:
-            assert not os.path.exists(self.savefile)
-            os.rename(self.savefile+'_temp', self.savefile)
-        else:
-            with h5py.File(self.savefile, 'a') as final:
-                with h5py.File(self.savefile+'_temp', 'r') as temp:
-                    old_len = final['starting_point/time'].shape[0]
-                    new_len = temp['starting_point/time'].shape[0] + old_len
-                    for key in temp['starting_point'].keys():
-                        final[f'starting_point/{key}'].resize((new_len, ))
-                        final[f'starting_point/{key}'][old_len:] = (
-                            temp[f'starting_point/{key}'][:])
-                    
-                    old_len = final['final_state/time'].shape[0]
-                    new_len = temp['final_state/time'].shape[0] + old_len
-                    for key in temp['final_state'].keys():
-                        if key == 'hit':
-                            for objname in temp['final_state/hit'].keys():
-                                final[f'final_state/hit/{objname}'].resize(
-                                    (new_len, ))
-                                final[f'final_state/hit/{objname}'][old_len:] = (
-                                    temp[f'final_state/hit/{objname}'][:])
-                        else:
-                            final[f'final_state/{key}'].resize((new_len, ))
-                            final[f'final_state/{key}'][old_len:] = (
-                                temp[f'final_state/{key}'][:])
-
-            os.remove(self.savefile+'_temp')
+        """Add the iteration in self.tempfile to the savefile.
+        
+        The tempfile becomes a shard of the savefile (see
+        nexoclom2.particle_tracking.shards), so no packets are copied.
+        """
+        self._close_writer()
+        shards.add_shard(self.savefile, self.tempfile,
+                         self.completed_iterations - 1)
 
     def starting_point(self, iteration=None, n_packets=None):
         """
@@ -371,15 +500,19 @@ class Output:
         starting_point = StartingPointSaved(self, iteration=iteration,
                                             n_packets=n_packets)
         
+        # Put the units back on the integrator's internal arrays
         initial_state = StateVector(self, starting_point)
-        initial_state.x = initial_state.X[:,0]
-        initial_state.y = initial_state.X[:,1]
-        initial_state.z = initial_state.X[:,2]
+        initial_state.time = initial_state.time*u.s
+        initial_state.x = initial_state.X[:,0]*self.unit
+        initial_state.y = initial_state.X[:,1]*self.unit
+        initial_state.z = initial_state.X[:,2]*self.unit
         initial_state.__delattr__('X')
-        initial_state.vx = initial_state.V[:,0]
-        initial_state.vy = initial_state.V[:,1]
-        initial_state.vz = initial_state.V[:,2]
+        initial_state.vx = initial_state.V[:,0]*self.unit/u.s
+        initial_state.vy = initial_state.V[:,1]*self.unit/u.s
+        initial_state.vz = initial_state.V[:,2]*self.unit/u.s
         initial_state.__delattr__('V')
+        initial_state.__delattr__('accel')
+        initial_state.__delattr__('ioniz')
         
         return initial_state
     
@@ -417,11 +550,9 @@ class Output:
             V0 = self.positions[self.startpoint].V(times)
             
             # times = self.modeltime + TimeDelta(times)
-            X0 = self.frame.rotation(times, X0, final.frame)
-            V0 = self.frame.rotation(times, V0, final.frame)
-            
-            X = self.frame.rotation(times, final.X(), final.frame) - X0
-            V = self.frame.rotation(times, final.V(), final.frame) - V0
+            X0, V0, X, V = self.frame.rotate(times, final.frame, X0, V0,
+                                             final.X(), final.V())
+            X, V = X - X0, V - V0
             
             final.x = X[:,0].to(self.objects[center].unit)
             final.y = X[:,1].to(self.objects[center].unit)
@@ -433,3 +564,60 @@ class Output:
             pass
         
         return final
+
+
+def iteration_randgen(entropy, iteration):
+    """Random generator for one iteration.
+    
+    The stream depends only on the entropy and the iteration number, so
+    results do not depend on the order iterations are run in or on the number
+    of workers.
+    
+    Parameters
+    ----------
+    entropy: int
+        options.random_seed or the entropy saved with the model
+    iteration: int
+        Iteration number
+    
+    Returns
+    -------
+    numpy Generator
+    """
+    seed = np.random.SeedSequence(entropy, spawn_key=(int(iteration), ))
+    return np.random.default_rng(seed)
+
+
+# Model set up in each worker process by _init_worker
+_worker_output = None
+
+
+def _init_worker(inputs, savefile, entropy, n_threads, modeltime):
+    """Set up the model once in each worker process using the modeltime
+    from the parent process"""
+    global _worker_output
+    output = Output.__new__(Output)
+    output.inputs = copy.deepcopy(inputs)
+    output.savefile = savefile
+    output.entropy = entropy
+    output.n_threads = n_threads
+    output._setup(modeltime)
+    _worker_output = output
+    
+    
+def _run_worker(task):
+    """Run one iteration in a worker process and return the shard file"""
+    iteration, n_packets, first_packet = task
+    output = _worker_output
+    output.randgen = iteration_randgen(output.entropy, iteration)
+    output.completed_iterations = iteration
+    output.completed_packets = first_packet
+    output.tempfile = f'{output.savefile}_temp{iteration}'
+    if os.path.exists(output.tempfile):
+        os.remove(output.tempfile)
+    else:
+        pass
+    
+    output._run_iteration(n_packets)
+    
+    return output.tempfile
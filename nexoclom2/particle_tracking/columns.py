@@ -0,0 +1,159 @@
+import copy
+import numpy as np
+import h5py
+
+
+class ColumnView:
+    """Selected rows of the columns of a group in a model output.
+
+    Nothing is read when the view is made. read() reads one column and
+    only the rows that are selected:
+
+    * Selections of consecutive rows are read as slices.
+    * Other selections are read a block of rows at a time, skipping blocks
+      with no selected rows. The blocks are the chunks of the dataset.
+    * Contiguous, uncompressed datasets are memory mapped, so slices are
+      views of the file and are not copied. They are mapped copy-on-write:
+      the arrays can be changed in place, and the changes are not written
+      to the file.
+
+    Parameters
+    ----------
+    filename : str
+    group : str
+        'final_state' or 'starting_point'
+    selection : None, slice, boolean array, or integer array
+        Rows to use. None selects every row.
+    layout : StorageLayout, optional
+        Used to open the file with its chunk cache
+    """
+    # Block of rows read for selections from datasets with no chunks
+    block = 65536
+
+    def __init__(self, filename, group, selection=None, layout=None):
+        self.filename = filename
+        self.group = group
+        self.layout = layout
+
+        with self._open() as store:
+            n_rows = store[group]['time'].shape[0]
+            self.attrs = dict(store[group].attrs)
+        self.n_rows = n_rows
+        self.selection = self._simplify(selection, n_rows)
+
+    def _open(self):
+        if self.layout is None:
+            return h5py.File(self.filename, 'r')
+        else:
+            return self.layout.open(self.filename)
+
+    @staticmethod
+    def _simplify(selection, n_rows):
+        """Slice if the selected rows are consecutive, otherwise sorted row
+        numbers or row numbers in the requested order"""
+        if selection is None:
+            return slice(0, n_rows)
+        elif isinstance(selection, slice):
+            rows = range(*selection.indices(n_rows))
+            if rows.step > 0:
+                return slice(rows.start, rows.stop, rows.step)
+            else:
+                # h5py can not read slices with negative steps
+                return np.arange(rows.start, rows.stop, rows.step)
+        else:
+            pass
+
+        selection = np.asarray(selection)
+        if selection.dtype == bool:
+            rows = np.flatnonzero(selection)
+        else:
+            rows = np.where(selection < 0, selection + n_rows, selection)
+
+        if len(rows) == 0:
+            return slice(0, 0)
+        elif np.all(np.diff(rows) == 1):
+            return slice(int(rows[0]), int(rows[-1]) + 1)
+        else:
+            return rows
+
+    def __len__(self):
+        if isinstance(self.selection, slice):
+            return len(range(*self.selection.indices(self.n_rows)))
+        else:
+            return len(self.selection)
+
+    def __getitem__(self, q):
+        """View of a subset of the selected rows"""
+        if isinstance(self.selection, slice):
+            rows = range(*self.selection.indices(self.n_rows))
+            if isinstance(q, slice):
+                # Slice of a slice is a slice
+                selection = rows[q]
+                selection = slice(selection.start,
+                                  None if selection.stop < 0 else selection.stop,
+                                  selection.step)
+            else:
+                q = np.asarray(q)
+                if q.dtype == bool:
+                    q = np.flatnonzero(q)
+                else:
+                    q = np.where(q < 0, q + len(rows), q)
+                selection = rows.start + rows.step*q
+        else:
+            selection = self.selection[q]
+
+        new = copy.copy(self)
+        new.selection = self._simplify(selection, self.n_rows)
+        return new
+
+    def read(self, name):
+        """Selected rows of a column as an array"""
+        with self._open() as store:
+            dataset = store[self.group][name]
+            data = self._memmap(dataset)
+            if data is not None:
+                return data[self.selection]
+            elif isinstance(self.selection, slice):
+                return dataset[self.selection]
+            else:
+                return self._take(dataset, self.selection)
+
+    def _memmap(self, dataset):
+        """The dataset mapped from the file, or None if it can not be"""
+        if (dataset.is_virtual or (dataset.chunks is not None) or
+                (dataset.dtype.kind not in 'biuf')):
+            return None
+        else:
+            pass
+
+        offset = dataset.id.get_offset()
+        if offset is None:
+            # Storage has not been allocated
+            return None
+        else:
+            return np.memmap(self.filename, dtype=dataset.dtype, mode='c',
+                             offset=offset, shape=dataset.shape)
+
+    def _take(self, dataset, rows):
+        """dataset[rows] reading only the blocks with selected rows"""
+        block = self.block if dataset.chunks is None else dataset.chunks[0]
+        order = np.argsort(rows, kind='stable')
+        rows = rows[order]
+
+        # Runs of consecutive blocks with selected rows, read about a
+        # million rows at a time
+        blocks = np.unique(rows//block)
+        breaks = np.flatnonzero(np.diff(blocks) > 1) + 1
+        step = block*max(2**20//block, 1)
+        data = np.empty(len(rows), dtype=dataset.dtype)
+        for run in np.split(blocks, breaks):
+            end = min((run[-1] + 1)*block, dataset.shape[0])
+            for start in range(run[0]*block, end, step):
+                stop = min(start + step, end)
+                q = slice(*np.searchsorted(rows, [start, stop]))
+                data[q] = dataset[start:stop][rows[q] - start]
+
+        # Back to the requested order
+        result = np.empty_like(data)
+        result[order] = data
+        return result
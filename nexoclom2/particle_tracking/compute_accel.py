@@ -1,5 +1,4 @@
 import numpy as np
-import astropy.units as u
 
 
 def compute_accel(packets, output):
@@ -13,7 +12,13 @@ def compute_accel(packets, output):
     
     Returns
     -------
-    Numpy array with 3 components of the acceleration.
+    Numpy array with 3 components of the acceleration in output.unit/s**2.
+    
+    Notes
+    -----
+    Positions, velocities, and times are unitless floats in the internal unit
+    system described by output.internal. Ephemerides come from
+    output.ephemeris and are shared with lossrate for an rk stage.
     
     See Also
     --------
@@ -22,12 +27,14 @@ def compute_accel(packets, output):
     nexoclom2.particle_tracking.Output.Output
     """
     
-    accel = np.zeros_like(packets.V)/u.s
+    internal = output.internal
+    ephemeris = output.ephemeris.at(packets)
+    accel = np.zeros_like(packets.V)
     if output.inputs.forces.gravity:
-        for obj in output.objects.values():
-            X = packets.X - output.positions[obj.object].X(packets.time)
+        for name, GM in internal.GM.items():
+            X = packets.X - ephemeris.X(name)
             r3 = np.sum(X**2, axis=1)**1.5
-            accel += obj.GM * X/r3[:,np.newaxis]
+            accel += GM * X/r3[:,np.newaxis]
     else:
         pass
     
@@ -41,28 +48,26 @@ def compute_accel(packets, output):
         out_of_shadow = np.ones(len(packets), dtype=bool)
         for obj in output.objects.values():
             if obj.type != 'Star':
-                out_of_shadow *= output.positions[obj.object].out_of_shadow(
-                    obj, packets)
+                out_of_shadow &= ephemeris.out_of_shadow(
+                    obj.object, internal.radius[obj.object], packets.X)
             else:
                 pass
             
         if output.inputs.geometry.center == 'Sun':
-            startpt = output.positions[output.inputs.geometry.startpoint]
-            sundir = -startpt.sun_dir(packets.time)
+            sundir = -ephemeris.sun_dir(output.inputs.geometry.startpoint)
             v_r = np.sum(packets.V * sundir, axis=1)
-            r_sun = np.linalg.norm(packets.X, axis=1).to(u.au)
-            a_rad = output.species.gvalues.radaccel(v_r, r_sun) * out_of_shadow
+            r_sun = np.linalg.norm(packets.X, axis=1)
+            a_rad = internal.radaccel(v_r, r_sun) * out_of_shadow
         else:
-            cent = output.positions[output.inputs.geometry.center]
-            sundir = -cent.sun_dir(packets.time)
+            center = output.inputs.geometry.center
+            sundir = -ephemeris.sun_dir(center)
             v_r = np.sum(packets.V * sundir, axis=1)
             
-            r_sun = cent.r_sun(packets.time)
+            r_sun = ephemeris.r_sun(center)
             X_sun = packets.X + r_sun[:, np.newaxis]*sundir
             r_sun = np.linalg.norm(X_sun, axis=1)
-            drdt_sun = cent.drdt_sun(packets.time)
-            a_rad = (output.species.gvalues.radaccel(v_r + drdt_sun, r_sun) *
-                     out_of_shadow)
+            drdt_sun = ephemeris.drdt_sun(center)
+            a_rad = internal.radaccel(v_r + drdt_sun, r_sun) * out_of_shadow
             
         accel += a_rad[:,np.newaxis] * sundir
     else:
@@ -1,54 +1,78 @@
 import numpy as np
 import astropy.units as u
-import h5py
 import copy
+from nexoclom2.particle_tracking.columns import ColumnView
 
 
 class FinalState:
+    """Final state of the packets in a model output.
+    
+    Columns are read from the savefile the first time they are used, and
+    only the selected packets are read (see ColumnView).
+    
+    Parameters
+    ----------
+    output : Output
+    which : None, 'last', boolean array, or integer array
+        Packets to use. 'last' selects the packets at the end of the model
+        run. Default = all packets
+    """
     def __init__(self, output, which=None):
-        with h5py.File(output.savefile, 'r') as store:
-            final_state = store['final_state']
-            if which is None:
-                which = np.ones((len(final_state['x']), )).astype(bool)
-            elif isinstance(which, str) and (which == 'last'):
-                which = final_state['time'][:] == 0
-            else:
-                pass
-            
-            self.time = final_state['time'][which]*u.s
-            self.x = final_state['x'][which]*output.unit
-            self.y = final_state['y'][which]*output.unit
-            self.z = final_state['z'][which]*output.unit
-            self.vx = final_state['vx'][which]*output.unit/u.s
-            self.vy = final_state['vy'][which]*output.unit/u.s
-            self.vz = final_state['vz'][which]*output.unit/u.s
-            self.frac = final_state['frac'][which]
-            self.escaped = final_state['escaped'][which]
-            self.hit = {obj: final_state['hit'][obj][which] for obj in output.objects}
-            self.ionized = final_state['ionized'][which]
-            self.iteration = final_state['iteration'][which]
-            self.packet_number = final_state['packet_number'][which]
+        if isinstance(which, str) and (which == 'last'):
+            which = ColumnView(output.savefile, 'final_state',
+                               layout=output.layout).read('time') == 0
+        else:
+            pass
+        
+        self._columns = ColumnView(output.savefile, 'final_state', which,
+                                   output.layout)
+        self._objects = list(output.objects)
+        self._units = {'time': u.s,
+                       'x': output.unit,
+                       'y': output.unit,
+                       'z': output.unit,
+                       'vx': output.unit/u.s,
+                       'vy': output.unit/u.s,
+                       'vz': output.unit/u.s,
+                       'frac': None,
+                       'escaped': None,
+                       'ionized': None,
+                       'iteration': None,
+                       'packet_number': None}
+    
+    def __getattr__(self, name):
+        # Only called for columns that have not been read
+        if name == 'hit':
+            value = {obj: self._columns.read(f'hit/{obj}')
+                     for obj in self._objects}
+        elif name.startswith('_') or (name not in self._units):
+            raise AttributeError(name)
+        elif self._units[name] is None:
+            value = self._columns.read(name)
+        else:
+            value = self._columns.read(name) << self._units[name]
+        
+        self.__dict__[name] = value
+        return value
 
     def __getitem__(self, q):
         new = copy.copy(self)
-        new.time = self.time[q]
-        new.x = self.x[q]
-        new.y = self.y[q]
-        new.z = self.z[q]
-        new.vx = self.vx[q]
-        new.vy = self.vy[q]
-        new.vz = self.vz[q]
-        new.frac = self.frac[q]
-        new.escaped = self.escaped[q]
-        new.hit = {obj: self.hit[obj][q] for obj in self.hit}
-        new.ionized = self.ionized[q]
-        new.iteration = self.iteration[q]
-        new.packet_number = self.packet_number[q]
+        new._columns = self._columns[q]
+        for name, value in self.__dict__.items():
+            if name == 'hit':
+                new.hit = {obj: value[obj][q] for obj in value}
+            elif name in self._units:
+                new.__dict__[name] = value[q]
+            else:
+                pass
 
         return new
     
     def __len__(self):
-        return len(self.time)
+        if 'time' in self.__dict__:
+            return len(self.time)
+        else:
+            return len(self._columns)
     
     def concatenate(self, new):
         self.x = np.concatenate([self.x, new.x])
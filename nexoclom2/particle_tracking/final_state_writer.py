@@ -0,0 +1,159 @@
+import queue
+import threading
+import numpy as np
+import h5py
+from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
+
+
+class FinalStateWriter:
+    """Writes the final states of an iteration to its temporary file.
+
+    The integrators save the packets after every step. Instead of opening the
+    file and resizing each dataset every time, the packets are copied into a
+    buffer. When the buffer holds ``buffer_size`` packets it is written on a
+    background thread while the integration continues. The file is open
+    until the writer is closed.
+
+    The buffer size is set with ``final_state_buffer`` in the nexoclom2
+    configuration file (default 100000 packets).
+
+    Parameters
+    ----------
+    filename : str
+        File with the final_state datasets made by Output._save_start_point
+    buffer_size : int, optional
+        Number of packets buffered before writing. Overrides the
+        configuration file.
+
+    Notes
+    -----
+    Packets are only on disk after flush() or close(). An error writing the
+    file is raised in the integration thread at the next write, flush, or
+    close.
+    """
+    def __init__(self, filename, buffer_size=None):
+        if buffer_size is None:
+            config = NexoclomConfig()
+            buffer_size = int(config.__dict__.get('final_state_buffer',
+                                                  100000))
+        else:
+            pass
+
+        self.filename = filename
+        self.buffer_size = max(int(buffer_size), 1)
+        self._buffer = []
+        self._n_buffered = 0
+        self._error = None
+        self._closed = False
+
+        # At most two chunks wait to be written, so the buffers can not
+        # grow without limit if the disk is slower than the integration.
+        self._store = h5py.File(filename, 'a')
+        self._queue = queue.Queue(maxsize=2)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _columns(final_state):
+        """Copies of the columns of a StateVector keyed by dataset name"""
+        columns = {}
+        for key, value in final_state.__dict__.items():
+            if key == 'X':
+                for i, name in enumerate(('x', 'y', 'z')):
+                    columns[name] = np.array(value[:,i])
+            elif key == 'V':
+                for i, name in enumerate(('vx', 'vy', 'vz')):
+                    columns[name] = np.array(value[:,i])
+            elif key in ('accel', 'ioniz'):
+                # Integrator bookkeeping, not saved
+                pass
+            elif key == 'hit':
+                for objname, hit in value.items():
+                    columns[f'hit/{objname}'] = np.array(hit)
+            else:
+                columns[key] = np.array(value)
+
+        return columns
+
+    def write(self, final_state):
+        """Add the packets in a StateVector to the final state"""
+        self._check()
+        if len(final_state) == 0:
+            return
+        else:
+            pass
+
+        self._buffer.append(self._columns(final_state))
+        self._n_buffered += len(final_state)
+        if self._n_buffered >= self.buffer_size:
+            self._submit()
+        else:
+            pass
+
+    def flush(self):
+        """Write everything buffered and wait for it to be on disk"""
+        self._submit()
+        self._queue.join()
+        self._check()
+        self._store.flush()
+
+    def close(self):
+        """Flush and close the file. The writer can not be used afterwards."""
+        if self._closed:
+            return
+        else:
+            pass
+
+        self._closed = True
+        try:
+            self.flush()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+            self._store.close()
+
+    def _check(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        else:
+            pass
+
+    def _submit(self):
+        if len(self._buffer) > 0:
+            self._queue.put(self._buffer)
+            self._buffer, self._n_buffered = [], 0
+        else:
+            pass
+
+    def _run(self):
+        """Write chunks from the queue until given None"""
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None:
+                    return
+                elif self._error is None:
+                    self._write(chunk)
+                else:
+                    # Nothing more is written after an error
+                    pass
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _write(self, chunk):
+        final_state = self._store['final_state']
+        for name in chunk[0]:
+            data = np.concatenate([columns[name] for columns in chunk])
+            dataset = final_state[name]
+            old_len = dataset.shape[0]
+            dataset.resize((old_len + len(data), ))
+            dataset[old_len:] = data
@@ -0,0 +1,97 @@
+import numpy as np
+import astropy.units as u
+
+
+class InternalUnits:
+    """Model constants converted to the integrator's internal unit system.
+
+    The integrator works with plain float64 arrays. Times are in s, distances
+    are in ``output.unit`` (the radius of the central object), velocities are
+    in ``output.unit``/s, and loss rates are in 1/s. Everything the integrator
+    needs from the model setup is converted once here so that no astropy
+    Quantities are created during a step.
+
+    Parameters
+    ----------
+    output : Output
+        nexoclom2 Output object. The objects, species, and options must
+        already be set up.
+
+    Attributes
+    ----------
+    unit : astropy unit
+        Internal distance unit
+
+    length : float
+        Size of the internal distance unit in km
+
+    GM : dict
+        GM for each included object (unit**3/s**2)
+
+    radius : dict
+        Radius of each included object (unit)
+
+    outer_edge : float
+        Outer edge of the simulation (unit)
+
+    constant_rate : float
+        Loss rate from a constant lifetime (1/s)
+
+    photo_rate, photo_refpt : float
+        Photoionization rate (1/s) at the reference distance (unit)
+
+    rotperiod : float
+        Rotation period of the planet for the plasma torus (s)
+    """
+    def __init__(self, output):
+        self.unit = output.unit
+        self.length = output.unit.to(u.km)
+
+        self.GM = {name: obj.GM.to_value(self.unit**3/u.s**2)
+                   for name, obj in output.objects.items()}
+        self.radius = {name: obj.radius.to_value(self.unit)
+                       for name, obj in output.objects.items()}
+        self.outer_edge = u.Quantity(output.inputs.options.outer_edge,
+                                     self.unit).value
+
+        # Radiation acceleration table
+        gvalues = output.species.gvalues
+        self._radaccel_v = gvalues.velocity.to_value(self.unit/u.s)
+        self._radaccel_a = gvalues._radiation_accel.to_value(self.unit/u.s**2)
+        self._radaccel_ref = gvalues._ref_dist.to_value(self.unit)
+
+        # Loss rates
+        lossinfo = output.inputs.lossinfo
+        if lossinfo.constant_lifetime:
+            self.constant_rate = 1./lossinfo.constant_lifetime.to_value(u.s)
+        else:
+            self.constant_rate = 0.
+
+        self.photo_rate = output.species.photo_rate.to_value(1/u.s)
+        self.photo_refpt = output.species.photo_refpt.to_value(self.unit)
+
+        eimp = output.species.eimp_ionization
+        self._eimp_T = eimp.T_e.to_value(u.eV)
+        self._eimp_kappa = eimp.kappa.to_value(u.cm**3/u.s)
+
+        if output.plasma is not None:
+            self.rotperiod = output.plasma.planet.rotperiod.to_value(u.s)
+        else:
+            self.rotperiod = None
+
+    def radaccel(self, drdt, r_sun):
+        """Radiation acceleration (unit/s**2)
+
+        Parameters
+        ----------
+        drdt : ndarray
+            Radial velocity relative to the Sun (unit/s)
+        r_sun : ndarray
+            Distance from the Sun (unit)
+        """
+        accel = np.interp(drdt, self._radaccel_v, self._radaccel_a)
+        return accel * (self._radaccel_ref/r_sun)**2
+
+    def eimp_ratecoef(self, T_e):
+        """Electron impact ionization rate coefficient (cm**3/s) at T_e (eV)"""
+        return np.interp(T_e, self._eimp_T, self._eimp_kappa)
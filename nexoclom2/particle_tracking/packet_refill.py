@@ -0,0 +1,108 @@
+import os
+import numpy as np
+from astropy.time import Time
+
+
+class PacketRefill:
+    """Feeds the packets of successive iterations to one VariableIntegrator.
+
+    With a variable step size most packets finish quickly and the integrator
+    spends thousands of steps on a handful of long-lived packets. When fewer
+    than threshold packets are left, the integrator asks for the next
+    iteration, drops the finished packets, and steps the new packets together
+    with the remaining ones, so the number of packets per step stays high.
+
+    Each iteration still has its own starting point, random stream, and
+    shard file. Finished packets are written to the shard of their iteration
+    and an iteration is merged into the savefile, sorted by packet_number,
+    once all its packets are finished and all earlier iterations are merged.
+
+    Parameters
+    ----------
+    output : Output
+    packets_per_it : list of int
+        Number of packets in each iteration
+    refill : float
+        The next iteration is started when fewer than
+        refill*max(packets_per_it) packets are still running.
+    """
+    def __init__(self, output, packets_per_it, refill):
+        self.output = output
+        self.packets_per_it = list(packets_per_it)
+        self.threshold = refill*max(self.packets_per_it)
+
+        self.first_iteration = output.completed_iterations
+        self.first_packet = (output.completed_packets +
+                             np.cumsum([0] + self.packets_per_it))
+        self.n_started = 0
+        self.n_closed = 0
+
+        # Number of packets in each started iteration not yet saved
+        self.remaining = {}
+        self.start_times = {}
+
+    def __len__(self):
+        return len(self.packets_per_it)
+
+    def tempfile(self, iteration):
+        return f'{self.output.savefile}_temp{iteration}'
+
+    def next_state(self):
+        """StateVector for the next iteration, or None if all have started"""
+        if self.n_started == len(self):
+            return None
+        else:
+            pass
+
+        it = self.n_started
+        iteration = self.first_iteration + it
+        self.output.tempfile = self.tempfile(iteration)
+        if os.path.exists(self.output.tempfile):
+            os.remove(self.output.tempfile)
+        else:
+            pass
+
+        self.start_times[iteration] = Time.now()
+        print(f'{self.start_times[iteration].iso}: Starting iteration {it+1} '
+              f'of {len(self)}')
+
+        state = self.output._start_iteration(iteration,
+                                             self.packets_per_it[it],
+                                             int(self.first_packet[it]))
+        self.remaining[iteration] = len(state)
+        self.n_started += 1
+
+        return state
+
+    def save(self, final_state):
+        """Save finished packets and merge the iterations that are done"""
+        output = self.output
+        iterations = final_state.iteration.astype(int)
+        for iteration in np.unique(iterations):
+            q = iterations == iteration
+            output.tempfile = self.tempfile(iteration)
+            output.save_final_state(final_state[q])
+            self.remaining[iteration] -= q.sum()
+
+        # Iterations are merged in order
+        while self.n_closed < self.n_started:
+            iteration = self.first_iteration + self.n_closed
+            if self.remaining[iteration] > 0:
+                break
+            else:
+                pass
+
+            output.tempfile = self.tempfile(iteration)
+            output._sort_final_state()
+            output.completed_packets += self.packets_per_it[self.n_closed]
+            output.completed_iterations += 1
+            output._close_iteration()
+            self.n_closed += 1
+
+            end_time = Time.now()
+            print(f'{end_time.iso}: Finished iteration {self.n_closed} '
+                  f'of {len(self)}')
+            print('Elapsed Time: '
+                  f'{(end_time - self.start_times[iteration]).quantity_str}')
+
+        output.tempfile = output.savefile+'_temp'
@@ -1,48 +1,124 @@
 import numpy as np
-import astropy.units as u
-import copy
 
 
-class Packets:
-    """Class to hold components needed for an rkstep
+class Stage:
+    """View of a single rk stage in a Packets workspace.
+
+    Has the time, X, and V attributes needed by compute_accel and lossrate.
+    The arrays are views into the workspace buffers, so creating a Stage
+    does not copy any data unless a subset q of the packets is requested.
     
-    See Numerical Recipes, 3rd edition, chapter 17.2
+    The ephemerides at the stage times are computed by the first of
+    compute_accel and lossrate and stored in ephemeris for the other.
     """
-    def __init__(self, prev):
-        # Shapes of X, V = (n_packets, n_vec_components, 7 rk steps)
-        l = len(prev)
-        self.time = np.zeros((l, 7))*prev.time.unit
-        self.time[:,0] = prev.time
-        
-        self.X = np.zeros((l, 3, 7))*prev.X.unit
-        self.X[:,:,0] = prev.X
+    def __init__(self, packets, n, q=None):
+        m = packets.n_active
+        self.time = packets.time[n,:m]
+        self.X = packets.X[n,:m]
+        self.V = packets.V[n,:m]
+        self.frac = packets.frac[n,:m]
+        self.ephemeris = None
         
-        self.V = np.zeros((l, 3, 7))*prev.V.unit
-        self.V[:,:,0] = prev.V
-        
-        self.frac = np.zeros((l, 7))
-        self.frac[:,0] = np.log(prev.frac)
-        
-        self.accel = np.zeros((l, 3, 7))*prev.V.unit/u.s
-        self.ioniz = np.zeros((l, 7))/u.s
-        
-    def __getitem__(self, q):
-        new = copy.deepcopy(self)
-        new.time = new.time[:,q]
-        new.X = new.X[:,:,q]
-        new.V = new.V[:,:,q]
-        new.frac = new.frac[:,q]
-        new.accel = new.accel[:,:,q]
-        new.ioniz = new.ioniz[:,q]
-        return new
-    
+        if q is not None:
+            self.time = self.time[q]
+            self.X = self.X[q]
+            self.V = self.V[q]
+            self.frac = self.frac[q]
+        else:
+            pass
+
     def __len__(self):
         return len(self.time)
 
-    def add_deriv(self, d):
-        # Addition only works with another Packet. Does not affect time
-        new = copy.deepcopy(self)
-        new.X = self.X + d.dXdt
-        new.V = self.V + d.dVdt
-        new.frac = self.frac + d.dfdt
-        return new
+
+class Packets:
+    """Preallocated workspace holding the components needed for an rkstep
+
+    See Numerical Recipes, 3rd edition, chapter 17.2
+
+    The buffers are allocated once for the largest number of packets in an
+    iteration and reused for every step. Each rk stage is a contiguous block
+    (stage is the first axis) so that compute_accel and lossrate work on
+    contiguous (n_packets, 3) arrays. Only the first n_active rows are used
+    in a step.
+
+    All arrays are unitless floats in the internal unit system (see
+    nexoclom2.particle_tracking.internal_units.InternalUnits).
+
+    Parameters
+    ----------
+    n_packets: int
+        Maximum number of packets stepped at once
+    """
+    def __init__(self, n_packets):
+        # Shapes of X, V = (7 rk steps, n_packets, n_vec_components)
+        self.size = n_packets
+        self.n_active = 0
+
+        self.time = np.zeros((7, n_packets))
+        self.X = np.zeros((7, n_packets, 3))
+        self.V = np.zeros((7, n_packets, 3))
+        self.frac = np.zeros((7, n_packets))
+        self.accel = np.zeros((7, n_packets, 3))
+        self.ioniz = np.zeros((7, n_packets))
+
+        # Scratch space used to build the stages without temporaries
+        self.hstep = np.zeros(n_packets)
+        self.scratch = np.zeros((n_packets, 3))
+
+        # Two result buffers so that the result of one step can be the
+        # input to the next without being overwritten.
+        self._results = [{'time': np.zeros(n_packets),
+                          'X': np.zeros((n_packets, 3)),
+                          'V': np.zeros((n_packets, 3)),
+                          'frac': np.zeros(n_packets),
+                          'accel': np.zeros((n_packets, 3)),
+                          'ioniz': np.zeros(n_packets)} for _ in range(2)]
+        self._which = 0
+
+        # Buffers for the error estimate
+        self.delta_X = np.zeros((n_packets, 3))
+        self.delta_V = np.zeros((n_packets, 3))
+        self.delta_frac = np.zeros(n_packets)
+
+    def __getitem__(self, n):
+        return Stage(self, n)
+
+    def __len__(self):
+        return self.n_active
+
+    def load(self, prev):
+        """Copy a StateVector into stage 0.
+
+        frac is stored as log(frac) so that the loss equation is linear. The
+        acceleration and loss rate carried by the StateVector from the last
+        stage of the previous step are copied into the stage 0 derivatives
+        (First Same As Last). They are NaN where they need to be computed.
+        """
+        m = len(prev)
+        if m > self.size:
+            raise ValueError('Packets.load',
+                             f'{m} packets does not fit in workspace of '
+                             f'size {self.size}')
+        else:
+            pass
+
+        self.n_active = m
+        self.time[0,:m] = prev.time
+        self.X[0,:m] = prev.X
+        self.V[0,:m] = prev.V
+        with np.errstate(divide='ignore'):
+            np.log(prev.frac, out=self.frac[0,:m])
+        self.accel[0,:m] = prev.accel
+        self.ioniz[0,:m] = prev.ioniz
+
+    def result(self):
+        """Buffers for the result of the step.
+
+        Alternates between two sets of buffers. The returned arrays are
+        overwritten two steps later.
+        """
+        m = self.n_active
+        self._which = 1 - self._which
+        return {key: value[:m] for key, value in
+                self._results[self._which].items()}
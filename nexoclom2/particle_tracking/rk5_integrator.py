@@ -1,8 +1,8 @@
 import numpy as np
-import astropy.units as u
 import copy
+from concurrent.futures import ThreadPoolExecutor
 from nexoclom2.particle_tracking.compute_accel import compute_accel
-from nexoclom2.particle_tracking.packets import Packets
+from nexoclom2.particle_tracking.packets import Packets, Stage
 from nexoclom2.atomicdata.lossrate import lossrate
 
 
@@ -38,26 +38,27 @@ E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525,
 
 
 class Delta:
-    def __init__(self, prev):
+    def __init__(self, packets):
         """ delta for adaptive step size. Format is same as prev_step in the
         integrator, except that time is not needed
         
         Parameters
         ----------
-        prev
-            prev_step in Integrator.step
+        packets
+            Packets workspace. The arrays are views into its error buffers.
         """
-        self.X = np.zeros_like(prev.X)
-        self.V = np.zeros_like(prev.V)
-        self.frac = np.zeros_like(prev.frac)
+        m = packets.n_active
+        self.X = packets.delta_X[:m]
+        self.V = packets.delta_V[:m]
+        self.frac = packets.delta_frac[:m]
     
     def __len__(self):
         return len(self.frac)
     
     def max(self):
         array = np.ndarray((len(self), 7))
-        array[:,:3] = self.X.value
-        array[:,3:6] = self.V.value
+        array[:,:3] = self.X
+        array[:,3:6] = self.V
         array[:,6] = self.frac
         return array.max(axis=1)
     
@@ -74,53 +75,158 @@ class rk5Integrator:
     v_n+1 = v_n + j_a_n
     frac_n+1 = frac_n**(h/tau_n)
     
+    The Dormand-Prince tableau is First Same As Last: the derivatives at the
+    last stage of a step are the derivatives at the first stage of the next
+    step. The stage 0 derivatives are carried in the StateVector (accel,
+    ioniz) and only evaluated when the state has changed, so a rejected step
+    is retried with five evaluations instead of six.
+    
     Parameters
     ----------
-    output : Output
-        nexoclom2 Output clas
+    n_packets : int
+        Number of packets the stage workspace is sized for. The workspace is
+        reallocated if a larger state is stepped.
+    
+    n_threads : int
+        Number of threads used to evaluate the forces and loss rates. The
+        packets in a stage are split into contiguous slices of at least
+        min_chunk packets that are evaluated concurrently.
     
     Returns
     -------
     Final state of the system
     
     """
-    def __init__(self):
-        pass
+    # Smallest slice of packets worth handing to a thread
+    min_chunk = 5000
+    
+    def __init__(self, n_packets=0, n_threads=1):
+        self.packets = Packets(n_packets)
+        
+        # Number of packet force and loss rate evaluations
+        self.n_evaluations = 0
+        
+        self.n_threads = int(n_threads)
+        if self.n_threads > 1:
+            self.pool = ThreadPoolExecutor(max_workers=self.n_threads)
+        else:
+            self.pool = None
+    
+    def close(self):
+        """Shut down the thread pool"""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        else:
+            pass
+    
+    def _evaluate(self, n, output):
+        """Compute the acceleration and loss rate for stage n in place"""
+        packets = self.packets
+        m = packets.n_active
+        accel, ioniz = packets.accel[n,:m], packets.ioniz[n,:m]
+        
+        n_chunks = min(self.n_threads, m//self.min_chunk)
+        if (self.pool is None) or (n_chunks < 2):
+            stage = packets[n]
+            accel[:] = compute_accel(stage, output)
+            ioniz[:] = lossrate(stage, output)
+        else:
+            def evaluate_slice(q):
+                stage = Stage(packets, n, q)
+                accel[q] = compute_accel(stage, output)
+                ioniz[q] = lossrate(stage, output)
+            
+            edges = np.linspace(0, m, n_chunks+1).astype(int)
+            futures = [self.pool.submit(evaluate_slice, slice(lo, hi))
+                       for lo, hi in zip(edges[:-1], edges[1:])]
+            for future in futures:
+                future.result()
+                
+        self.n_evaluations += m
+
+    def _accumulate(self, out, base, derivs, coefs, h):
+        """Compute out = base + h*sum(coefs[i]*derivs[i]) in place"""
+        m = self.packets.n_active
+        hstep = self.packets.hstep[:m]
+        scratch = self.packets.scratch[:m]
+        
+        out[:] = base
+        for coef, deriv in zip(coefs, derivs):
+            if coef != 0:
+                np.multiply(h, coef, out=hstep)
+                if out.ndim == 2:
+                    np.multiply(hstep[:,np.newaxis], deriv, out=scratch)
+                    out += scratch
+                else:
+                    hstep *= deriv
+                    out += hstep
+            else:
+                pass
 
     def step(self, prev_step, output, h):
         """Perform a single rk5 step.
         
         See Numerical Recipes, 3rd edition, chapter 17.2
+        
+        The stages are computed in place in the preallocated Packets
+        workspace. The time, X, V, and frac arrays of the returned state are
+        views into the workspace and are overwritten two steps later.
         """
-        next_step = Packets(prev_step)
+        if len(prev_step) > self.packets.size:
+            self.packets = Packets(len(prev_step))
+        else:
+            pass
+        
+        packets = self.packets
+        packets.load(prev_step)
+        m = packets.n_active
+        time, frac = packets.time[:,:m], packets.frac[:,:m]
+        X, V = packets.X[:,:m], packets.V[:,:m]
+        accel, ioniz = packets.accel[:,:m], packets.ioniz[:,:m]
+        
+        # The derivatives at stage 0 are carried in the StateVector. They are
+        # only computed for packets that are new or whose state has changed
+        # since they were last computed.
+        need = np.isnan(ioniz[0])
+        if need.all():
+            self._evaluate(0, output)
+        elif need.any():
+            stage = Stage(packets, 0, need)
+            accel[0,need] = compute_accel(stage, output)
+            ioniz[0,need] = lossrate(stage, output)
+            self.n_evaluations += need.sum()
+        else:
+            pass
+        
+        # Store them so they are reused if the step is rejected
+        prev_step.accel[:] = accel[0]
+        prev_step.ioniz[:] = ioniz[0]
+        
         for n in range(6):
-            next_step.accel[:,:,n] = compute_accel(next_step[n], output)
-            next_step.ioniz[:,n] = lossrate(next_step[n], output)
+            if n > 0:
+                self._evaluate(n, output)
+            else:
+                pass
             
-            next_step.time[:,n+1] = h*c[n+1]
-            for i in range(n+1):
-                next_step.X[:,:,n+1] += h[:,np.newaxis]*a[n+1,i]*next_step.V[:,:,i]
-                next_step.V[:,:,n+1] += (h[:,np.newaxis]*a[n+1,i]*
-                                         next_step.accel[:,:,i])
-                next_step.frac[:,n+1] += -h*a[n+1,i]*next_step.ioniz[:,i]
-                
-            next_step.time[:,n+1] += next_step.time[:,0]
-            next_step.X[:,:,n+1] += next_step.X[:,:,0]
-            next_step.V[:,:,n+1] += next_step.V[:,:,0]
-            next_step.frac[:,n+1] += next_step.frac[:,0]
+            np.multiply(h, c[n+1], out=time[n+1])
+            time[n+1] += time[0]
+            self._accumulate(X[n+1], X[0], V[:n+1], a[n+1,:n+1], h)
+            self._accumulate(V[n+1], V[0], accel[:n+1], a[n+1,:n+1], h)
+            self._accumulate(frac[n+1], frac[0], ioniz[:n+1],
+                             -a[n+1,:n+1], h)
         
         constant_step = hasattr(output.inputs.options, 'step_size')
         if not constant_step:
             # Δ = y_n+1 - ystar_n+1
-            delta = Delta(prev_step)
-            for i in range(6):
-                delta.X += bd[i]*next_step.V[:,:,i]*u.s
-                delta.V += bd[i]*next_step.accel[:,:,i]*u.s
-                delta.frac += bd[i]*next_step.ioniz[:,i]*u.s
-
-            delta.X = np.abs(h[:,np.newaxis].value*delta.X)
-            delta.V = np.abs(h[:,np.newaxis].value*delta.V)
-            delta.frac = np.abs(h.value*delta.frac)
+            delta = Delta(packets)
+            zeros = np.zeros((1, 3))
+            self._accumulate(delta.X, zeros, V[:6], bd[:6], h)
+            self._accumulate(delta.V, zeros, accel[:6], bd[:6], h)
+            self._accumulate(delta.frac, 0., ioniz[:6], bd[:6], h)
+            np.abs(delta.X, out=delta.X)
+            np.abs(delta.V, out=delta.V)
+            np.abs(delta.frac, out=delta.frac)
 
             assert np.all(np.isfinite(delta.X))
             assert np.all(np.isfinite(delta.V))
@@ -129,11 +235,25 @@ class rk5Integrator:
             delta = None
             
         # Put frac back the way it should be
+        buffers = packets.result()
+        buffers['time'][:] = time[6]
+        buffers['X'][:] = X[6]
+        buffers['V'][:] = V[6]
+        np.exp(frac[6], out=buffers['frac'])
+        
+        # Since a[6,:] = b, the derivatives at stage 6 are the stage 0
+        # derivatives of the next step. They are computed at the start of
+        # the next step, and only for packets that were accepted.
+        buffers['accel'][:] = 0
+        buffers['ioniz'][:] = np.nan
+        
         result = copy.copy(prev_step)
-        result.time = next_step.time[:,6]
-        result.X = next_step.X[:,:,6]
-        result.V = next_step.V[:,:,6]
-        result.frac = np.exp(next_step.frac[:,6])
+        result.time = buffers['time']
+        result.X = buffers['X']
+        result.V = buffers['V']
+        result.frac = buffers['frac']
+        result.accel = buffers['accel']
+        result.ioniz = buffers['ioniz']
         
         assert np.all(np.isfinite(result.X))
         assert np.all(np.isfinite(result.V))
@@ -0,0 +1,230 @@
+"""Model outputs stored as one file per iteration.
+
+Each iteration is saved in its own file (a shard) in a directory next to the
+savefile and is not changed after the iteration is closed. The savefile only
+has HDF5 virtual datasets that join the columns of the shards in iteration
+order, so it can be read as if the columns were stored in it. Adding an
+iteration moves its file into the directory and rewrites the virtual
+datasets without copying any packets.
+
+Savefiles from before shards have the packets stored in them. When more
+iterations are added to one of them, it is moved into the directory as the
+first shard. Shards from before start times were saved as seconds have them
+as ISO strings. Their rows of ``starting_point/ut`` are NaN, and the strings
+are joined in ``starting_point/ut_iso``, so the shards are not changed.
+StartingPointSaved converts them when they are read.
+"""
+import os
+import shutil
+import numpy as np
+import h5py
+
+
+LEGACY_SHARD = 'legacy.h5'
+UT = 'starting_point/ut'
+UT_ISO = 'starting_point/ut_iso'
+
+
+def shard_directory(savefile):
+    """Directory with the shards for a savefile"""
+    return f'{os.path.splitext(savefile)[0]}_iterations'
+
+
+def shard_filename(savefile, iteration):
+    return os.path.join(shard_directory(savefile),
+                        f'iteration{int(iteration):06d}.h5')
+
+
+def is_sharded(savefile):
+    """True if the savefile has virtual datasets pointing to shards"""
+    with h5py.File(savefile, 'r') as store:
+        return store['starting_point/time'].is_virtual
+
+
+def add_shard(savefile, tempfile, iteration):
+    """Add an iteration saved in tempfile to the savefile.
+
+    Parameters
+    ----------
+    savefile : str
+    tempfile : str
+        File with the starting_point and final_state of the iteration. It is
+        moved into the shard directory.
+    iteration : int
+    """
+    directory = shard_directory(savefile)
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(savefile) and is_sharded(savefile):
+        index = Index.from_savefile(savefile)
+    elif os.path.exists(savefile):
+        legacy = os.path.join(directory, LEGACY_SHARD)
+        os.rename(savefile, legacy)
+        index = Index(savefile)
+        index.add(legacy)
+    else:
+        # Shards left from a removed savefile are not used
+        index = Index(savefile)
+
+    shard = shard_filename(savefile, iteration)
+    os.rename(tempfile, shard)
+    index.add(shard)
+    index.write()
+
+
+class Index:
+    """The shards joined by the virtual datasets of a savefile.
+
+    Attributes
+    ----------
+    savefile : str
+    sources : dict
+        For each column, e.g., 'final_state/x', a list of the shards with
+        packets, as (filename relative to the savefile, number of packets).
+        The filename is None for rows without values in the column.
+    dtypes : dict
+        dtype of each column
+    attrs : dict
+        Attributes of the file ('') and of each group
+    """
+    def __init__(self, savefile):
+        self.savefile = savefile
+        self.sources = {}
+        self.dtypes = {}
+        self.attrs = {}
+
+    @classmethod
+    def from_savefile(cls, savefile):
+        """Index from the virtual datasets already in a savefile"""
+        index = cls(savefile)
+        with h5py.File(savefile, 'r') as store:
+            index.attrs[''] = dict(store.attrs)
+            for groupname in ('starting_point', 'final_state'):
+                index.attrs[groupname] = dict(store[groupname].attrs)
+                for column in _columns(store[groupname]):
+                    dataset = store[f'{groupname}/{column}']
+                    index.sources[dataset.name[1:]] = _sources(dataset)
+                    index.dtypes[dataset.name[1:]] = dataset.dtype
+
+        return index
+
+    def add(self, filename):
+        """Add the columns of a shard after the shards already indexed.
+
+        Attributes already in the index are kept. dtypes are updated to
+        those of the new shard. Start times saved as ISO strings are indexed
+        as UT_ISO, leaving their rows of UT empty.
+        """
+        name = os.path.relpath(filename, os.path.dirname(self.savefile))
+        previous = sum(n for _, n in self.sources.get('starting_point/time',
+                                                      []))
+        with h5py.File(filename, 'r') as store:
+            self._add_attrs('', store)
+            for groupname in ('starting_point', 'final_state'):
+                self._add_attrs(groupname, store[groupname])
+                for column in _columns(store[groupname]):
+                    source = f'{groupname}/{column}'
+                    length = store[source].shape[0]
+                    if source != UT:
+                        key, other = source, None
+                    elif store[source].dtype.kind == 'f':
+                        key, other = UT, UT_ISO
+                    else:
+                        key, other = UT_ISO, UT
+
+                    if key in self.sources:
+                        pass
+                    elif (other is not None) and (previous > 0):
+                        self.sources[key] = [(None, previous)]
+                    else:
+                        self.sources[key] = []
+
+                    if length > 0:
+                        self.sources[key].append((name, length))
+                        if other in self.sources:
+                            self.sources[other].append((None, length))
+                        else:
+                            pass
+                    else:
+                        pass
+                    self.dtypes[key] = store[source].dtype
+
+    def _add_attrs(self, name, item):
+        attrs = self.attrs.setdefault(name, {})
+        for key, value in item.attrs.items():
+            attrs.setdefault(key, value)
+
+    def write(self):
+        """Write the virtual datasets to the savefile"""
+        tempfile = f'{self.savefile}.{os.getpid()}.tmp'
+        with h5py.File(tempfile, 'w') as store:
+            store.attrs.update(self.attrs[''])
+            for groupname in ('starting_point', 'final_state'):
+                store.create_group(groupname).attrs.update(
+                    self.attrs[groupname])
+
+            for key, sources in self.sources.items():
+                length = sum(n for _, n in sources)
+                layout = h5py.VirtualLayout(shape=(length, ),
+                                            maxshape=(None, ),
+                                            dtype=self.dtypes[key])
+                start = 0
+                for filename, n in sources:
+                    if filename is not None:
+                        layout[start:start+n] = h5py.VirtualSource(
+                            filename, UT if key == UT_ISO else key,
+                            shape=(n, ))
+                    else:
+                        pass
+                    start += n
+                fillvalue = np.nan if self.dtypes[key].kind == 'f' else None
+                store.create_virtual_dataset(key, layout, fillvalue=fillvalue)
+
+        os.replace(tempfile, self.savefile)
+
+
+def _sources(dataset):
+    """Shards joined by a virtual dataset as in Index.sources"""
+    bounds = sorted((source.vspace.get_select_bounds(), source.file_name)
+                    for source in dataset.virtual_sources())
+    sources = []
+    end = 0
+    for ((start, ), (last, )), filename in bounds:
+        if start > end:
+            sources.append((None, start - end))
+        else:
+            pass
+        sources.append((filename, last + 1 - start))
+        end = last + 1
+
+    if dataset.shape[0] > end:
+        sources.append((None, dataset.shape[0] - end))
+    else:
+        pass
+
+    return sources
+
+
+def _columns(group, prefix=''):
+    """Names of the datasets in a group and its subgroups"""
+    names = []
+    for key, item in group.items():
+        if isinstance(item, h5py.Group):
+            names.extend(_columns(item, f'{prefix}{key}/'))
+        else:
+            names.append(f'{prefix}{key}')
+
+    return names
+
+
+def remove(savefile):
+    """Remove a savefile and its shards"""
+    if os.path.exists(savefile):
+        os.remove(savefile)
+    else:
+        pass
+
+    directory = shard_directory(savefile)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    else:
+        pass
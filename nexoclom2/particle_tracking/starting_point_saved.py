@@ -1,44 +1,94 @@
 import numpy as np
 import astropy.units as u
 from astropy.time import Time
-import h5py
-from nexoclom2.solarsystem import SSObject
+from nexoclom2.particle_tracking.columns import ColumnView
 
 
 class StartingPointSaved:
+    """Starting points of the packets in a model output.
+    
+    Columns are read from the savefile the first time they are used, and
+    only the selected packets are read (see ColumnView).
+    
+    Parameters
+    ----------
+    output : Output
+    iteration : int, optional
+        Use the packets from one iteration
+    n_packets : int, optional
+        Use the first n_packets packets
+    """
     def __init__(self, output, iteration=None, n_packets=None):
         super().__init__()
         
-        with h5py.File(output.savefile, 'r') as store:
-            starting_point = store['starting_point']
+        if iteration is not None:
+            which = ColumnView(output.savefile, 'starting_point',
+                               layout=output.layout).read('iteration')
+            which = which == iteration
+        elif n_packets is not None:
+            which = slice(0, int(n_packets))
+        else:
+            which = None
         
-            unit = SSObject(output.startpoint).unit
-            if iteration is not None:
-                q = starting_point['iteration'][:] == iteration
-            elif n_packets is not None:
-                q = np.arange(n_packets).astype(int)
+        self._columns = ColumnView(output.savefile, 'starting_point', which,
+                                   output.layout)
+        self.frame = self._columns.attrs['frame']
+        self._ut = None
+        
+        unit = output.objects[output.startpoint].unit
+        self._units = {'time': u.s,
+                       'x': unit,
+                       'y': unit,
+                       'z': unit,
+                       'r': unit,
+                       'vx': unit/u.s,
+                       'vy': unit/u.s,
+                       'vz': unit/u.s,
+                       'v': unit/u.s,
+                       'frac': None,
+                       'longitude': u.deg,
+                       'latitude': u.deg,
+                       'local_time': u.hr,
+                       'altitude': u.deg,
+                       'azimuth': u.deg,
+                       'iteration': None,
+                       'packet_number': None}
+    
+    def __getattr__(self, name):
+        # Only called for columns that have not been read
+        if name.startswith('_') or (name not in self._units):
+            raise AttributeError(name)
+        elif self._units[name] is None:
+            value = self._columns.read(name)
+        else:
+            value = self._columns.read(name) << self._units[name]
+        
+        self.__dict__[name] = value
+        return value
+            
+    @property
+    def ut(self):
+        """astropy Time at which each packet starts"""
+        if self._ut is not None:
+            pass
+        elif 'ut_epoch' in self._columns.attrs:
+            epoch = Time(self._columns.attrs['ut_epoch'],
+                         scale=self._columns.attrs['ut_scale'])
+            seconds = self._columns.read('ut')
+            iso = np.isnan(seconds)
+            if np.any(iso):
+                # Shards from before ut was saved as seconds (see shards)
+                strings = self._columns.read('ut_iso')[iso]
+                seconds[iso] = (Time([x.decode() for x in strings]) -
+                                epoch).to_value(u.s)
             else:
-                q = np.ones((len(starting_point['x']), )).astype(bool)
-                
-            self.time = starting_point['time'][q]*u.s
-            self.ut = Time([x.decode() for x in starting_point['ut'][q]])
-            self.x = starting_point['x'][q]*unit
-            self.y = starting_point['y'][q]*unit
-            self.z = starting_point['z'][q]*unit
-            self.r = starting_point['r'][q]*unit
-            self.vx = starting_point['vx'][q]*unit/u.s
-            self.vy = starting_point['vy'][q]*unit/u.s
-            self.vz = starting_point['vz'][q]*unit/u.s
-            self.v = starting_point['v'][q]*unit/u.s
-            self.frac = starting_point['frac'][q]
-            self.longitude = starting_point['longitude'][q]*u.deg
-            self.latitude = starting_point['latitude'][q]*u.deg
-            self.local_time = starting_point['local_time'][q]*u.hr
-            self.altitude = starting_point['altitude'][q]*u.deg
-            self.azimuth = starting_point['azimuth'][q]*u.deg
-            self.iteration = starting_point['iteration'][q]
-            self.packet_number = starting_point['packet_number'][q]
-            self.frame = starting_point.attrs['frame']
+                pass
+            self._ut = epoch + seconds*u.s
+        else:
+            # Files from before ut was saved as seconds have ISO strings
+            self._ut = Time([x.decode() for x in self._columns.read('ut')])
             
+        return self._ut
+    
     def __len__(self):
-        return len(self.x) if hasattr(self, 'x') else None
+        return len(self._columns)
@@ -1,14 +1,14 @@
 import numpy as np
 import astropy.units as u
 import copy
-from nexoclom2.solarsystem.frames import Frame
 
 
 class StateVector:
     def __init__(self, output, starting_point):
         """ Puts a starting_point into the correct frame to run the integrator
         
-        All units are s, km, or km/s
+        Values are converted once to unitless float64 arrays in the internal
+        unit system: time in s, X in output.unit, and V in output.unit/s.
         
         Parameters
         ----------
@@ -16,11 +16,11 @@ class StateVector:
         starting_point
         """
         npack = len(starting_point)
-        self.time = starting_point.time
+        self.time = starting_point.time.to_value(u.s).copy()
         
         # Move packets to proper position
         startpt = output.positions[output.startpoint]
-        X_obj, V_obj = startpt.X(self.time), startpt.V(self.time)
+        X_obj, V_obj = startpt.X_value(self.time), startpt.V_value(self.time)
         
         # Rotate vectors to proper frame
         X0 = np.column_stack([starting_point.x,
@@ -29,21 +29,20 @@ class StateVector:
         V0 = np.column_stack([starting_point.vx,
                               starting_point.vy,
                               starting_point.vz]).to(output.unit/u.s)
-        step0 = X0 + V0*1000*u.s
         
         if output.frame.frame == 'J2000':
-            X1 = starting_point.frame.to_j2000(starting_point.time, X0)
-            V1 = starting_point.frame.to_j2000(starting_point.time, V0)
+            X1, V1 = starting_point.frame.rotate(starting_point.time, 'J2000',
+                                                 X0, V0)
         elif output.frame.frame.endswith('SOLAR'):
-            X1 = starting_point.frame.to_solar(starting_point.time, X0)
-            V1 = starting_point.frame.to_solar(starting_point.time, V0)
+            X1, V1 = starting_point.frame.rotate(starting_point.time, 'SOLAR',
+                                                 X0, V0)
         else:
             assert False, 'Should not be able to get here'
         
-        self.X = (X1 + X_obj).to(output.unit)
-        self.V = (V1 + V_obj).to(output.unit/u.s)
+        self.X = X1.to_value(output.unit) + X_obj
+        self.V = V1.to_value(output.unit/u.s) + V_obj
         
-        self.frac = starting_point.frac
+        self.frac = np.array(starting_point.frac, dtype=float)
         self.escaped = np.zeros(npack)
         self.hit = {obj: np.zeros(npack) for obj in
                     output.inputs.geometry.included}
@@ -51,6 +50,11 @@ class StateVector:
         self.packet_number = starting_point.packet_number
         self.iteration = np.zeros(npack) + starting_point.iteration
         
+        # Acceleration and loss rate at the current state. These are carried
+        # between rk steps; NaN means they need to be computed.
+        self.accel = np.zeros((npack, 3))
+        self.ioniz = np.zeros(npack) + np.nan
+        
     def __getitem__(self, q):
         new = copy.copy(self)
         new.time = new.time[q]
@@ -62,6 +66,8 @@ class StateVector:
         new.hit = {obj: new.hit[obj][q] for obj in new.hit}
         new.packet_number = new.packet_number[q]
         new.iteration = new.iteration[q]
+        new.accel = new.accel[q,:]
+        new.ioniz = new.ioniz[q]
         assert len(new.__dict__) == len(self.__dict__)
         return new
     
@@ -76,22 +82,41 @@ class StateVector:
             self.hit[obj][q] = new.hit[obj]
         self.packet_number[q] = new.packet_number
         self.iteration[q] = new.iteration
+        self.accel[q,:] = new.accel
+        self.ioniz[q] = new.ioniz
 
     def __len__(self):
         return self.time.shape[0]
 
+    def extend(self, other):
+        """Append the packets in another StateVector"""
+        self.time = np.concatenate([self.time, other.time])
+        self.X = np.concatenate([self.X, other.X])
+        self.V = np.concatenate([self.V, other.V])
+        self.frac = np.concatenate([self.frac, other.frac])
+        self.escaped = np.concatenate([self.escaped, other.escaped])
+        self.ionized = np.concatenate([self.ionized, other.ionized])
+        self.hit = {obj: np.concatenate([self.hit[obj], other.hit[obj]])
+                    for obj in self.hit}
+        self.packet_number = np.concatenate([self.packet_number,
+                                             other.packet_number])
+        self.iteration = np.concatenate([self.iteration, other.iteration])
+        self.accel = np.concatenate([self.accel, other.accel])
+        self.ioniz = np.concatenate([self.ioniz, other.ioniz])
+
     def surface_interaction(self, output):
         surfint = output.inputs.surfaceinteraction
         for objname in output.objects:
-            obj, pos = output.objects[objname], output.positions[objname]
+            pos = output.positions[objname]
+            radius = output.internal.radius[objname]
             # coordinates relative to the object
-            objX = pos.X(self.time)
-            objV = pos.V(self.time)
+            objX = pos.X_value(self.time)
+            objV = pos.V_value(self.time)
             X = self.X - objX
             V = self.V - objV
             
             tempR = np.sum(X**2, axis=1)
-            hitobj = tempR < obj.radius**2
+            hitobj = tempR < radius**2
             
             if hitobj.any():
                 X = X[hitobj, :]
@@ -108,7 +133,7 @@ class StateVector:
                 # Update coordinates on surface
                 vel2 = np.sum(V**2, axis=1)
                 b = -2 * np.sum(X*V, axis=1)
-                rad2 = np.sum(X**2, axis=1) - obj.radius**2
+                rad2 = np.sum(X**2, axis=1) - radius**2
                 d = np.sqrt(b**2 - 4*vel2*rad2)
                 
                 t0 = (-b - d)/(2*vel2)
@@ -117,10 +142,10 @@ class StateVector:
                 
                 Xnew = X - V*t[:,np.newaxis]
                 Rnew = np.sum(Xnew**2, axis=1)
-                assert np.allclose(Rnew, obj.radius**2)
+                assert np.allclose(Rnew, radius**2)
                 
                 # Put back in center's refframe
-                Xnew += pos.X(self.time[hitobj])
+                Xnew += pos.X_value(self.time[hitobj])
                 
                 # Update velocity -- this will depend on stickfunction
                 # newV = np.sqrt(vel2 + 2*obj.GM.value *
@@ -135,28 +160,33 @@ class StateVector:
                 # Put back into step
                 self.time[hitobj] -= t  # This is the time it hit the surface
                 self.X[hitobj,:] = Xnew
+                
+                # Packets have moved, so the carried derivatives are stale
+                self.ioniz[hitobj] = np.nan
                 # self.V[hitobj,:] = Vnew
                 
             else:
                 pass
 
     def check_escape(self, output):
-        pos = output.positions[output.inputs.options.edge_origin].X(self.time)
+        edge_origin = output.positions[output.inputs.options.edge_origin]
+        pos = edge_origin.X_value(self.time)
         tempR2 = np.sum((self.X-pos)**2, axis=1)
-        escaped = tempR2 >= output.inputs.options.outer_edge**2
+        escaped = tempR2 >= output.internal.outer_edge**2
         self.escaped[escaped] += self.frac[escaped]
         self.frac[escaped] = 0
         
     def vecmul(self, vec):
         # Multiplication only works with a constant. Does not affect time.
-        new = copy.deepcopy(self)
+        # The bookkeeping arrays are shared with self.
+        new = copy.copy(self)
         new.X = vec[:,np.newaxis] * self.X
         new.V = vec[:,np.newaxis] * self.V
         new.frac = vec * self.frac
         return new
         
     def constmul(self, const):
-        new = copy.deepcopy(self)
+        new = copy.copy(self)
         new.X = const * self.X
         new.V = const * self.V
         new.frac = const * self.frac
@@ -164,7 +194,7 @@ class StateVector:
     
     def __add__(self, other):
         # Addition only works with another Packet. Does not affect time
-        new = copy.deepcopy(self)
+        new = copy.copy(self)
         new.X = self.X + other.X
         new.V = self.V + other.V
         new.frac = self.frac + other.frac
@@ -175,7 +205,7 @@ class StateVector:
     
     def max(self):
         array = np.ndarray((len(self), 7))
-        array[:,:3] = self.X.value
-        array[:,3:6] = self.V.value
+        array[:,:3] = self.X
+        array[:,3:6] = self.V
         array[:,6] = self.frac
         return array.max(axis=1)
@@ -0,0 +1,164 @@
+import numpy as np
+import h5py
+from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
+
+
+# Integer columns. Everything else is a float.
+INTEGER_COLUMNS = {'iteration': np.int32,
+                   'packet_number': np.int64}
+
+# Columns that can be saved as float32. Positions, times, and frac are
+# always float64.
+REDUCED_COLUMNS = ('vx', 'vy', 'vz', 'v', 'r', 'escaped', 'ionized', 'hit',
+                   'longitude', 'latitude', 'local_time', 'altitude',
+                   'azimuth')
+
+COMPRESSION = ('gzip', 'lzf', 'none')
+
+
+class StorageLayout:
+    """How the columns of a model output are stored in HDF5.
+
+    Every column is a resizable one dimensional dataset. The layout sets
+
+    * the number of rows in a chunk. Chunks are large since the outputs are
+      read a column at a time.
+    * the compression filter. The shuffle filter is used with gzip or lzf.
+      Compression makes the files about 30% smaller but reads them about
+      ten times slower (see tests/system_tests/benchmark_storage.py), so
+      it is off by default.
+    * the dtype of each column. iteration and packet_number are integers.
+      Velocities and the diagnostic columns can be saved as float32.
+    * the size of the raw data chunk cache used to read the files.
+
+    The defaults can be changed in the nexoclom2 configuration file with
+    ``output_chunk_size`` (rows, default 16384), ``output_compression``
+    (gzip, lzf, or none, default none), ``output_float32`` (True or False,
+    default False) and ``output_read_cache`` (MB, default 64).
+
+    Files written with other layouts, including files from before layouts
+    existed, can still be read and added to.
+
+    Parameters
+    ----------
+    chunk_size : int, optional
+    compression : str, optional
+    float32 : bool, optional
+    read_cache : float, optional
+        Size of the chunk cache in MB
+    """
+    def __init__(self, chunk_size=None, compression=None, float32=None,
+                 read_cache=None):
+        config = NexoclomConfig().__dict__
+        if chunk_size is None:
+            chunk_size = config.get('output_chunk_size', 16384)
+        else:
+            pass
+
+        if compression is None:
+            compression = config.get('output_compression', 'none')
+        else:
+            pass
+
+        if float32 is None:
+            float32 = config.get('output_float32', 'False')
+        else:
+            pass
+
+        if read_cache is None:
+            read_cache = config.get('output_read_cache', 64)
+        else:
+            pass
+
+        self.chunk_size = int(chunk_size)
+        self.compression = str(compression).lower()
+        if isinstance(float32, str):
+            self.float32 = float32.lower() in ('true', 'yes', '1')
+        else:
+            self.float32 = bool(float32)
+        self.read_cache = float(read_cache)
+
+        if self.chunk_size < 1:
+            raise ValueError('StorageLayout.__init__',
+                             'output_chunk_size must be positive')
+        elif self.compression not in COMPRESSION:
+            raise ValueError('StorageLayout.__init__',
+                             f'output_compression must be one of '
+                             f'{", ".join(COMPRESSION)}')
+        else:
+            pass
+
+    def __str__(self):
+        return (f'chunk_size = {self.chunk_size}\n'
+                f'compression = {self.compression}\n'
+                f'float32 = {self.float32}\n'
+                f'read_cache = {self.read_cache} MB')
+
+    def dtype(self, key):
+        """dtype for a column"""
+        name = key.split('/')[0]
+        if name in INTEGER_COLUMNS:
+            return INTEGER_COLUMNS[name]
+        elif self.float32 and (name in REDUCED_COLUMNS):
+            return np.float32
+        else:
+            return np.float64
+
+    def create(self, store, key, data=None, dtype=None):
+        """Make a resizable dataset for a column.
+
+        Parameters
+        ----------
+        store : h5py File or Group
+        key : str
+            Name of the column relative to store, e.g., 'final_state/x' or
+            'final_state/hit/Mercury'
+        data : array, optional
+            Initial contents. If not given, the dataset is empty.
+        dtype : optional
+            Overrides the dtype for the column
+
+        Returns
+        -------
+        h5py Dataset
+        """
+        column = key.split('/', 1)[1] if '/' in key else key
+        if dtype is None:
+            dtype = self.dtype(column)
+        else:
+            pass
+
+        n = 0 if data is None else len(data)
+        if self.compression == 'none':
+            filters = {}
+        else:
+            filters = {'compression': self.compression, 'shuffle': True}
+
+        dataset = store.create_dataset(key, shape=(n, ), maxshape=(None, ),
+                                       dtype=dtype, chunks=(self.chunk_size, ),
+                                       **filters)
+        if n > 0:
+            dataset[:] = data
+        else:
+            pass
+
+        return dataset
+
+    def open(self, filename, mode='r'):
+        """Open a model output with the chunk cache set for column scans"""
+        # The hash table has about 100 slots per chunk that fits in the
+        # cache. It should be a prime number.
+        nbytes = int(self.read_cache*1e6)
+        nchunks = max(nbytes//(8*self.chunk_size), 1)
+        nslots = _next_prime(100*nchunks)
+
+        return h5py.File(filename, mode, rdcc_nbytes=nbytes,
+                         rdcc_nslots=nslots, rdcc_w0=1.)
+
+
+def _next_prime(n):
+    n = max(int(n), 2)
+    while any(n % p == 0 for p in range(2, int(np.sqrt(n)) + 1)):
+        n += 1
+
+    return n
@@ -33,19 +33,36 @@ class IoTorus:
         
         self.planet = SSObject('Jupiter')
         
+        # Unitless tables: distances in R_Jupiter, densities in cm**-3,
+        # temperatures in eV
+        self._M = self.M.to_value(self.planet.unit)
+        self._n_e = self.n_e.to_value(u.cm**-3)
+        self._T_e = self.T_e.to_value(u.eV)
+        self._H_e = self.H_e.to_value(self.planet.unit)
+        self._T_i = self.T_i.to_value(u.eV)
+        self._n_i = {key: value.to_value(u.cm**-3)
+                     for key, value in self.n_i.items()}
+        self._H_i = {key: value.to_value(self.planet.unit)
+                     for key, value in self.H_i.items()}
+        
     def xyz_to_Mzeta(self, times, X, frame):
         """ Convert from (x, y, z) to (M, zeta) in plasma torus
         
         Parameters
         ----------
-        times: astropy Time quantity array
-            Times for the rotation (length n)
-        X: astropy Distance quantity array
-            Locations of each point (nx3 array)
+        times: astropy Time quantity array or float array
+            Times for the rotation (length n). Floats are in s.
+        X: astropy Distance quantity array or float array
+            Locations of each point (nx3 array). Floats are in R_Jupiter.
         frame: nexoclom2 Frame object
             Coordinate frame for X. This needs to be initialized prior to
             function call with the modeltime and runtime
+            
+        Returns
+        -------
+        M, zeta, L as float arrays in R_Jupiter
         """
+        X = u.Quantity(X, self.planet.unit).value
         
         # Coordinates relative to magnetic field
         X_MP = frame.to_mag(times, X)
@@ -55,41 +72,50 @@ class IoTorus:
         
         # Distance of packets from dipole center
         r_dip = np.sqrt(np.sum(X**2, axis=1))
+        inside = r_dip == 0
+        r_dip_ = np.where(inside, 1., r_dip)
 
-        maglat = np.arcsin(X_MP[:,2]/r_dip)
-        cplat = np.arcsin(X_CP[:,2]/r_dip)
+        maglat = np.arcsin(X_MP[:,2]/r_dip_)
+        cplat = np.arcsin(X_CP[:,2]/r_dip_)
         
         # L-shell,
         L = r_dip/np.cos(maglat)**2
-        L[r_dip == 0] = 0*L.unit
+        L[inside] = 0
         
         # Distance of the point where field line through the packet crosses #
         # the centrifugal equator
         M = r_dip/np.cos(cplat)**2
-        M[r_dip == 0] = 0*M.unit
+        M[inside] = 0
         
         # Approximate distance along field line from centrifugal equator to packet
         zeta = X_CP[:,2]
-        zeta[np.abs(cplat) > 30*u.deg] = 1e30*r_dip.unit
+        zeta[np.abs(cplat) > np.radians(30)] = 1e30
         
         return M, zeta, L
     
     def n_and_T(self, species, times, X, frame):
+        """Plasma density and temperature at the packet positions.
+        
+        Returns
+        -------
+        dict with 'species', 'n' (cm**-3), and 'T' (eV). The density and
+        temperature are float arrays.
+        """
         M, zeta, L = self.xyz_to_Mzeta(times, X, frame)
         plasma = {'species': species}
         
         if species == 'e':
-            n = np.interp(M, self.M, self.n_e)
-            H = np.interp(M, self.M, self.H_e)
-            plasma['T'] = np.interp(M, self.M, self.T_e)
+            n = np.interp(M, self._M, self._n_e)
+            H = np.interp(M, self._M, self._H_e)
+            plasma['T'] = np.interp(M, self._M, self._T_e)
         elif species in self.ions:
-            n = np.interp(M, self.M, self.n_i[f'n_{species}'])
-            H = np.interp(M, self.M, self.H_i[f'H_{species}'])
-            plasma['T'] = np.interp(M, self.M, self.T_i)
+            n = np.interp(M, self._M, self._n_i[f'n_{species}'])
+            H = np.interp(M, self._M, self._H_i[f'H_{species}'])
+            plasma['T'] = np.interp(M, self._M, self._T_i)
         else:
             raise ValueError('IoTorus.plasma', f'{species} is not allowed')
         
-        n[(M < self.M.min()) | (M > self.M.max())] = 0*n.unit
+        n[(M < self._M.min()) | (M > self._M.max())] = 0
         plasma['n'] = n * np.exp(-zeta**2/H**2)
         
         return plasma
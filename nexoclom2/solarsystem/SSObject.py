@@ -1,16 +1,152 @@
 import os
 import copy
+import json
+import hashlib
 import numpy as np
 import pandas as pd
 from scipy.interpolate import CubicSpline
 import astropy.constants as const
 import astropy.units as u
 import spiceypy as spice
-from nexoclom2.solarsystem.load_kernels import SpiceKernels
+from nexoclom2.solarsystem.load_kernels import SpiceKernels, kernel_fingerprint
+from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
 from nexoclom2 import path
 
 __all__ = ['SSObject']
 
+# Data tables read from nexoclom2/data
+_tables = {}
+
+
+def _table(filename):
+    if filename in _tables:
+        return _tables[filename]
+    elif filename == 'PlanetaryConstants.csv':
+        data = pd.read_csv(os.path.join(path, 'data', filename),
+                           skipinitialspace=True, skip_blank_lines=True,
+                           comment='#', sep=':')
+        data.columns = [x.strip() for x in data.columns]
+        data.Object = data.Object.apply(lambda x: x.strip())
+        data.orbits = data.orbits.apply(lambda x: x.strip())
+    else:
+        data = pd.read_csv(os.path.join(path, 'data', filename))
+    
+    _tables[filename] = data
+    return data
+
+
+def _constants_file():
+    return os.path.join(NexoclomConfig().savepath, 'ssobject_constants.json')
+
+
+def _constants_key():
+    """Changes when the SPICE kernels or the planetary constants change"""
+    digest = hashlib.sha1(kernel_fingerprint().encode())
+    with open(os.path.join(path, 'data', 'PlanetaryConstants.csv'), 'rb') as file:
+        digest.update(file.read())
+    return digest.hexdigest()
+
+
+def spice_constants(object, orbits):
+    """Constants of an object from SPICE.
+    
+    The values are saved in savepath/ssobject_constants.json so that SPICE is
+    only needed the first time an object is used with a set of kernels.
+    
+    Returns
+    -------
+    dict with radius (km), GM (km**3/s**2), and, for objects orbiting another
+    body, GM_center, e, a (km), orbperiod (s), and r_center (km) for moons.
+    """
+    filename = _constants_file()
+    key = _constants_key()
+    try:
+        with open(filename, 'r') as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        saved = {}
+    if saved.get('key') != key:
+        saved = {'key': key, 'objects': {}}
+    else:
+        pass
+    
+    if object in saved['objects']:
+        return saved['objects'][object]
+    else:
+        pass
+    
+    kernels = SpiceKernels(object)
+    constants = {}
+    _, radius = spice.bodvrd(object, item='RADII', maxn=3)
+    constants['radius'] = radius[0]
+    _, GM = spice.bodvrd(object, item='GM', maxn=1)
+    constants['GM'] = GM[0]
+    
+    if orbits != 'Milky Way':
+        _, GM_center = spice.bodvrd(orbits, item='GM', maxn=1)
+        constants['GM_center'] = GM_center[0]
+        state, lt = spice.spkezr(object, 0, 'J2000', 'None', orbits)
+        params = spice.oscltx(state, 0., GM_center[0])
+        constants['e'] = params[1]
+        constants['a'] = params[9]
+        constants['orbperiod'] = params[10]
+        
+        if orbits != 'Sun':
+            _, r_center = spice.bodvrd(orbits, item='RADII', maxn=3)
+            constants['r_center'] = r_center[0]
+        else:
+            pass
+    else:
+        pass
+    kernels.unload()
+    
+    constants = {key: float(value) for key, value in constants.items()}
+    saved['objects'][object] = constants
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tempfile = f'{filename}.{os.getpid()}.tmp'
+        with open(tempfile, 'w') as file:
+            json.dump(saved, file, indent=4)
+        os.replace(tempfile, filename)
+    except OSError:
+        pass
+    
+    return constants
+
+
+def kepler_constants(object, orbits):
+    """Constants of an object from PlanetaryConstants.csv.
+    
+    Used by the Keplerian ephemeris (nexoclom2.solarsystem.kepler). Moons
+    are given circular orbits.
+    
+    Returns
+    -------
+    dict with the same keys as spice_constants
+    """
+    data = _table('PlanetaryConstants.csv').set_index('Object')
+    row = data.loc[object]
+    constants = {'radius': row.radius,
+                 'GM': (row.mass*u.kg*const.G).to_value(u.km**3/u.s**2)}
+    
+    if orbits != 'Milky Way':
+        center = data.loc[orbits]
+        constants['GM_center'] = (center.mass*u.kg*const.G).to_value(
+            u.km**3/u.s**2)
+        constants['orbperiod'] = (row.orb_period*u.d).to_value(u.s)
+        if orbits == 'Sun':
+            constants['e'] = row.e
+            constants['a'] = (row.a*u.au).to_value(u.km)
+        else:
+            constants['e'] = 0.
+            constants['a'] = row.a
+            constants['r_center'] = center.radius
+    else:
+        pass
+    
+    return {key: float(value) for key, value in constants.items()}
+
+
 def zeros(t):
     if hasattr(t.value, '__len__') :
         return np.zeros(len(t))
@@ -30,11 +166,17 @@ class SSObject:
     ----------
     obj : str
         Name of the solar system object to gather data for.
+    ephemeris : {'spice', 'kepler'}, Default = 'spice'
+        Source of the radius, GM, and orbital elements. With 'kepler', they
+        are taken from PlanetaryConstants.csv and SPICE is not used. See
+        nexoclom2.solarsystem.kepler.
     
     Attributes
     ----------
     object: str
         Name of solar system body. Source: input parameter
+    ephemeris: str
+        'spice' or 'kepler'. Source: input parameter
     orbits: str
         Object the body orbits. Source: PlanetaryConstants.csv
     radius : distance quantity
@@ -98,28 +240,48 @@ class SSObject:
 
     :Authors: Matthew Burger
     """
-    def __init__(self, obj: str):
-        self.object = obj.title()
-        datafile = os.path.join(path, 'data', 'PlanetaryConstants.csv')
-        data = pd.read_csv(datafile, skipinitialspace=True,
-                           skip_blank_lines=True, comment='#', sep=':')
-        data.columns = [x.strip() for x in data.columns]
-        data.Object = data.Object.apply(lambda x: x.strip())
-        data.orbits = data.orbits.apply(lambda x: x.strip())
+    # Attributes of each object, computed once per process. Each SSObject
+    # gets its own copy, so changing one (e.g., converting units in Output)
+    # does not affect others.
+    _registry = {}
+    
+    def __init__(self, obj: str, ephemeris: str='spice'):
+        if ephemeris not in ('spice', 'kepler'):
+            raise ValueError('SSObject.__init__',
+                             f'Unknown ephemeris {ephemeris}')
+        else:
+            pass
         
+        name = (obj.title(), ephemeris)
+        if name in SSObject._registry:
+            self.__dict__.update(SSObject._registry[name])
+        else:
+            self._load(obj, ephemeris)
+            SSObject._registry[name] = dict(self.__dict__)
+    
+    @classmethod
+    def clear_registry(cls):
+        """Forget the objects already computed in this process"""
+        cls._registry.clear()
+    
+    def _load(self, obj, ephemeris):
+        self.object = obj.title()
+        self.ephemeris = ephemeris
+        data = _table('PlanetaryConstants.csv')
         row = data[data.Object == self.object]
 
-        kernels = SpiceKernels(self.object)
         if len(row) == 1:
             row = row.iloc[0]
             self.orbits = row.orbits
+            if ephemeris == 'kepler':
+                constants = kepler_constants(self.object, self.orbits)
+            else:
+                constants = spice_constants(self.object, self.orbits)
             
-            _, radius = spice.bodvrd(self.object, item='RADII', maxn=3)
-            self.radius = radius[0]*u.km
+            self.radius = constants['radius']*u.km
             self.unit = u.def_unit(f'R_{obj}', self.radius)
             
-            _, GM = spice.bodvrd(self.object, item='GM', maxn=1)
-            self.GM = -GM[0]*u.km**3/u.s**2
+            self.GM = -constants['GM']*u.km**3/u.s**2
             self.mass = (-self.GM/const.G).to(u.kg)
             
             satellites = tuple(data.loc[data.orbits == self.object,
@@ -140,24 +302,19 @@ class SSObject:
                 self.GM_center = self.GM
                 self.orbvel = 0*u.km/u.s
             else:
-                GM_center = spice.bodvrd(self.orbits, item='GM', maxn=1)
-                self.GM_center = -GM_center[1][0]*u.km**3/u.s**2
-                frame = 'J2000'
-                state, lt = spice.spkezr(self.object, 0, frame, 'None', self.orbits)
-                params = spice.oscltx(state, 0., -self.GM_center.value)
-                self.e = params[1]
+                self.GM_center = -constants['GM_center']*u.km**3/u.s**2
+                self.e = constants['e']
                 self.tilt = row.tilt*u.deg
-                self.orbperiod = (params[10]*u.s).to(u.d)
+                self.orbperiod = (constants['orbperiod']*u.s).to(u.d)
                 self.rotperiod = row.rot_period * u.h
-                a = params[9]*u.km
+                a = constants['a']*u.km
                 
                 if self.orbits == 'Sun':
                     self.type = 'Planet'
                     self.a = a.to(u.au)
                 else:
                     self.type = 'Moon'
-                    _, r_center = spice.bodvrd(self.orbits, item='RADII', maxn=3)
-                    r_center = r_center[0]*u.km
+                    r_center = constants['r_center']*u.km
                     unit = u.def_unit(f'R_{self.orbits}', r_center)
                     self.a = a.to(unit)
                 self.orbvel = 2*np.pi*self.a.to(u.km)/self.orbperiod.to(u.s)
@@ -173,9 +330,7 @@ class SSObject:
         else:
             pass
         
-        naiffile = os.path.join(path, 'data', 'naifids.csv')
-        naifids = pd.read_csv(naiffile)
-        
+        naifids = _table('naifids.csv')
         idnums = naifids.loc[naifids.Object.apply(lambda x: x.title()) ==
                              self.object, 'NAIFID'].values
         if len(idnums) == 1:
@@ -185,8 +340,6 @@ class SSObject:
             self.naifid = idnums.min()
         else:
             print('No NAIF ID found for object')
-        
-        kernels.unload()
     
     def __eq__(self, other):
         if isinstance(other, SSObject):
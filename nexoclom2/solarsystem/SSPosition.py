@@ -5,6 +5,11 @@ import spiceypy as spice
 import copy
 from nexoclom2.solarsystem.load_kernels import SpiceKernels
 from nexoclom2.solarsystem.SSObject import SSObject
+from nexoclom2.solarsystem.ephemeris_cache import EphemerisCache
+from nexoclom2.solarsystem import kepler
+from nexoclom2.solarsystem.ephemeris import (hermite_coefficients,
+                                             linear_coefficients,
+                                             evaluate_polynomials)
 
 
 pi = np.pi*u.rad
@@ -27,12 +32,33 @@ class SSPosition:
     
     NAIF IDS found at JPL's `Navigation and Ancillary Information
     Facility <https://naif.jpl.nasa.gov/pub/naif/toolkit_docs/C/req/naif_ids.html>`_.
+    
+    * With ssobject.ephemeris = 'kepler', the tables are computed from the
+    analytic ephemeris in nexoclom2.solarsystem.kepler instead of SPICE.
+    
+    * Positions are interpolated with cubic Hermite polynomials using the
+    SPICE velocities, and velocities are the derivatives of those polynomials.
+    The distance from the Sun is interpolated the same way using drdt_sun.
+    Other quantities are interpolated linearly.
+    
+    Parameters
+    ----------
+    ssobject : SSObject
+    geometry : Geometry
+    runtime : time quantity
+    ntimes : int, optional
+        Number of times at which SPICE is sampled. By default this is chosen
+        with SSPosition.n_samples so that the interpolated positions are
+        accurate to tolerance.
+    tolerance : distance quantity, Default = 0.1 km
+        Target accuracy of the interpolated positions
     """
 
-    def __init__(self, ssobject, geometry, runtime, ntimes=1000):
+    def __init__(self, ssobject, geometry, runtime, ntimes=None,
+                 tolerance=0.1*u.km):
         self.object = ssobject.object
         self.runtime = runtime
-        center = SSObject(geometry.center)
+        center = SSObject(geometry.center, ssobject.ephemeris)
         self.unit = center.unit
         
         self.taa = lambda t: self.zeros(t)*u.rad
@@ -72,128 +98,480 @@ class SSPosition:
         # self.abcor = 'LT+S'
         self.abcor = 'None'
         
-        # Load the spice kernels
-        kernels = SpiceKernels(ssobject.object)
+        if ntimes is None:
+            ntimes = self.n_samples(ssobject, runtime, tolerance)
+        else:
+            pass
         
         times = np.linspace(self.starttime, self.endtime, ntimes)
-        times_et = spice.str2et(times.iso)
         modeltime = (times - self.endtime).to(u.s)
         
+        # Unitless tables used by the integrator. Times are in s, distances in
+        # self.unit, and velocities in self.unit/s.
+        self._times = modeltime.value
+        self._dt = (self._times[-1] - self._times[0])/(ntimes - 1)
+        
+        if ssobject.ephemeris == 'kepler':
+            tables = self._sample_kepler(ssobject, geometry)
+        else:
+            # The tables only depend on the geometry and the SPICE kernels,
+            # so they are reused from earlier runs when possible
+            cache = EphemerisCache()
+            key = cache.key(object=self.object, center=geometry.center,
+                            startpoint=geometry.startpoint,
+                            modeltime=self.endtime.iso,
+                            runtime=u.Quantity(runtime, u.s).value,
+                            ntimes=ntimes, abcor=self.abcor,
+                            unit=self.unit.to(u.km))
+            tables = cache.get(key)
+            if tables is None:
+                tables = self._sample_spice(ssobject, geometry, times)
+                cache.put(key, tables)
+            else:
+                pass
+        
+        for name, table in tables.items():
+            setattr(self, f'_{name}', table)
+        self._make_coefficients()
+        
         if ssobject.type == 'Star':
             # Everything returns zero with proper units
             pass
         else:
-            # Get r_sun, drdt_sun, sun_dir
-            sun = SSObject('Sun')
-            st_sun, _ = spice.spkezr(self.object, times_et, 'J2000',
-                                     self.abcor, 'Sun')
-            r_sun = (np.sqrt(np.sum(st_sun[:,:3]**2, axis=1))*u.km).to(self.unit)
-            drdt_sun = (np.sum(st_sun[:,:3]*u.km*st_sun[:,3:]*u.km/u.s,
-                               axis=1)/r_sun).to(self.unit/u.s)
-            
-            # get x, y, z, vx, vy, vz
-            if ((ssobject.type == 'Planet') and
-                (geometry.startpoint == geometry.center)):
-                    frame = ssobject.solar_frame
-            elif ssobject.type == 'Planet':
-                frame = 'J2000'
-            elif ssobject.type == 'Moon':
-                planet = SSObject(ssobject.orbits)
-                geoplan = copy.copy(geometry)
-                geoplan.startpoint = planet.object
-                plan_pos = SSPosition(planet, geoplan, runtime)
-                frame = planet.solar_frame
-            else:
-                assert False
-                
-            st_cent, _ = spice.spkezr(self.object, times_et, frame, self.abcor,
-                                      geometry.center)
-            x = (st_cent[:,0]*u.km).to(self.unit)
-            y = (st_cent[:,1]*u.km).to(self.unit)
-            z = (st_cent[:,2]*u.km).to(self.unit)
-            vx = (st_cent[:,3]*u.km).to(self.unit)/u.s
-            vy = (st_cent[:,4]*u.km).to(self.unit)/u.s
-            vz = (st_cent[:,5]*u.km).to(self.unit)/u.s
-            
-            # get taa, subsolar longitude and latitude
-            taa = np.zeros(ntimes)*u.rad
-            ss_lon, ss_lat = np.zeros(ntimes)*u.rad, np.zeros(ntimes)*u.rad
-            # st, _ = spice.spkezr(self.object, times_et, 'J2000', self.abcor, )
-            for i, et in enumerate(times_et):
-                taa_ = spice.oscltx(st_sun[i,:], et, -sun.GM.value)
-                taa[i] = taa_[8]*u.rad
-                
-                try:
-                    sublon, _, _ = spice.subslr('INTERCEPT/ELLIPSOID', self.object,
-                                                et, f'IAU_{self.object.upper()}',
-                                                self.abcor, self.object)
-                except:
-                    sublon, _, _ = spice.subslr('INTERCEPT/ELLIPSOID', self.object,
-                                                et, f'IAU_{self.object.upper()}',
-                                                self.abcor, self.object)
-                    
-                lonlat = spice.recpgr(self.object, sublon,
-                                      ssobject.radius.value, 0.)
-                ss_lon[i], ss_lat[i] = lonlat[0]*u.rad, lonlat[1]*u.rad
-                
-            for i in range(ntimes-1):
-                if taa[i+1] < taa[i]:
-                    taa[i+1:] += 2*pi
-                else:
-                    pass
-            
-            # Get sun_dir
-            st, _ = spice.spkezr(self.object, times_et, frame, self.abcor, 'Sun')
-            sun_dir_x = -(st[:,0]*u.km/r_sun).to(u.dimensionless_unscaled)
-            sun_dir_y = -(st[:,1]*u.km/r_sun).to(u.dimensionless_unscaled)
-            sun_dir_z = -(st[:,2]*u.km/r_sun).to(u.dimensionless_unscaled)
+            self._make_interpolators(ssobject.type)
+
+    def _sample_spice(self, ssobject, geometry, times):
+        """Sample the ephemeris from SPICE at the given times.
+        
+        Returns
+        -------
+        dict of unitless tables: X, V (self.unit, self.unit/s), sun_dir,
+        r_sun (self.unit), drdt_sun (self.unit/s), and taa, phi,
+        ss_lon, ss_lat (rad). The angles are continuous, not wrapped to
+        [0, 2pi).
+        """
+        ntimes = len(times)
+        tables = {'X': np.zeros((ntimes, 3)),
+                  'V': np.zeros((ntimes, 3)),
+                  'sun_dir': np.zeros((ntimes, 3)),
+                  'r_sun': np.zeros(ntimes),
+                  'drdt_sun': np.zeros(ntimes),
+                  'taa': np.zeros(ntimes),
+                  'phi': np.zeros(ntimes),
+                  'ss_lon': np.zeros(ntimes),
+                  'ss_lat': np.zeros(ntimes)}
+        
+        if ssobject.type == 'Star':
+            return tables
+        else:
+            pass
+        
+        # Load the spice kernels
+        kernels = SpiceKernels(ssobject.object)
+        times_et = spice.str2et(times.iso)
+        
+        # Get r_sun, drdt_sun, sun_dir
+        sun = SSObject('Sun')
+        st_sun, _ = spice.spkezr(self.object, times_et, 'J2000',
+                                 self.abcor, 'Sun')
+        r_sun = (np.sqrt(np.sum(st_sun[:,:3]**2, axis=1))*u.km).to(self.unit)
+        drdt_sun = (np.sum(st_sun[:,:3]*u.km*st_sun[:,3:]*u.km/u.s,
+                           axis=1)/r_sun).to(self.unit/u.s)
+        
+        # get x, y, z, vx, vy, vz
+        if ((ssobject.type == 'Planet') and
+            (geometry.startpoint == geometry.center)):
+                frame = ssobject.solar_frame
+        elif ssobject.type == 'Planet':
+            frame = 'J2000'
+        elif ssobject.type == 'Moon':
+            planet = SSObject(ssobject.orbits)
+            geoplan = copy.copy(geometry)
+            geoplan.startpoint = planet.object
+            plan_pos = SSPosition(planet, geoplan, self.runtime)
+            frame = planet.solar_frame
+        else:
+            assert False
             
-            self.x = lambda t: np.interp(t, modeltime, x)
-            self.y = lambda t: np.interp(t, modeltime, y)
-            self.z = lambda t: np.interp(t, modeltime, z)
-            self.vx = lambda t: np.interp(t, modeltime, vx)
-            self.vy = lambda t: np.interp(t, modeltime, vy)
-            self.vz = lambda t: np.interp(t, modeltime, vz)
-            self.r_sun = lambda t: np.interp(t, modeltime, r_sun)
-            self.drdt_sun = lambda t: np.interp(t, modeltime, drdt_sun)
-            self.sun_dir_x = lambda t: np.interp(t, modeltime, sun_dir_x)
-            self.sun_dir_y = lambda t: np.interp(t, modeltime, sun_dir_y)
-            self.sun_dir_z = lambda t: np.interp(t, modeltime, sun_dir_z)
-            self.taa = lambda t: np.mod(np.interp(t, modeltime, taa), 2*pi)
-            self.subsolar_longitude = lambda t: np.mod(
-                np.interp(t, modeltime, ss_lon), 2*pi)
-            self.subsolar_latitude = lambda t: np.interp(t, modeltime, ss_lat)
+        st_cent, _ = spice.spkezr(self.object, times_et, frame, self.abcor,
+                                  geometry.center)
+        tables['X'] = (st_cent[:,:3]*u.km).to_value(self.unit)
+        tables['V'] = (st_cent[:,3:]*u.km/u.s).to_value(self.unit/u.s)
+        
+        # True anomaly from the heliocentric state vectors
+        taa = self.continuous(self.true_anomaly(st_sun, -sun.GM.value))
+        
+        # Subsolar point from the direction to the Sun in the body-fixed
+        # frame. With the INTERCEPT/ELLIPSOID method the surface point is
+        # along this direction, so only the planetographic longitude
+        # convention is needed from SPICE.
+        iau_frame = f'IAU_{self.object.upper()}'
+        R_to_iau = self.body_fixed_matrices(ssobject.naifid, iau_frame,
+                                            times_et)
+        sun_iau = np.einsum('nij,nj->ni', R_to_iau, -st_sun[:,:3])
+        lon_y, _, _ = spice.recpgr(self.object, [0., 1., 0.],
+                                   ssobject.radius.value, 0.)
+        east = lon_y < np.pi
+        ss_lon = np.arctan2(sun_iau[:,1], sun_iau[:,0])
+        ss_lon = np.mod(ss_lon if east else -ss_lon, 2*np.pi)
+        ss_lat = np.arcsin(sun_iau[:,2]/np.linalg.norm(sun_iau, axis=1))
+        
+        # Continuous so that it can be interpolated
+        tables['ss_lon'] = np.unwrap(ss_lon)
+        tables['ss_lat'] = ss_lat
+        
+        # Get sun_dir
+        st, _ = spice.spkezr(self.object, times_et, frame, self.abcor, 'Sun')
+        tables['sun_dir'] = -(st[:,:3]*u.km/r_sun[:,np.newaxis]).to_value(
+            u.dimensionless_unscaled)
+        tables['r_sun'] = r_sun.to_value(self.unit)
+        tables['drdt_sun'] = drdt_sun.to_value(self.unit/u.s)
+        
+        if ssobject.type == 'Planet':
+            tables['taa'] = taa
+            tables['phi'] = taa
+        elif ssobject.type == 'Moon':
+            # st, _ = spice.spkezr(self.object, times_et,
+            #                      f'{ssobject.orbits.upper()}SOLAR',
+            #                      self.abcor, ssobject.orbits)
+            # phi = (np.arctan2(-st[:,1], -st[:,0])*u.rad + (2*pi)) % (2*pi)
+            phi = np.mod(np.arctan2(-tables['X'][:,1], -tables['X'][:,0]),
+                         2*np.pi)
+            tables['phi'] = self.continuous(phi)
             
-            if ssobject.type == 'Planet':
-                self.phi = self.taa
-            elif ssobject.type == 'Moon':
-                # st, _ = spice.spkezr(self.object, times_et,
-                #                      f'{ssobject.orbits.upper()}SOLAR',
-                #                      self.abcor, ssobject.orbits)
-                # phi = (np.arctan2(-st[:,1], -st[:,0])*u.rad + (2*pi)) % (2*pi)
-                phi = np.mod(np.arctan2(-self.y(modeltime),
-                                        -self.x(modeltime)), 2*pi)
-                for i in range(ntimes-1):
-                    if phi[i+1] < phi[i]:
-                        phi[i+1:] += 2*pi
-                self.phi = lambda t: np.interp(t, modeltime, phi) % (2*pi)
-                
-                # Use planet TAA
-                self.taa = plan_pos.taa
-                
-                # self.phi = self.subsolar_longitude
-            else:
-                raise RuntimeError('SSObject.get_geometry',
-                                   'Should not be able to get here')
+            # Use planet TAA
+            tables['taa'] = np.interp(self._times, plan_pos._times,
+                                      plan_pos._taa)
             
-            kernels.unload()
+            # self.phi = self.subsolar_longitude
+        else:
+            raise RuntimeError('SSObject.get_geometry',
+                               'Should not be able to get here')
+        
+        kernels.unload()
+        
+        return tables
+    
+    def _sample_kepler(self, ssobject, geometry):
+        """Sample the analytic Keplerian ephemeris at self._times.
+        
+        Returns
+        -------
+        dict with the same tables as _sample_spice
+        """
+        ntimes = len(self._times)
+        tables = {'X': np.zeros((ntimes, 3)),
+                  'V': np.zeros((ntimes, 3)),
+                  'sun_dir': np.zeros((ntimes, 3)),
+                  'r_sun': np.zeros(ntimes),
+                  'drdt_sun': np.zeros(ntimes),
+                  'taa': np.zeros(ntimes),
+                  'phi': np.zeros(ntimes),
+                  'ss_lon': np.zeros(ntimes),
+                  'ss_lat': np.zeros(ntimes)}
+        
+        if ssobject.type == 'Star':
+            return tables
+        else:
+            pass
+        
+        t = kepler.epoch_seconds(self.endtime) + self._times
+        st_sun = kepler.state(ssobject, t)
+        r_sun = np.linalg.norm(st_sun[:,:3], axis=1)
+        drdt_sun = np.sum(st_sun[:,:3]*st_sun[:,3:], axis=1)/r_sun
+        
+        # Same frames as _sample_spice
+        if ((ssobject.type == 'Planet') and
+            (geometry.startpoint == geometry.center)):
+            planet, frame = ssobject, 'SOLAR'
+        elif ssobject.type == 'Planet':
+            planet, frame = ssobject, 'J2000'
+        else:
+            planet, frame = SSObject(ssobject.orbits, 'kepler'), 'SOLAR'
+        
+        center = SSObject(geometry.center, 'kepler')
+        st_cent = kepler.to_frame(planet, frame,
+                                  st_sun - kepler.state(center, t), t)
+        tables['X'] = (st_cent[:,:3]*u.km).to_value(self.unit)
+        tables['V'] = (st_cent[:,3:]*u.km/u.s).to_value(self.unit/u.s)
+        
+        sun_dir = np.zeros((ntimes, 6))
+        sun_dir[:,:3] = -st_sun[:,:3]/r_sun[:,np.newaxis]
+        tables['sun_dir'] = kepler.to_frame(planet, frame, sun_dir, t)[:,:3]
+        tables['r_sun'] = (r_sun*u.km).to_value(self.unit)
+        tables['drdt_sun'] = (drdt_sun*u.km/u.s).to_value(self.unit/u.s)
+        
+        tables['ss_lon'], tables['ss_lat'] = kepler.subsolar_point(ssobject, t)
+        tables['taa'] = kepler.true_anomaly(planet, t)
+        if ssobject.type == 'Planet':
+            tables['phi'] = tables['taa']
+        else:
+            tables['phi'] = self.continuous(kepler.phase(ssobject, t))
+        
+        return tables
+    
+    def _make_interpolators(self, objtype):
+        """Functions of time returning quantities with units"""
+        modeltime = self._times*u.s
+        sun_dir = self._sun_dir*u.dimensionless_unscaled
+        taa = self._taa*u.rad
+        phi = self._phi*u.rad
+        ss_lon, ss_lat = self._ss_lon*u.rad, self._ss_lat*u.rad
+        
+        self.x = self._interpolator('X', self.unit, 0)
+        self.y = self._interpolator('X', self.unit, 1)
+        self.z = self._interpolator('X', self.unit, 2)
+        self.vx = self._interpolator('V', self.unit/u.s, 0)
+        self.vy = self._interpolator('V', self.unit/u.s, 1)
+        self.vz = self._interpolator('V', self.unit/u.s, 2)
+        self.r_sun = self._interpolator('r_sun', self.unit, 0)
+        self.drdt_sun = self._interpolator('drdt_sun', self.unit/u.s, 0)
+        self.sun_dir_x = lambda t: np.interp(t, modeltime, sun_dir[:,0])
+        self.sun_dir_y = lambda t: np.interp(t, modeltime, sun_dir[:,1])
+        self.sun_dir_z = lambda t: np.interp(t, modeltime, sun_dir[:,2])
+        self.taa = lambda t: np.mod(np.interp(t, modeltime, taa), 2*pi)
+        self.subsolar_longitude = lambda t: np.mod(
+            np.interp(t, modeltime, ss_lon), 2*pi)
+        self.subsolar_latitude = lambda t: np.interp(t, modeltime, ss_lat)
+        
+        if objtype == 'Planet':
+            self.phi = self.taa
+        else:
+            self.phi = lambda t: np.interp(t, modeltime, phi) % (2*pi)
 
+    @staticmethod
+    def true_anomaly(state, mu):
+        """True anomaly of a set of state vectors.
+        
+        Equivalent to element 8 of spice.oscltx for each state, computed for
+        all states at once.
+        
+        Parameters
+        ----------
+        state : ndarray
+            Positions and velocities (n, 6) relative to the central body
+            in km and km/s
+        mu : float
+            Gravitational parameter of the central body in km**3/s**2
+        
+        Returns
+        -------
+        True anomaly (n,) in radians in the range [0, 2pi)
+        """
+        r_vec, v_vec = state[:,:3], state[:,3:]
+        r = np.linalg.norm(r_vec, axis=1)
+        h = np.linalg.norm(np.cross(r_vec, v_vec), axis=1)
+        
+        # e cos(nu) = h^2/(mu r) - 1 and e sin(nu) = h (r.v)/(mu r)
+        ecosnu = h**2/(mu*r) - 1
+        esinnu = h*np.sum(r_vec*v_vec, axis=1)/(mu*r)
+        
+        return np.mod(np.arctan2(esinnu, ecosnu), 2*np.pi)
+    
+    @staticmethod
+    def body_fixed_matrices(naifid, iau_frame, times_et):
+        """Rotation matrices from J2000 to a body-fixed IAU frame.
+        
+        The pole direction and prime meridian are computed for all times at
+        once from the PCK rotation model in the kernel pool, in the same way
+        as SPICE (bodeul). If the body has no PCK model, or one relative to
+        another frame or epoch, spice.pxform is called at each time.
+        
+        Parameters
+        ----------
+        naifid : int
+        iau_frame : str
+            Name of the body-fixed frame, e.g., 'IAU_JUPITER'
+        times_et : ndarray
+            Ephemeris times (s past J2000)
+        
+        Returns
+        -------
+        Rotation matrices (n, 3, 3)
+        """
+        times_et = np.atleast_1d(np.asarray(times_et, dtype=float))
+        if ((not spice.bodfnd(naifid, 'POLE_RA')) or
+                spice.bodfnd(naifid, 'CONSTANTS_REF_FRAME') or
+                spice.bodfnd(naifid, 'CONSTANTS_JED_EPOCH')):
+            return np.array([spice.pxform('J2000', iau_frame, et)
+                             for et in times_et])
+        else:
+            pass
+        
+        def constants(name, body=naifid):
+            if spice.bodfnd(body, name):
+                return np.array(spice.gdpool(f'BODY{body}_{name}', 0, 1000))
+            else:
+                return np.zeros(0)
+        
+        d = times_et/spice.spd()
+        T = d/36525.
+        ra = np.polynomial.polynomial.polyval(T, constants('POLE_RA'))
+        dec = np.polynomial.polynomial.polyval(T, constants('POLE_DEC'))
+        w = np.polynomial.polynomial.polyval(d, constants('PM'))
+        
+        # Nutation and precession angles are given for the barycenter of
+        # planetary systems
+        nut_ra = constants('NUT_PREC_RA')
+        nut_dec = constants('NUT_PREC_DEC')
+        nut_pm = constants('NUT_PREC_PM')
+        if max(len(nut_ra), len(nut_dec), len(nut_pm)) > 0:
+            ref = naifid//100 if 100 < naifid < 1000 else naifid
+            degree = constants('MAX_PHASE_DEGREE', ref)
+            degree = int(degree[0]) if len(degree) > 0 else 1
+            angles = constants('NUT_PREC_ANGLES', ref).reshape(-1, degree+1)
+            theta = np.radians(np.polynomial.polynomial.polyval(
+                T, angles.T, tensor=True))
+            ra += nut_ra @ np.sin(theta[:len(nut_ra)])
+            dec += nut_dec @ np.cos(theta[:len(nut_dec)])
+            w += nut_pm @ np.sin(theta[:len(nut_pm)])
+        else:
+            pass
+        
+        # [w]_3 [pi/2 - dec]_1 [pi/2 + ra]_3 as in SPICE eul2m
+        def rotation(angle, axis):
+            c, s = np.cos(angle), np.sin(angle)
+            one, zero = np.ones_like(angle), np.zeros_like(angle)
+            if axis == 3:
+                rows = [[c, s, zero], [-s, c, zero], [zero, zero, one]]
+            else:
+                rows = [[one, zero, zero], [zero, c, s], [zero, -s, c]]
+            return np.moveaxis(np.array(rows), -1, 0)
+        
+        ra, dec = np.radians(ra), np.radians(dec)
+        w = np.radians(np.mod(w, 360.))
+        return (rotation(w, 3) @ rotation(np.pi/2 - dec, 1) @
+                rotation(np.pi/2 + ra, 3))
+    
+    @staticmethod
+    def continuous(angle):
+        """Adds 2pi each time an increasing angle wraps around"""
+        wraps = np.concatenate([[0], np.cumsum(np.diff(angle) < 0)])
+        return angle + 2*np.pi*wraps
+    
     def zeros(self, t):
         if hasattr(t.value, '__len__') :
             return np.zeros(len(t))
         else:
             return 0.
     
+    @staticmethod
+    def n_samples(ssobject, runtime, tolerance=0.1*u.km, min_samples=10,
+                  max_samples=100000):
+        """Number of SPICE samples needed to interpolate positions.
+        
+        The error of cubic Hermite interpolation along an orbit of radius r
+        with angular velocity w and sample spacing h is about
+        r*(w*h)**4/384. The angular velocity is taken at pericenter, and the
+        orbit of the planet is added for a moon since moon positions are in
+        the rotating solar frame of the planet. The spacing is also kept
+        below a quarter of the rotation period so that the subsolar longitude
+        can be unwrapped.
+        
+        Parameters
+        ----------
+        ssobject : SSObject
+        runtime : time quantity
+        tolerance : distance quantity
+            Target accuracy of the interpolated positions
+        min_samples, max_samples : int
+        
+        Returns
+        -------
+        int
+        """
+        if ssobject.type == 'Star':
+            return min_samples
+        else:
+            pass
+        
+        def orbit(obj):
+            # Radius at apocenter and angular velocity at pericenter
+            radius = (obj.a*(1 + obj.e)).to_value(u.km)
+            angvel = (2*np.pi/obj.orbperiod.to_value(u.s) * (1 + obj.e)**2/
+                      (1 - obj.e**2)**1.5)
+            return radius, angvel
+        
+        radius, angvel = orbit(ssobject)
+        if ssobject.type == 'Moon':
+            angvel += orbit(SSObject(ssobject.orbits, ssobject.ephemeris))[1]
+        else:
+            pass
+        
+        step = (384*tolerance.to_value(u.km)/radius)**0.25/angvel
+        step = min(step, np.abs(ssobject.rotperiod.to_value(u.s))/4)
+        n = int(np.ceil(u.Quantity(runtime, u.s).value/step)) + 1
+        
+        return int(np.clip(n, min_samples, max_samples))
+    
+    def _make_coefficients(self):
+        """Interpolating polynomials used by the *_value methods and by
+        nexoclom2.solarsystem.ephemeris.Ephemeris"""
+        X, V = hermite_coefficients(self._X, self._V, self._dt)
+        r_sun, drdt_sun = hermite_coefficients(self._r_sun[:,np.newaxis],
+                                               self._drdt_sun[:,np.newaxis],
+                                               self._dt)
+        self._coefs = {'X': X,
+                       'V': V,
+                       'sun_dir': linear_coefficients(self._sun_dir),
+                       'r_sun': r_sun,
+                       'drdt_sun': drdt_sun}
+    
+    def _interp(self, t, quantity):
+        return evaluate_polynomials(self._coefs[quantity], self._times[0],
+                                    self._dt, np.atleast_1d(t))
+    
+    def _interpolator(self, quantity, unit, column):
+        """Function returning one column of a quantity with units"""
+        def interp(t):
+            t = u.Quantity(t, u.s).value
+            value = self._interp(t, quantity)[:,column]
+            return value.reshape(np.shape(t))*unit
+        return interp
+    
+    def X_value(self, t):
+        """Position at times t (s) as an (n, 3) float array in self.unit"""
+        return self._interp(t, 'X')
+    
+    def V_value(self, t):
+        """Velocity at times t (s) as an (n, 3) float array in self.unit/s"""
+        return self._interp(t, 'V')
+    
+    def sun_dir_value(self, t):
+        """Unit vector pointing from the object toward the Sun at times t (s)"""
+        return self._interp(t, 'sun_dir')
+    
+    def r_sun_value(self, t):
+        """Distance from the Sun at times t (s) in self.unit"""
+        return self._interp(t, 'r_sun')[:,0]
+    
+    def drdt_sun_value(self, t):
+        """Radial velocity relative to the Sun at times t (s) in self.unit/s"""
+        return self._interp(t, 'drdt_sun')[:,0]
+    
+    def out_of_shadow_value(self, radius, X, t):
+        """Unitless version of out_of_shadow used by the integrator.
+        
+        Parameters
+        ----------
+        radius: float
+            Radius of the object in self.unit
+        X: ndarray
+            Positions of the packets (n, 3) in self.unit
+        t: ndarray
+            Times of the packets in s
+        
+        Returns
+        -------
+        Boolean array that is True for packets not in the object's shadow.
+        """
+        x_from_obj = X - self.X_value(t)
+        r_from_obj = np.sqrt(np.sum(x_from_obj**2, axis=1))
+        costheta = np.sum(x_from_obj * self.sun_dir_value(t), axis=1)/r_from_obj
+        sintheta = np.sqrt(1 - costheta**2)
+        
+        return (sintheta * r_from_obj >= radius) | (costheta >= 0)
+    
     def out_of_shadow(self, obj, packets):
         if obj.type == 'Star':
             return np.ones(len(packets)).astype(bool)
@@ -1,4 +1,6 @@
 """Classes and functions for working with solar system data"""
 from nexoclom2.solarsystem.SSObject import SSObject
 from nexoclom2.solarsystem.SSPosition import SSPosition
+from nexoclom2.solarsystem.ephemeris import Ephemeris
 from nexoclom2.solarsystem.IoTorus import IoTorus
+from nexoclom2.solarsystem.load_kernels import kernel_manager
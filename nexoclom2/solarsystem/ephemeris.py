@@ -0,0 +1,189 @@
+import numpy as np
+
+
+def hermite_coefficients(p, dpdt, dt):
+    """Cubic Hermite interpolation between samples with known derivatives.
+
+    Parameters
+    ----------
+    p, dpdt : ndarray
+        Values and time derivatives at uniformly spaced times, shape (n, k)
+    dt : float
+        Time between samples
+
+    Returns
+    -------
+    Polynomial coefficients (n-1, 4, k) of the values and of their time
+    derivative in the fractional position s = (t - t_i)/dt within each
+    interval, ordered from s**0 to s**3. See evaluate_polynomials.
+    """
+    p0, p1 = p[:-1], p[1:]
+    m0, m1 = dpdt[:-1]*dt, dpdt[1:]*dt
+
+    coefs = np.stack([p0,
+                      m0,
+                      3*(p1 - p0) - 2*m0 - m1,
+                      2*(p0 - p1) + m0 + m1], axis=1)
+    deriv = np.stack([coefs[:,1],
+                      2*coefs[:,2],
+                      3*coefs[:,3],
+                      np.zeros_like(p0)], axis=1)/dt
+
+    return coefs, deriv
+
+
+def linear_coefficients(p):
+    """Linear interpolation between samples in the form of
+    hermite_coefficients"""
+    p0, p1 = p[:-1], p[1:]
+    zeros = np.zeros_like(p0)
+    return np.stack([p0, p1 - p0, zeros, zeros], axis=1)
+
+
+def evaluate_polynomials(coefs, t0, dt, t):
+    """Evaluate piecewise cubic polynomials on a uniform time grid.
+
+    The interval follows directly from the time, so no search is needed, and
+    all columns are gathered at once. Times outside the grid are given the
+    value at the nearest end, as in np.interp.
+
+    Parameters
+    ----------
+    coefs : ndarray
+        Coefficients (n-1, 4, k) from hermite_coefficients or
+        linear_coefficients
+    t0, dt : float
+        First time and spacing of the grid
+    t : ndarray
+        Times to evaluate
+
+    Returns
+    -------
+    Values (len(t), k)
+    """
+    x = (np.asarray(t, dtype=float) - t0)/dt
+    index = np.floor(x)
+    np.clip(index, 0, coefs.shape[0]-1, out=index)
+    s = x - index
+    np.clip(s, 0., 1., out=s)
+    s = s[:,np.newaxis]
+
+    c = coefs[index.astype(int)]
+    return ((c[:,3]*s + c[:,2])*s + c[:,1])*s + c[:,0]
+
+
+class Ephemeris:
+    """Interpolates the ephemerides of all objects in a model at once.
+
+    The interpolating polynomials of every SSPosition (see SSPosition.X_value)
+    are stacked into one table on their common, uniform time grid.
+    Interpolating at a set of packet times finds the grid interval directly
+    from the time, without a search, and gets every quantity of every object
+    with one gather from the table.
+
+    Parameters
+    ----------
+    positions : dict
+        SSPosition for each object, e.g. Output.positions. All positions must
+        be tabulated at the same times.
+
+    Notes
+    -----
+    Times outside the table are given the value at the nearest end of the
+    table, as in np.interp.
+    """
+    # Quantities tabulated for each object and the number of columns of each
+    quantities = {'X': 3, 'V': 3, 'sun_dir': 3, 'r_sun': 1, 'drdt_sun': 1}
+
+    def __init__(self, positions):
+        times = next(iter(positions.values()))._times
+        self.n_times = len(times)
+        self.t0 = times[0]
+        self.dt = (times[-1] - times[0])/(self.n_times - 1)
+
+        if not np.allclose(np.diff(times), self.dt, rtol=1e-6, atol=0):
+            raise ValueError('Ephemeris.__init__',
+                             'Ephemeris tables must be on a uniform time grid')
+        else:
+            pass
+
+        # Column slice of each quantity for each object
+        self.columns = {}
+        coefs = []
+        col = 0
+        for name, pos in positions.items():
+            if not np.allclose(pos._times, times, rtol=0, atol=1e-6*self.dt):
+                raise ValueError('Ephemeris.__init__',
+                                 f'Ephemeris of {name} is tabulated at '
+                                 'different times')
+            else:
+                pass
+
+            for quantity, ncols in self.quantities.items():
+                coefs.append(pos._coefs[quantity])
+                self.columns[name, quantity] = slice(col, col+ncols)
+                col += ncols
+        self._coefs = np.concatenate(coefs, axis=2)
+
+    def __call__(self, t):
+        """All tabulated quantities at times t (s)"""
+        return EphemerisValues(self, t)
+
+    def at(self, packets):
+        """All tabulated quantities at the times of packets.
+
+        If packets has an ephemeris attribute (rk5 Stages do), the values are
+        stored there so that compute_accel and lossrate share one
+        interpolation per stage.
+        """
+        if getattr(packets, 'ephemeris', None) is not None:
+            return packets.ephemeris
+        else:
+            values = EphemerisValues(self, packets.time)
+            if hasattr(packets, 'ephemeris'):
+                packets.ephemeris = values
+            else:
+                pass
+            return values
+
+
+class EphemerisValues:
+    """Ephemeris quantities interpolated at a set of times.
+
+    Methods take the name of an object and return unitless arrays in the same
+    units as the SSPosition *_value methods.
+    """
+    def __init__(self, ephemeris, t):
+        self._columns = ephemeris.columns
+        self.values = evaluate_polynomials(ephemeris._coefs, ephemeris.t0,
+                                           ephemeris.dt, t)
+
+    def _get(self, name, quantity):
+        return self.values[:,self._columns[name, quantity]]
+
+    def X(self, name):
+        return self._get(name, 'X')
+
+    def V(self, name):
+        return self._get(name, 'V')
+
+    def sun_dir(self, name):
+        return self._get(name, 'sun_dir')
+
+    def r_sun(self, name):
+        return self._get(name, 'r_sun')[:,0]
+
+    def drdt_sun(self, name):
+        return self._get(name, 'drdt_sun')[:,0]
+
+    def out_of_shadow(self, name, radius, X):
+        """True for packets at positions X not in the shadow of object name
+
+        See SSPosition.out_of_shadow_value
+        """
+        x_from_obj = X - self.X(name)
+        r_from_obj = np.sqrt(np.sum(x_from_obj**2, axis=1))
+        costheta = np.sum(x_from_obj * self.sun_dir(name), axis=1)/r_from_obj
+        sintheta = np.sqrt(1 - costheta**2)
+
+        return (sintheta * r_from_obj >= radius) | (costheta >= 0)
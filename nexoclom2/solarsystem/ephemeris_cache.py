@@ -0,0 +1,141 @@
+import os
+import glob
+import json
+import hashlib
+import tempfile
+import numpy as np
+import h5py
+from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
+from nexoclom2.solarsystem.load_kernels import kernel_fingerprint
+
+
+class EphemerisCache:
+    """On-disk cache of the ephemeris tables sampled from SPICE by SSPosition
+    and the rotation matrices computed by Frame.
+
+    Each entry is a small HDF5 file in ``savepath/ephemeris_cache`` named by
+    a hash of everything the tables depend on, including the set of SPICE
+    kernels on disk. Entries are written to a temporary file and renamed, so
+    processes running iterations in parallel can share the cache.
+
+    The cache is limited to ``ephemeris_cache_size`` MB (set in the nexoclom2
+    configuration file, default 500). When it grows larger, the least
+    recently used entries are removed. Setting the size to 0 turns off the
+    cache.
+
+    Parameters
+    ----------
+    max_size : float, optional
+        Maximum size of the cache in MB. Overrides the configuration file.
+    path : str, optional
+        Directory for the cache. Defaults to ``savepath/ephemeris_cache``.
+    """
+    # Change when the contents of the tables change
+    version = 1
+
+    def __init__(self, max_size=None, path=None):
+        config = NexoclomConfig()
+        if path is None:
+            self.path = os.path.join(config.savepath, 'ephemeris_cache')
+        else:
+            self.path = str(path)
+        if max_size is None:
+            max_size = float(config.__dict__.get('ephemeris_cache_size', 500))
+        else:
+            pass
+        self.max_size = max_size*1e6
+        self._fingerprint = None
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def key(self, **params):
+        """Hash of the parameters and the SPICE kernels"""
+        if self._fingerprint is None:
+            self._fingerprint = kernel_fingerprint()
+        else:
+            pass
+
+        params = dict(params, kernels=self._fingerprint, version=self.version)
+        text = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.path, f'{key}.h5')
+
+    def get(self, key):
+        """Cached tables as a dict of arrays, or None if not cached"""
+        filename = self.filename(key)
+        if (not self.enabled) or (not os.path.exists(filename)):
+            return None
+        else:
+            pass
+
+        try:
+            with h5py.File(filename, 'r') as store:
+                tables = {name: store[name][:] for name in store.keys()}
+        except (OSError, KeyError):
+            # Damaged entry
+            self._remove(filename)
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+
+        return tables
+
+    def put(self, key, tables):
+        """Save a dict of arrays and remove old entries if the cache is full"""
+        if not self.enabled:
+            return
+        else:
+            pass
+
+        os.makedirs(self.path, exist_ok=True)
+        # The temporary file is unique to each process and thread
+        fd, tempname = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        os.close(fd)
+        try:
+            with h5py.File(tempname, 'w') as store:
+                for name, table in tables.items():
+                    store.create_dataset(name, data=np.asarray(table))
+            os.replace(tempname, self.filename(key))
+        except BaseException:
+            self._remove(tempname)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits"""
+        entries = []
+        for filename in glob.glob(os.path.join(self.path, '*.h5')):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_size:
+                break
+            else:
+                self._remove(filename)
+                total -= size
+
+    def clear(self):
+        """Remove all entries"""
+        for filename in glob.glob(os.path.join(self.path, '*.h5')):
+            self._remove(filename)
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
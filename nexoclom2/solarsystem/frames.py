@@ -1,89 +1,259 @@
+import threading
 import numpy as np
 import astropy.units as u
 import spiceypy as spice
+from scipy.spatial.transform import Rotation
 from nexoclom2.solarsystem.load_kernels import SpiceKernels
+from nexoclom2.solarsystem.ephemeris_cache import EphemerisCache
+from nexoclom2.solarsystem.SSObject import SSObject
+from nexoclom2.solarsystem import kepler
+
+
+def quaternion_multiply(p, q):
+    """Products of two stacks of scalar-last quaternions, (n, 4) each"""
+    px, py, pz, pw = p.T
+    qx, qy, qz, qw = q.T
+    return np.column_stack([pw*qx + px*qw + py*qz - pz*qy,
+                            pw*qy - px*qz + py*qw + pz*qx,
+                            pw*qz + px*qy - py*qx + pz*qw,
+                            pw*qw - px*qx - py*qy - pz*qz])
 
 
 class Frame:
+    """Rotations from a coordinate frame to the other frames used in a model.
+    
+    The SPICE rotation matrices are sampled at 1000 evenly spaced times over
+    the model runtime and stored as scipy Rotation stacks (quaternions).
+    Rotations at other times are interpolated with slerp; the interval
+    follows directly from the time on the uniform grid. All packets are
+    rotated in one batched operation.
+    
+    The matrices for a frame are only computed the first time vectors are
+    rotated to it, so the magnetic frames are only computed for Jupiter
+    models and the planet's solar frame only for moons. They are shared by
+    all Frames with the same object, frame, modeltime and runtime in a
+    process and are saved in the ephemeris cache (see EphemerisCache), so
+    SPICE is only needed the first time a set of rotations is used.
+    
+    With ssobj.ephemeris = 'kepler' the rotations come from the analytic
+    ephemeris in nexoclom2.solarsystem.kepler.
+    
+    Parameters
+    ----------
+    ssobj : SSObject
+        Object the frames are centered on
+    fname : str
+        Name of the frame vectors are rotated from
+    modeltime : astropy Time
+    runtime : time quantity
+    """
+    # Attributes of each Frame, including the rotations computed so far.
+    # Frames with the same parameters share the dict of rotations.
+    _registry = {}
+    
+    # The first rotation to a frame can happen in several integrator threads
+    # at once, and SPICE is not thread safe.
+    _lock = threading.Lock()
+    
     def __init__(self, ssobj, fname, modeltime, runtime):
-        kernels = SpiceKernels(ssobj.object)
-        
-        times = np.linspace(-runtime, 0*u.s, 1000).to(u.s)
-        modeltimes = modeltime + times
-        self.frame = fname
-        self.center = ssobj.object
-        self.times_et = spice.str2et(modeltimes.iso)
-        self.times_delta = times
+        runtime = u.Quantity(runtime, u.s)
+        name = (ssobj.object, ssobj.ephemeris, fname, modeltime.iso,
+                runtime.value)
+        if name in Frame._registry:
+            self.__dict__.update(Frame._registry[name])
+        else:
+            times = np.linspace(-runtime, 0*u.s, 1000)
+            self.frame = fname
+            self.center = ssobj.object
+            self.modeltime = modeltime
+            self.times_delta = times
+            self._ssobj = ssobj
+            
+            times_s = times.value
+            self._t0 = times_s[0]
+            self._dt = (times_s[-1] - times_s[0])/(len(times_s) - 1)
+            self._rotations = {}
+            
+            Frame._registry[name] = dict(self.__dict__)
+    
+    @classmethod
+    def clear_registry(cls):
+        """Forget the rotations already computed in this process"""
+        cls._registry.clear()
+    
+    def to_j2000(self, t, x):
+        return self.rotation(t, x, 'J2000')
+    
+    def to_iau(self, t, x):
+        return self.rotation(t, x, 'IAU')
+    
+    def to_solar(self, t, x):
+        return self.rotation(t, x, 'SOLAR')
+    
+    def to_solarfixed(self, t, x):
+        return self.rotation(t, x, 'SOLARFIXED')
+    
+    def to_mag(self, t, x):
+        return self.rotation(t, x, 'MAG')
+    
+    def to_cp(self, t, x):
+        return self.rotation(t, x, 'CP')
+    
+    def to_plan_solar(self, t, x):
+        return self.rotation(t, x, self.center.upper()+'SOLAR')
+    
+    def _target(self, key):
+        """SPICE name of the frame for a key, or None for the identity"""
+        ssobj = self._ssobj
         jupiter = (ssobj.object == 'Jupiter') or (ssobj.orbits == 'Jupiter')
+        if key == 'J2000':
+            return 'J2000'
+        elif key == 'IAU':
+            return ssobj.iau_frame
+        elif key in ('SOLAR', 'SOLARFIXED'):
+            return ssobj.solar_frame
+        elif (key == 'MAG') and jupiter:
+            return 'JupiterMag'
+        elif (key == 'CP') and jupiter:
+            return 'JupiterCP'
+        elif (key == 'PLANSOLAR') and (ssobj.type == 'Moon'):
+            return f'{ssobj.orbits.upper()}SOLAR'
+        else:
+            return None
+    
+    def _table(self, key):
+        """Quaternions and steps for slerp for the rotations to a frame"""
+        if key in self._rotations:
+            return self._rotations[key]
+        else:
+            pass
         
-        # to J2000
-        self.R_to_j2000 = np.zeros((len(times), 3, 3))
-        self.R_to_iau = np.zeros((len(times), 3, 3))
-        self.R_to_solar = np.zeros((len(times), 3, 3))
-        self.R_to_solarfixed = np.zeros((len(times), 3, 3))
-        self.R_to_mag = np.zeros((len(times), 3, 3))
-        self.R_to_cp = np.zeros((len(times), 3, 3))
-        self.R_to_plan_solar = np.zeros((len(times), 3, 3))
-        
-        for i, et in enumerate(self.times_et):
-            self.R_to_j2000[i,:,:] = spice.pxform(self.frame, 'J2000', et)
-            self.R_to_iau[i,:,:] = spice.pxform(self.frame, ssobj.iau_frame, et)
-            self.R_to_solar[i,:,:] = spice.pxform(self.frame, ssobj.solar_frame, et)
-            self.R_to_solarfixed[i,:,:] = spice.pxform(self.frame,
-                                                       ssobj.solar_frame, et)
-            
-            if jupiter:
-                self.R_to_mag[i,:,:] = spice.pxform(self.frame, 'JupiterMag', et)
-                self.R_to_cp[i,:,:] = spice.pxform(self.frame, 'JupiterCP', et)
+        with Frame._lock:
+            if key not in self._rotations:
+                self._rotations[key] = self._compute_table(key)
             else:
-                for j in range(3):
-                    self.R_to_mag[:,j,j] = 1
-                    self.R_to_cp[:,j,j] = 1
-            
-            if ssobj.type == 'Moon':
-                self.R_to_plan_solar[i,:,:] =spice.pxform(self.frame,
-                                                     f'{ssobj.orbits.upper()}SOLAR',
-                                                     et)
+                pass
+        
+        return self._rotations[key]
+    
+    def _compute_table(self, key):
+        if self._target(key) is None:
+            matrices = np.broadcast_to(np.identity(3),
+                                       (len(self.times_delta), 3, 3))
+        elif self._ssobj.ephemeris == 'kepler':
+            matrices = self._kepler_matrices(key)
+        else:
+            cache = EphemerisCache()
+            cachekey = cache.key(object=self.center, frame=self.frame,
+                                 target=self._target(key),
+                                 modeltime=self.modeltime.iso,
+                                 runtime=self.times_delta.value[0],
+                                 ntimes=len(self.times_delta))
+            tables = cache.get(cachekey)
+            if tables is None:
+                matrices = self._spice_matrices(key)
+                cache.put(cachekey, {'matrices': matrices})
             else:
-                for j in range(3):
-                    self.R_to_plan_solar[:,j,j] = 1
+                matrices = tables['matrices']
         
-        self.to_j2000 = lambda t, x: self.rotation(t, x, 'J2000')
-        self.to_iau = lambda t, x: self.rotation(t, x, 'IAU')
-        self.to_solar = lambda t, x: self.rotation(t, x, 'SOLAR')
-        self.to_solarfixed = lambda t, x: self.rotation(t, x, 'SOLARFIXED')
-        self.to_mag = lambda t, x: self.rotation(t, x, 'MAG')
-        self.to_cp = lambda t, x: self.rotation(t, x, 'CP')
-        self.to_plan_solar = lambda t, x: self.rotation(t, x,
-                                                        self.center.upper()+'SOLAR')
+        # The rotation from each sample to the next as rotation vectors
+        rotations = Rotation.from_matrix(matrices)
+        steps = (rotations[:-1].inv() * rotations[1:]).as_rotvec()
         
+        return rotations.as_quat(), steps
+    
+    def _spice_matrices(self, key):
+        """Rotation matrices from SPICE at each time"""
+        kernels = SpiceKernels(self.center)
+        target = self._target(key)
+        times_et = spice.str2et((self.modeltime + self.times_delta).iso)
+        matrices = np.array([spice.pxform(self.frame, target, et)
+                             for et in times_et])
         kernels.unload()
         
-    def rotation(self, times, points, frame):
+        return matrices
+    
+    def _kepler_matrices(self, key):
+        """Rotation matrices from the Keplerian ephemeris at each time"""
+        ssobj = self._ssobj
+        t = kepler.epoch_seconds(self.modeltime) + self.times_delta.value
+        
+        def from_j2000(key):
+            if key == 'J2000':
+                return np.broadcast_to(np.identity(3), (len(t), 3, 3))
+            elif key == 'PLANSOLAR':
+                planet = SSObject(ssobj.orbits, 'kepler')
+                return kepler.rotations(planet, t)['SOLAR']
+            elif key == 'SOLARFIXED':
+                return kepler.rotations(ssobj, t)['SOLAR']
+            else:
+                return kepler.rotations(ssobj, t)[key]
+        
+        to_j2000 = np.swapaxes(from_j2000(self._key(self.frame)), 1, 2)
+        return np.matmul(from_j2000(key), to_j2000)
+        
+    def _key(self, frame):
         if frame == 'J2000':
-            matrix = self.R_to_j2000
+            return 'J2000'
         elif frame.startswith('IAU'):
-            matrix = self.R_to_iau
+            return 'IAU'
         elif (frame.endswith('SOLAR')) and (self.center.upper() in frame):
-            matrix = self.R_to_solar
+            return 'SOLAR'
         elif frame.endswith('SOLAR'):
-            matrix = self.R_to_plan_solar
+            return 'PLANSOLAR'
         elif frame.endswith('SOLARFIXED'):
-            matrix = self.R_to_solarfixed
+            return 'SOLARFIXED'
         elif frame.endswith('MAG'):
-            matrix = self.R_to_mag
+            return 'MAG'
         elif frame.endswith('CP'):
-           matrix = self.R_to_cp
+           return 'CP'
         else:
            raise ValueError('solarsystem.Frame', 'Invalide coordintate frame')
-       
-        R = np.zeros((len(times), 3, 3))
-        for i in range(3):
-            for j in range(3):
-                R[:,i,j] = np.interp(times, self.times_delta, matrix[:,i,j])
-                
-        result = np.zeros_like(points)
-        for i in range(3):
-            result[:,i] = np.sum(R[:,i,:]*points, axis=1)
+    
+    def rotations(self, times, frame):
+        """Rotations to frame at the given times as a scipy Rotation.
+        
+        Times may be given as a Quantity or as floats in seconds. Times
+        outside the model run get the rotation at the nearest end.
+        """
+        quats, steps = self._table(self._key(frame))
+        
+        times = np.atleast_1d(u.Quantity(times, u.s).value)
+        x = (times - self._t0)/self._dt
+        index = np.floor(x)
+        np.clip(index, 0, len(steps)-1, out=index)
+        frac = x - index
+        np.clip(frac, 0., 1., out=frac)
+        index = index.astype(int)
+        
+        # Fraction frac of the rotation to the next sample as a quaternion
+        rotvec = frac[:,np.newaxis]*steps[index]
+        angle = np.sqrt(np.sum(rotvec**2, axis=1))
+        partial = np.column_stack([rotvec*0.5*np.sinc(angle/(2*np.pi))[:,np.newaxis],
+                                   np.cos(angle/2)])
+        
+        return Rotation.from_quat(quaternion_multiply(quats[index], partial))
+    
+    def rotate(self, times, frame, *points):
+        """Rotate one or more (n, 3) arrays of vectors to frame.
+        
+        The rotations are interpolated once and applied to each array, e.g.
+        X, V = frame.rotate(times, 'J2000', X, V)
+        
+        Returns
+        -------
+        Tuple of rotated arrays, with the same units as the inputs
+        """
+        rotations = self.rotations(times, frame)
+        result = []
+        for vectors in points:
+            if isinstance(vectors, u.Quantity):
+                result.append(rotations.apply(vectors.value)*vectors.unit)
+            else:
+                result.append(rotations.apply(vectors))
             
-        return result
+        return tuple(result)
+    
+    def rotation(self, times, points, frame):
+        """Rotate an (n, 3) array of vectors to frame"""
+        return self.rotate(times, frame, points)[0]
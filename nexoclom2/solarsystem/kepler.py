@@ -0,0 +1,244 @@
+"""Analytic Keplerian ephemeris used in place of SPICE.
+
+Selected with ``geometry.ephemeris = kepler`` in the input file. The orbits
+and rotation of each object come from PlanetaryConstants.csv (see
+SSObject with ephemeris='kepler'), so no SPICE kernels are needed. The model
+is:
+
+* Planets move on fixed Keplerian ellipses in the x-y plane of J2000 with
+  perihelion along +x, and are at perihelion at KEPLER_EPOCH.
+* Moons move on circular orbits in the equatorial plane of their planet.
+  Their orbital longitude from the equatorial x-axis is 0 at KEPLER_EPOCH.
+* Rotation axes are tilted from the orbit normal by SSObject.tilt about the
+  x-axis. Moon axes are parallel to the axis of their planet.
+* The prime meridian of each object is along the equatorial x-axis at
+  KEPLER_EPOCH, and objects rotate with SSObject.rotperiod. Longitudes are
+  positive west.
+
+These are not the real positions at a given time, but the true anomaly,
+orbital phases, and sub-solar points are self-consistent, which is what
+GeometryNoTime runs need. The solar frames are defined as in the
+nexoclom2 frames kernel: z-axis along the spin axis, x-axis toward the Sun.
+"""
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
+from nexoclom2.solarsystem.SSObject import SSObject
+
+
+KEPLER_EPOCH = Time('2000-01-01 12:00:00')
+
+
+def epoch_seconds(times):
+    """Times in seconds since KEPLER_EPOCH"""
+    return (times - KEPLER_EPOCH).to_value(u.s)
+
+
+def _mean_motion(ssobject):
+    return 2*np.pi/ssobject.orbperiod.to_value(u.s)
+
+
+def eccentric_anomaly(M, e, tolerance=1e-13, maxiter=50):
+    """Solve Kepler's equation M = E - e sin(E) for E with Newton's method"""
+    M = np.asarray(M, dtype=float)
+    E = M + e*np.sin(M)
+    for _ in range(maxiter):
+        dE = (E - e*np.sin(E) - M)/(1 - e*np.cos(E))
+        E = E - dE
+        if np.all(np.abs(dE) < tolerance):
+            break
+        else:
+            pass
+
+    return E
+
+
+def mean_anomaly(taa, e):
+    """Mean anomaly (rad) in [0, 2pi) for a true anomaly (rad)"""
+    E = 2*np.arctan2(np.sqrt(1 - e)*np.sin(taa/2), np.sqrt(1 + e)*np.cos(taa/2))
+    return np.mod(E - e*np.sin(E), 2*np.pi)
+
+
+def true_anomaly(planet, t):
+    """True anomaly (rad) of a planet at times t (s since KEPLER_EPOCH).
+
+    The angle is continuous, not wrapped to [0, 2pi).
+    """
+    e = planet.e
+    E = eccentric_anomaly(_mean_motion(planet)*t, e)
+    beta = e/(1 + np.sqrt(1 - e**2))
+    return E + 2*np.arctan2(beta*np.sin(E), 1 - beta*np.cos(E))
+
+
+def equatorial_basis(ssobject):
+    """Unit vectors (rows) of the equatorial frame of an object in J2000.
+
+    The x-axis is the J2000 x-axis and the z-axis is the spin axis.
+    """
+    if ssobject.type == 'Star':
+        return np.identity(3)
+    elif ssobject.type == 'Moon':
+        return equatorial_basis(SSObject(ssobject.orbits, 'kepler'))
+    else:
+        tilt = ssobject.tilt.to_value(u.rad)
+        return np.array([[1., 0., 0.],
+                         [0., np.cos(tilt), np.sin(tilt)],
+                         [0., -np.sin(tilt), np.cos(tilt)]])
+
+
+def state(ssobject, t):
+    """Heliocentric state vectors at times t (s since KEPLER_EPOCH).
+
+    Returns
+    -------
+    ndarray (n, 6) with positions and velocities in J2000 in km and km/s,
+    as returned by spice.spkezr
+    """
+    t = np.atleast_1d(t)
+    result = np.zeros((len(t), 6))
+    if ssobject.type == 'Star':
+        return result
+    elif ssobject.type == 'Moon':
+        result = state(SSObject(ssobject.orbits, 'kepler'), t)
+        q1, q2, _ = equatorial_basis(ssobject)
+        a, n = ssobject.a.to_value(u.km), _mean_motion(ssobject)
+        theta = n*t
+        cos, sin = np.cos(theta)[:,np.newaxis], np.sin(theta)[:,np.newaxis]
+        result[:,:3] += a*(cos*q1 + sin*q2)
+        result[:,3:] += a*n*(-sin*q1 + cos*q2)
+        return result
+    else:
+        a, e, n = ssobject.a.to_value(u.km), ssobject.e, _mean_motion(ssobject)
+        b = a*np.sqrt(1 - e**2)
+        E = eccentric_anomaly(n*t, e)
+        dEdt = n/(1 - e*np.cos(E))
+        result[:,0] = a*(np.cos(E) - e)
+        result[:,1] = b*np.sin(E)
+        result[:,3] = -a*np.sin(E)*dEdt
+        result[:,4] = b*np.cos(E)*dEdt
+        return result
+
+
+def rotations(ssobject, t):
+    """Rotation matrices from J2000 to the frames of an object.
+
+    Returns
+    -------
+    dict with the (n, 3, 3) rotation matrices at times t (s since
+    KEPLER_EPOCH) to the body-fixed frame ('IAU') and the solar frame
+    ('SOLAR')
+    """
+    t = np.atleast_1d(t)
+    q1, q2, q3 = equatorial_basis(ssobject)
+
+    matrices = {}
+    W = 2*np.pi*t/ssobject.rotperiod.to_value(u.s)
+    cos, sin = np.cos(W)[:,np.newaxis], np.sin(W)[:,np.newaxis]
+    matrices['IAU'] = np.stack([cos*q1 + sin*q2,
+                                -sin*q1 + cos*q2,
+                                np.broadcast_to(q3, (len(t), 3))], axis=1)
+
+    if ssobject.type == 'Star':
+        matrices['SOLAR'] = np.broadcast_to(np.identity(3),
+                                            (len(t), 3, 3)).copy()
+    else:
+        sun = -state(ssobject, t)[:,:3]
+        x = sun - np.outer(sun @ q3, q3)
+        x /= np.linalg.norm(x, axis=1)[:,np.newaxis]
+        z = np.broadcast_to(q3, x.shape)
+        matrices['SOLAR'] = np.stack([x, np.cross(z, x), z], axis=1)
+
+    return matrices
+
+
+def to_frame(ssobject, frame, states, t, dt=10.):
+    """Rotate state vectors from J2000 to a frame of an object.
+
+    As with spice.spkezr, velocities are relative to the rotating frame.
+
+    Parameters
+    ----------
+    ssobject : SSObject
+    frame : {'J2000', 'IAU', 'SOLAR'}
+    states : ndarray
+        (n, 6) state vectors in J2000
+    t : ndarray
+        Times (s since KEPLER_EPOCH)
+    dt : float
+        Time step (s) used for the time derivative of the rotation
+    """
+    if frame == 'J2000':
+        return states.copy()
+    else:
+        pass
+
+    matrix = rotations(ssobject, t)[frame]
+    dmatrix = (rotations(ssobject, t + dt)[frame] -
+               rotations(ssobject, t - dt)[frame])/(2*dt)
+    position = np.einsum('nij,nj->ni', matrix, states[:,:3])
+    velocity = (np.einsum('nij,nj->ni', matrix, states[:,3:]) +
+                np.einsum('nij,nj->ni', dmatrix, states[:,:3]))
+
+    return np.column_stack([position, velocity])
+
+
+def phase(moon, t):
+    """Orbital phase angle (rad) of a moon at times t (s since KEPLER_EPOCH).
+
+    This is the angle of the direction from the moon to the planet in the
+    solar frame of the planet, in [0, 2pi).
+    """
+    planet = SSObject(moon.orbits, 'kepler')
+    relative = state(moon, t) - state(planet, t)
+    X = to_frame(planet, 'SOLAR', relative, np.atleast_1d(t))
+    return np.mod(np.arctan2(-X[:,1], -X[:,0]), 2*np.pi)
+
+
+def subsolar_point(ssobject, t):
+    """Sub-solar longitude (continuous) and latitude (rad) at times t"""
+    sun = -state(ssobject, t)[:,:3]
+    sun /= np.linalg.norm(sun, axis=1)[:,np.newaxis]
+    sun_iau = np.einsum('nij,nj->ni', rotations(ssobject, t)['IAU'], sun)
+    longitude = np.unwrap(np.mod(-np.arctan2(sun_iau[:,1], sun_iau[:,0]),
+                                 2*np.pi))
+    latitude = np.arcsin(sun_iau[:,2])
+
+    return longitude, latitude
+
+
+def modeltime(geometry):
+    """A time with the geometry of a GeometryNoTime in this ephemeris.
+
+    The true anomaly is matched exactly. If the startpoint is a moon, or phi
+    is given for the satellites, the orbital phase of the startpoint (or the
+    first satellite in geometry.phi) is also matched by moving the time by
+    less than half a synodic period, which changes the true anomaly by at
+    most half the ratio of the synodic period to the orbital period.
+    """
+    startpoint = SSObject(geometry.startpoint, 'kepler')
+    if startpoint.type == 'Star':
+        return KEPLER_EPOCH
+    elif startpoint.type == 'Moon':
+        planet = SSObject(startpoint.orbits, 'kepler')
+        moon = startpoint
+    else:
+        planet = startpoint
+        phi = getattr(geometry, 'phi', {})
+        moon = SSObject(list(phi.keys())[0], 'kepler') if phi else None
+
+    t = mean_anomaly(geometry.taa.to_value(u.rad), planet.e)/_mean_motion(planet)
+
+    if moon is not None:
+        target = u.Quantity(geometry.phi[moon.object], u.deg).to_value(u.rad)
+        rate = _mean_motion(moon) - _mean_motion(planet)
+        for _ in range(20):
+            dphi = np.mod(target - phase(moon, t)[0] + np.pi, 2*np.pi) - np.pi
+            t += dphi/rate
+            if np.abs(dphi) < 1e-10:
+                break
+            else:
+                pass
+    else:
+        pass
+
+    return KEPLER_EPOCH + t*u.s
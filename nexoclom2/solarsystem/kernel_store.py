@@ -0,0 +1,449 @@
+"""Local store of the SPICE kernels used by nexoclom2.
+
+The kernels needed for each object are listed in the manifest
+``nexoclom2/data/spice_kernels.json``. They are copied into the kernel
+directory ahead of time with ``prefetch``, either from a local directory
+(e.g., a shared copy on a cluster file system), a mirror, or NAIF. When a
+model runs, ``resolve`` only looks in the kernel directory and never uses the
+network, so jobs on nodes without network access fail immediately with a
+message saying which kernels are missing.
+
+The kernel directory is ``savepath/spice_kernels`` unless ``spice_kernels``
+is set in the nexoclom2 configuration file, which allows kernels to be kept
+in a read-only location such as a container image.
+
+Each kernel is checked against the sha256 checksum in the manifest when it
+is prefetched, and prefetch fails if they differ. The checksum, size and
+modification time of the accepted file are recorded in ``kernels.json`` in
+the kernel directory. ``resolve`` only uses kernels recorded there that have
+not changed since, so kernels do not have to be hashed each time a model
+runs. Kernels without a checksum in the manifest are only accepted with
+``unpinned=True`` (``--unpinned`` from the command line). ``pin`` writes the
+checksums of a set of kernels into the manifest.
+
+Any leapseconds kernel (``*.tls``) in the kernel directory can be used in
+place of the one in the manifest.
+
+From the command line::
+
+    python -m nexoclom2.solarsystem.kernel_store prefetch --source /path/to/kernels
+    python -m nexoclom2.solarsystem.kernel_store prefetch --tables
+    python -m nexoclom2.solarsystem.kernel_store verify
+    python -m nexoclom2.solarsystem.kernel_store pin --source /path/to/kernels
+"""
+import os
+import sys
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+from nexoclom2 import path
+from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
+from nexoclom2.utilities.exceptions import KernelError
+
+
+MANIFEST = os.path.join(path, 'data', 'spice_kernels.json')
+INDEX = 'kernels.json'
+
+
+def kernel_path():
+    """Directory with the SPICE kernels"""
+    config = NexoclomConfig()
+    return config.__dict__.get('spice_kernels',
+                               os.path.join(config.savepath, 'spice_kernels'))
+
+
+def manifest():
+    """Kernels listed in the nexoclom2 manifest"""
+    with open(MANIFEST, 'r') as file:
+        return json.load(file)['kernels']
+
+
+def required_kernels(objects=None):
+    """Manifest entries needed for an object or list of objects.
+
+    All kernels in the manifest are returned if objects is None.
+    """
+    if objects is None:
+        return manifest()
+    elif isinstance(objects, str):
+        objects = [objects]
+    else:
+        pass
+
+    return [kernel for kernel in manifest()
+            if ((kernel['objects'] == 'all') or
+                any(obj in kernel['objects'] for obj in objects))]
+
+
+def checksum(filename):
+    """sha256 of a file"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def read_index(kernelpath=None):
+    """Recorded checksums and sizes of the kernels in the kernel directory"""
+    kernelpath = kernel_path() if kernelpath is None else kernelpath
+    filename = os.path.join(kernelpath, INDEX)
+    if os.path.exists(filename):
+        with open(filename, 'r') as file:
+            return json.load(file)
+    else:
+        return {}
+
+
+def _is_lsk(kernel):
+    return kernel['name'].endswith('.tls')
+
+
+def _filename(kernel, kernelpath, index=None):
+    """File to use for a manifest entry, or None if there is none.
+
+    Another leapseconds kernel is used if the one in the manifest is not in
+    the kernel directory. If index is given, only recorded kernels are
+    considered.
+    """
+    filename = os.path.join(kernelpath, kernel['name'])
+    if os.path.exists(filename) or (not _is_lsk(kernel)):
+        return filename if os.path.exists(filename) else None
+    else:
+        pass
+
+    others = sorted(glob.glob(os.path.join(kernelpath, '*.tls')))
+    if index is not None:
+        others = [other for other in others
+                  if os.path.basename(other) in index]
+    else:
+        pass
+
+    return others[-1] if len(others) > 0 else None
+
+
+def _record(filename, sha256):
+    stat = os.stat(filename)
+    return {'sha256': sha256, 'size': stat.st_size,
+            'mtime': stat.st_mtime_ns}
+
+
+def _trusted(kernel, filename, index):
+    """True if the file was accepted by prefetch and has not changed"""
+    entry = index.get(os.path.basename(filename))
+    if entry is None:
+        return False
+    else:
+        pass
+
+    # The manifest may have been pinned since the kernel was recorded
+    if ((os.path.basename(filename) == kernel['name']) and
+            (kernel['sha256'] is not None) and
+            (entry['sha256'] != kernel['sha256'])):
+        return False
+    else:
+        pass
+
+    stat = os.stat(filename)
+    return ((stat.st_size == entry['size']) and
+            (stat.st_mtime_ns == entry.get('mtime')))
+
+
+def resolve(object):
+    """Filenames of the kernels needed for an object.
+
+    Only the kernel directory is checked. The network is never used. The
+    nexoclom2 frames kernel is included at the end of the list.
+
+    Raises
+    ------
+    KernelError
+        If a kernel is missing, was not accepted by prefetch, or has changed
+        since it was prefetched.
+    """
+    kernelpath = kernel_path()
+    index = read_index(kernelpath)
+
+    kernels, missing = [], []
+    for kernel in required_kernels(object):
+        filename = _filename(kernel, kernelpath, index)
+        if filename is None:
+            filename = _filename(kernel, kernelpath)
+        else:
+            pass
+
+        if filename is None:
+            missing.append(kernel['name'])
+        elif not _trusted(kernel, filename, index):
+            raise KernelError('kernel_store.resolve',
+                              f'{filename} has not been checked against the '
+                              'manifest or has changed since it was. Run '
+                              '"python -m nexoclom2.solarsystem.kernel_store '
+                              'prefetch" to check it (add --unpinned if it '
+                              'has no checksum in the manifest), or prefetch '
+                              'it again with --overwrite.')
+        else:
+            kernels.append(filename)
+
+    if len(missing) > 0:
+        raise KernelError('kernel_store.resolve',
+                          f'SPICE kernels needed for {object} are not in '
+                          f'{kernelpath}: {", ".join(missing)}. Run '
+                          '"python -m nexoclom2.solarsystem.kernel_store '
+                          'prefetch" on a machine with access to the kernels.')
+    else:
+        pass
+
+    # Frame kernels distributed with nexoclom2
+    kernels.append(os.path.join(path, 'data', 'nexoclom_frames.tf'))
+
+    return kernels
+
+
+def prefetch(objects=None, source=None, mirror=None, overwrite=False,
+             unpinned=False, tables=False):
+    """Copy the kernels in the manifest into the kernel directory.
+
+    Kernels already in the kernel directory are checked and recorded instead
+    of being fetched again.
+
+    Parameters
+    ----------
+    objects : str, list, optional
+        Only fetch the kernels needed for these objects. Default = all
+    source : str, optional
+        Local directory to copy kernels from. Kernels not found there are
+        downloaded.
+    mirror : str, optional
+        Base URL to download kernels from instead of the manifest URLs. The
+        file name is appended to it.
+    overwrite : bool, Default = False
+        Fetch kernels already in the kernel directory again.
+    unpinned : bool, Default = False
+        Accept kernels that do not have a checksum in the manifest.
+    tables : bool, Default = False
+        After the kernels are fetched, compute the tables used by
+        find_modeltime for the planets and moons in objects and save them in
+        the kernel directory (see modeltime_tables). Tables already there are
+        kept unless overwrite is True.
+
+    Returns
+    -------
+    List of kernels that were fetched or recorded.
+
+    Raises
+    ------
+    KernelError
+        If a kernel does not match the checksum in the manifest, or has no
+        checksum in the manifest and unpinned is False.
+    """
+    kernelpath = kernel_path()
+    os.makedirs(kernelpath, exist_ok=True)
+    index = read_index(kernelpath)
+
+    fetched = []
+    for kernel in required_kernels(objects):
+        name = kernel['name']
+        existing = None if overwrite else _filename(kernel, kernelpath)
+        if (existing is not None) and _trusted(kernel, existing, index):
+            continue
+        elif existing is not None:
+            # Fetched before kernels were checked, or changed since
+            tempfile = existing
+        elif (source is not None) and os.path.exists(os.path.join(source, name)):
+            tempfile = os.path.join(kernelpath, f'{name}.{os.getpid()}.tmp')
+            print(f'Copying SPICE kernel {name} from {source}')
+            shutil.copyfile(os.path.join(source, name), tempfile)
+        else:
+            # Only needed when kernels are downloaded
+            import requests
+            
+            tempfile = os.path.join(kernelpath, f'{name}.{os.getpid()}.tmp')
+            url = kernel['url'] if mirror is None else f'{mirror.rstrip("/")}/{name}'
+            print(f'Retrieving SPICE kernel {name} from {url}')
+            with requests.get(url, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                with open(tempfile, 'wb') as file:
+                    for block in response.iter_content(2**20):
+                        file.write(block)
+
+        sha256 = checksum(tempfile)
+        if existing is not None:
+            filename = existing
+        else:
+            filename = os.path.join(kernelpath, name)
+
+        if os.path.basename(filename) != name:
+            # Another leapseconds kernel already in use
+            problem = None
+        elif kernel['sha256'] is None:
+            problem = None if unpinned else (
+                f'{name} has no checksum in the manifest. Prefetch with '
+                'unpinned=True (--unpinned) to accept it.')
+        elif sha256 != kernel['sha256']:
+            problem = f'Checksum of {name} does not match the manifest'
+        else:
+            problem = None
+
+        if problem is not None:
+            if tempfile != filename:
+                os.remove(tempfile)
+            else:
+                pass
+            raise KernelError('kernel_store.prefetch', problem)
+        else:
+            pass
+
+        os.replace(tempfile, filename)
+        index[os.path.basename(filename)] = _record(filename, sha256)
+        with open(os.path.join(kernelpath, INDEX), 'w') as file:
+            json.dump(index, file, indent=4)
+        fetched.append(os.path.basename(filename))
+
+    if tables:
+        # Imported here because modeltime_tables needs the kernels
+        from nexoclom2.solarsystem import modeltime_tables
+        if objects is None:
+            planets, moons = modeltime_tables.PLANETS, modeltime_tables.MOONS
+        else:
+            objects = [objects] if isinstance(objects, str) else objects
+            planets = [obj for obj in modeltime_tables.PLANETS if obj in objects]
+            moons = [obj for obj in modeltime_tables.MOONS if obj in objects]
+        modeltime_tables.build_modeltime_tables(
+            planets, moons,
+            os.path.join(kernelpath, modeltime_tables.TABLENAME), overwrite)
+    else:
+        pass
+
+    return fetched
+
+
+def verify(objects=None):
+    """Check the kernels in the kernel directory against their checksums.
+
+    Kernels are compared with the checksums in the manifest, or with the
+    checksums recorded by prefetch for kernels not pinned in the manifest.
+
+    Returns
+    -------
+    dict of kernel name: problem for the kernels that are missing or do not
+    match. Empty if all kernels are good.
+    """
+    kernelpath = kernel_path()
+    index = read_index(kernelpath)
+
+    problems = {}
+    for kernel in required_kernels(objects):
+        filename = _filename(kernel, kernelpath, index)
+        if filename is None:
+            filename = _filename(kernel, kernelpath)
+        else:
+            pass
+
+        if filename is None:
+            problems[kernel['name']] = 'missing'
+            continue
+        else:
+            pass
+
+        name = os.path.basename(filename)
+        sha256 = checksum(filename)
+        if name == kernel['name'] and (kernel['sha256'] is not None):
+            expected = kernel['sha256']
+        else:
+            expected = index.get(name, {}).get('sha256')
+
+        if expected is None:
+            problems[name] = 'not recorded'
+        elif sha256 != expected:
+            problems[name] = 'checksum does not match'
+        else:
+            pass
+
+    return problems
+
+
+def pin(objects=None, source=None):
+    """Write the checksums of kernels into the manifest.
+
+    Only for maintainers updating the manifest. The kernels must be the
+    files published at the manifest URLs.
+
+    Parameters
+    ----------
+    objects : str, list, optional
+        Only pin the kernels needed for these objects. Default = all
+    source : str, optional
+        Directory with the kernels. Default = the kernel directory
+
+    Returns
+    -------
+    dict of kernel name: sha256
+    """
+    source = kernel_path() if source is None else source
+    names = [kernel['name'] for kernel in required_kernels(objects)]
+    with open(MANIFEST, 'r') as file:
+        contents = json.load(file)
+
+    pinned = {}
+    for kernel in contents['kernels']:
+        filename = os.path.join(source, kernel['name'])
+        if (kernel['name'] in names) and os.path.exists(filename):
+            kernel['sha256'] = checksum(filename)
+            pinned[kernel['name']] = kernel['sha256']
+        else:
+            pass
+
+    tempfile = f'{MANIFEST}.{os.getpid()}.tmp'
+    with open(tempfile, 'w') as file:
+        json.dump(contents, file, indent=4)
+    os.replace(tempfile, MANIFEST)
+
+    return pinned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m nexoclom2.solarsystem.kernel_store',
+        description='Manage the local store of SPICE kernels')
+    parser.add_argument('command', choices=['prefetch', 'verify', 'pin'])
+    parser.add_argument('--objects', nargs='*', default=None,
+                        help='Objects to get kernels for. Default = all')
+    parser.add_argument('--source', default=None,
+                        help='Local directory to copy kernels from')
+    parser.add_argument('--mirror', default=None,
+                        help='Base URL to download kernels from')
+    parser.add_argument('--overwrite', action='store_true')
+    parser.add_argument('--unpinned', action='store_true',
+                        help='Accept kernels without a checksum in the '
+                             'manifest')
+    parser.add_argument('--tables', action='store_true',
+                        help='Also compute the tables used by find_modeltime')
+    args = parser.parse_args(argv)
+
+    if args.command == 'prefetch':
+        try:
+            fetched = prefetch(args.objects, args.source, args.mirror,
+                               args.overwrite, args.unpinned, args.tables)
+        except KernelError as error:
+            print(error.message)
+            return 1
+        print(f'{len(fetched)} kernels fetched into {kernel_path()}')
+        return 0
+    elif args.command == 'pin':
+        pinned = pin(args.objects, args.source)
+        for name, sha256 in pinned.items():
+            print(f'{name}: {sha256}')
+        return 0
+    else:
+        problems = verify(args.objects)
+        for name, problem in problems.items():
+            print(f'{name}: {problem}')
+        return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,147 +1,142 @@
 import os
-import glob
+import time
+import atexit
+import hashlib
+import threading
 import spiceypy as spice
-from bs4 import BeautifulSoup
-import requests
 from nexoclom2 import path
-from nexoclom2.utilities.NexoclomConfig import NexoclomConfig
+from nexoclom2.solarsystem.kernel_store import kernel_path, resolve
 
 
-class SpiceKernels:
-    def __init__(self, object):
-        """Download spice kernels if necessary and then load them
-        Parameters
-        ----------
-        objects : str, list
-            Specify which objects need kernels loaded. Default: load default kernels
-        """
-        datapath = NexoclomConfig().savepath
-        kernelpath = os.path.join(datapath, 'spice_kernels')
-        naif_url = 'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/'
-        kernels_to_load = []
-        if not os.path.exists(kernelpath):
-            os.makedirs(kernelpath)
-        else:
-            pass
-
-        # leap second kernel
-        lsk_kernel = glob.glob(os.path.join(kernelpath, '*.tls'))
-        if len(lsk_kernel) == 0:
-            lsk_url = os.path.join(naif_url, 'lsk')
-            page = requests.get(lsk_url).text
-            soup = BeautifulSoup(page, 'html.parser')
-            
-            lsk_files = []
-            for node in soup.find_all('a'):
-                text = node.get('href')
-                if ((text is not None) and text.startswith('naif') and
-                    text.endswith('tls')):
-                        lsk_files.append(node.text)
-                else:
-                    pass
-            assert len(lsk_files) > 0, 'Could not find leapsecond kernels'
-            
-            lsk_file = sorted(lsk_files)[-1]
-            print(f'Retreiving leapsecond kernel {lsk_file}')
-            lsk = requests.get(os.path.join(lsk_url, lsk_file))
-            lsk_kernel = os.path.join(kernelpath, lsk_file)
-            with open(lsk_kernel, 'w') as file:
-                file.write(lsk.text)
-                
-            kernels_to_load.append(lsk_kernel)
-        else:
-            kernels_to_load.append(lsk_kernel[0])
-            
-        # pck kernel
-        pck_kernel = os.path.join(kernelpath, 'pck00011.tpc')
-        if not os.path.exists(pck_kernel):
-            print(f'Retreiving planetary shape kernel {os.path.basename(pck_kernel)}')
-            pck = requests.get(
-                'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/pck/pck00011.tpc')
-            with open(pck_kernel, 'w') as file:
-                file.write(pck.text)
-        else:
-            pass
-        kernels_to_load.append(pck_kernel)
-        
-        pck_kernel = os.path.join(kernelpath, 'gm_de440.tpc')
-        if not os.path.exists(pck_kernel):
-            print(f'Retreiving planetary shape kernel {os.path.basename(pck_kernel)}')
-            pck = requests.get(
-                'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/pck/gm_de440.tpc')
-            with open(pck_kernel, 'w') as file:
-                file.write(pck.text)
-        else:
-            pass
-        kernels_to_load.append(pck_kernel)
-        
-        if object == 'Mercury':
-            spk_kernel = os.path.join(kernelpath, 'msgr_040803_150430_150430_od431sc_2.bsp')
-            url = 'https://naif.jpl.nasa.gov/pub/naif/pds/data/mess-e_v_h-spice-6-v1.0/messsp_1000/data/spk/msgr_040803_150430_150430_od431sc_2.bsp'
-        
-            if not os.path.exists(spk_kernel):
-                print(f'Retreiving planetary ephemeris kernel {os.path.basename(spk_kernel)}')
-                spk = requests.get(url)
-                with open(spk_kernel, 'wb') as file:
-                    file.write(spk.content)
+class KernelManager:
+    """Loads each SPICE kernel once per process.
+    
+    SPICE keeps a single kernel pool per process, and furnsh loads a file
+    again each time it is called. The manager keeps track of the kernels that
+    are loaded and how many SpiceKernels are using each one. Kernels stay
+    loaded when they are no longer used, so constructing objects in a loop
+    does not reload them, and are unloaded by unload() or at exit.
+    
+    Use the module instance kernel_manager. Its stats attribute has the
+    number of kernel files loaded and unloaded, the number of requests, and
+    the time spent in furnsh.
+    """
+    def __init__(self):
+        self.refcount = {}
+        self.files = {}
+        self.stats = {'requests': 0, 'loads': 0, 'unloads': 0,
+                      'load_time': 0.}
+        self._lock = threading.Lock()
+        atexit.register(self.unload, force=True)
+    
+    @property
+    def loaded(self):
+        return list(self.refcount.keys())
+    
+    def acquire(self, object):
+        """Load the kernels needed for object and return their filenames"""
+        with self._lock:
+            if object not in self.files:
+                self.files[object] = resolve(object)
             else:
                 pass
-            kernels_to_load.append(spk_kernel)
-        else:
-            pass
             
-        spk_kernel = os.path.join(kernelpath, 'de440.bsp')
-        url = 'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/planets/de440s.bsp'
-        if not os.path.exists(spk_kernel):
-            print(f'Retreiving planetary ephemeris kernel {os.path.basename(spk_kernel)}')
-            spk = requests.get(url)
-            with open(spk_kernel, 'wb') as file:
-                file.write(spk.content)
+            self.stats['requests'] += 1
+            return self._acquire(self.files[object])
+    
+    def acquire_files(self, kernels):
+        """Load kernel files by name and return them"""
+        with self._lock:
+            self.stats['requests'] += 1
+            return self._acquire(kernels)
+    
+    def _acquire(self, kernels):
+        new = [kernel for kernel in kernels if kernel not in self.refcount]
+        if len(new) > 0:
+            start = time.perf_counter()
+            spice.furnsh(new)
+            self.stats['load_time'] += time.perf_counter() - start
+            self.stats['loads'] += len(new)
         else:
             pass
-        kernels_to_load.append(spk_kernel)
         
-        if object in ('Jupiter', 'Io', 'Europa', 'Ganymede', 'Callisto'):
-            spk_kernel = os.path.join(kernelpath, 'jup365.bsp')
-            if not os.path.exists(spk_kernel):
-                print('Retreiving planetary ephemeris kernel '
-                      f'{os.path.basename(spk_kernel)}')
-                spk = requests.get(
-                    'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/satellites/jup365.bsp')
-                with open(spk_kernel, 'wb') as file:
-                    file.write(spk.content)
-            else:
-                pass
-            kernels_to_load.append(spk_kernel)
-        else:
-            pass
+        for kernel in kernels:
+            self.refcount[kernel] = self.refcount.get(kernel, 0) + 1
         
-        if object in ('Saturn', 'Mimas', 'Enceladus', 'Tethys', 'Dione', 'Rhea',
-                      'Titan', 'Hyperion', 'Iapetus', 'Phoebe'):
-            spk_kernel = os.path.join(kernelpath, 'sat441.bsp')
-            if not os.path.exists(spk_kernel):
-                print('Retreiving planetary ephemeris kernel '
-                      f'{os.path.basename(spk_kernel)}')
-                spk = requests.get(
-                    'https://naif.jpl.nasa.gov/pub/naif/generic_kernels/spk/satellites/sat441.bsp')
-                with open(spk_kernel, 'wb') as file:
-                    file.write(spk.content)
+        return list(kernels)
+    
+    def release(self, kernels):
+        """Stop using kernels. They stay loaded until unload() is called."""
+        with self._lock:
+            for kernel in kernels:
+                if self.refcount.get(kernel, 0) > 0:
+                    self.refcount[kernel] -= 1
+                else:
+                    pass
+    
+    def unload(self, force=False):
+        """Unload kernels that are not in use, or all kernels if force=True"""
+        with self._lock:
+            unused = [kernel for kernel, count in self.refcount.items()
+                      if force or (count == 0)]
+            if len(unused) > 0:
+                spice.unload(unused)
+                self.stats['unloads'] += len(unused)
             else:
                 pass
-            kernels_to_load.append(spk_kernel)
-        else:
-            pass
+            
+            for kernel in unused:
+                del self.refcount[kernel]
+
+
+kernel_manager = KernelManager()
+
+
+class SpiceKernels:
+    def __init__(self, object):
+        """Make sure the kernels needed for an object are loaded.
         
-        # Frame kernels
-        kernels_to_load.append(os.path.join(path, 'data', 'nexoclom_frames.tf'))
+        Kernels are loaded by kernel_manager, so kernels already loaded in
+        this process are not loaded again.
         
-        spice.furnsh(kernels_to_load)
-        self.kernels = kernels_to_load
+        Parameters
+        ----------
+        object : str
+            Specify which object needs kernels loaded.
+        """
+        self.kernels = kernel_manager.acquire(object)
     
     def unload(self):
-        spice.unload(self.kernels)
+        """Release the kernels. See KernelManager.unload to unload them."""
+        kernel_manager.release(self.kernels)
+        self.kernels = []
         
     def load_kernels(self, kernels):
         """Manually load a kernel or kernels"""
-        spice.furnsh(kernels)
-        self.kernels.extend(kernels)
+        if isinstance(kernels, str):
+            kernels = [kernels]
+        else:
+            pass
+        self.kernels.extend(kernel_manager.acquire_files(kernels))
+
+
+def kernel_fingerprint():
+    """Identifies the set of SPICE kernels on disk without loading them.
+
+    Uses the names and sizes of the downloaded kernels and the contents of
+    the nexoclom2 frames kernel, so anything computed from the kernels can be
+    cached and recomputed when a kernel is added or replaced.
+    """
+    kernelpath = kernel_path()
+    if os.path.exists(kernelpath):
+        kernels = sorted((entry.name, entry.stat().st_size)
+                         for entry in os.scandir(kernelpath)
+                         if entry.is_file())
+    else:
+        kernels = []
+
+    digest = hashlib.sha1(repr(kernels).encode())
+    with open(os.path.join(path, 'data', 'nexoclom_frames.tf'), 'rb') as file:
+        digest.update(file.read())
+
+    return digest.hexdigest()
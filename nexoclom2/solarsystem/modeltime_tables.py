@@ -0,0 +1,318 @@
+"""Precomputed tables used by find_modeltime.
+
+find_modeltime needs a time at which the geometry of a GeometryNoTime
+occurs. Instead of sampling SPICE for each run, the times are looked up in
+tables computed once from SPICE starting at a fixed reference epoch and
+stored in ``data/modeltime_tables.hdf5``:
+
+* For each planet, the true anomaly over one orbit starting at
+  REFERENCE_EPOCH. The time for a TAA is interpolated.
+* For each Jovian and Saturnian moon, a grid of orbital phase (phi) and
+  sub-solar longitude of the planet (CML) giving the first time after
+  REFERENCE_EPOCH at which the moon and planet are in each cell. The time
+  of the nearest cell that was reached is used.
+
+The same geometry always gives the same modeltime. The tables are read from
+``data/modeltime_tables.hdf5`` in the package, then from
+``modeltime_tables.hdf5`` in the SPICE kernel directory (see kernel_store).
+The tables in the kernel directory are computed when the kernels are
+prefetched with ``--tables``, so they are computed once for each kernel
+store instead of for each machine or run::
+
+    python -m nexoclom2.solarsystem.kernel_store prefetch --tables
+
+A planet that is in neither file has its table computed from SPICE the first
+time it is needed and saved in the ephemeris cache (see EphemerisCache). A
+moon that is in neither file raises FileNotFoundError, since its grid takes
+too long to compute while a model runs. To compute the tables in another
+file, run this module on a machine with the SPICE kernels::
+
+    python -m nexoclom2.solarsystem.modeltime_tables --filename tables.hdf5
+
+Tables already in the file are kept unless ``--overwrite`` is given.
+"""
+import os
+import sys
+import shutil
+import argparse
+import numpy as np
+import h5py
+import astropy.units as u
+from astropy.time import Time
+from nexoclom2 import path
+from nexoclom2.solarsystem.SSObject import SSObject
+from nexoclom2.solarsystem.SSPosition import SSPosition
+from nexoclom2.solarsystem.ephemeris_cache import EphemerisCache
+from nexoclom2.solarsystem.kernel_store import kernel_path
+
+
+TABLENAME = 'modeltime_tables.hdf5'
+TABLEFILE = os.path.join(path, 'data', TABLENAME)
+REFERENCE_EPOCH = Time('2025-01-01 00:00:00')
+PLANETS = ('Mercury', 'Venus', 'Earth', 'Mars', 'Jupiter', 'Saturn')
+MOONS = ('Io', 'Europa', 'Ganymede', 'Callisto', 'Mimas', 'Enceladus',
+         'Tethys', 'Dione', 'Rhea', 'Titan')
+
+# Tables read from the table files or computed in this process
+_tables = {}
+
+
+def _geometry(center, startpoint, modeltime):
+    # Imported here because the geometry classes import nexoclom2.solarsystem
+    from nexoclom2.initial_state.geometry.GeometryTime import GeometryTime
+    return GeometryTime({'center': center, 'startpoint': startpoint,
+                         'modeltime': modeltime.iso})
+
+
+def build_taa_table(planet, ntimes=3601):
+    """True anomaly of a planet over one orbit starting at REFERENCE_EPOCH.
+
+    Returns
+    -------
+    taa : ndarray
+        Increasing true anomaly in degrees. Not wrapped to [0, 360).
+    time : ndarray
+        Seconds after REFERENCE_EPOCH
+    """
+    ssobject = SSObject(planet)
+    period = ssobject.orbperiod.to(u.s)
+    geometry = _geometry(ssobject.object, ssobject.object,
+                         REFERENCE_EPOCH + period)
+    position = SSPosition(ssobject, geometry, period)
+
+    times = np.linspace(-period, 0*u.s, ntimes)
+    taa = np.degrees(np.unwrap(position.taa(times).to_value(u.rad)))
+
+    return taa, (times + period).to_value(u.s)
+
+
+def cached_taa_table(planet):
+    """TAA table for a planet from the ephemeris cache, computed and saved
+    in the cache if it is not there"""
+    cache = EphemerisCache()
+    key = cache.key(table='taa', object=planet, epoch=REFERENCE_EPOCH.iso)
+    tables = cache.get(key)
+    if tables is None:
+        taa, time = build_taa_table(planet)
+        cache.put(key, {'taa': taa, 'time': time})
+    else:
+        taa, time = tables['taa'], tables['time']
+
+    return taa, time
+
+
+def build_phase_grid(moon, resolution=1*u.deg, max_duration=20*u.yr,
+                     chunk=10*u.d):
+    """First time after REFERENCE_EPOCH at which a moon has each (phi, CML).
+
+    Parameters
+    ----------
+    moon : str
+    resolution : angle quantity, Default = 1º
+        Size of the grid cells
+    max_duration : time quantity, Default = 20 yr
+        Time after REFERENCE_EPOCH to search. Cells not reached by then are
+        left empty.
+    chunk : time quantity, Default = 10 d
+        Time sampled with each SSPosition
+
+    Returns
+    -------
+    phi, cml : ndarray
+        Cell centers in degrees
+    time : ndarray
+        (phi, cml) grid of seconds after REFERENCE_EPOCH. NaN for cells
+        that were not reached.
+    """
+    ssobject = SSObject(moon)
+    planet = SSObject(ssobject.orbits)
+
+    step = resolution.to_value(u.deg)
+    phi = np.arange(0, 360, step) + step/2
+    cml = np.arange(0, 360, step) + step/2
+    grid = np.full((len(phi), len(cml)), np.nan)
+
+    # Sample often enough that no cell is skipped
+    rate = 360/min(ssobject.orbperiod.to_value(u.s),
+                   planet.rotperiod.to_value(u.s))
+    dt = 0.5*step/rate
+    chunk = chunk.to_value(u.s)
+    times = np.arange(-chunk, 0, dt)*u.s
+
+    start = 0.
+    while (start < max_duration.to_value(u.s)) and np.any(np.isnan(grid)):
+        geometry = _geometry(planet.object, ssobject.object,
+                             REFERENCE_EPOCH + (start + chunk)*u.s)
+        moon_pos = SSPosition(ssobject, geometry, chunk*u.s)
+        planet_pos = SSPosition(planet, geometry, chunk*u.s)
+
+        i = (moon_pos.phi(times).to_value(u.deg)//step).astype(int) % len(phi)
+        j = (planet_pos.subsolar_longitude(times).to_value(u.deg)//step
+             ).astype(int) % len(cml)
+        seconds = times.value + start + chunk
+
+        # Keep the earliest time in each cell. Earlier chunks are done first.
+        cells, first = np.unique(i*len(cml) + j, return_index=True)
+        empty = np.isnan(grid.flat[cells])
+        grid.flat[cells[empty]] = seconds[first[empty]]
+        start += chunk
+
+    return phi, cml, grid
+
+
+def build_modeltime_tables(planets=PLANETS, moons=MOONS, filename=TABLEFILE,
+                           overwrite=False, **kwargs):
+    """Compute the tables and save them in filename.
+
+    Tables already in filename are kept unless overwrite is True.
+    """
+    tempfile = f'{filename}.{os.getpid()}.tmp'
+    if os.path.exists(filename) and not overwrite:
+        shutil.copyfile(filename, tempfile)
+    else:
+        pass
+
+    with h5py.File(tempfile, 'a') as store:
+        store.attrs['epoch'] = REFERENCE_EPOCH.iso
+        for planet in planets:
+            if ('taa' in store) and (planet in store['taa']):
+                continue
+            print(f'Computing TAA table for {planet}')
+            write_taa_table(store, planet, *build_taa_table(planet))
+        for moon in moons:
+            if ('phase' in store) and (moon in store['phase']):
+                continue
+            print(f'Computing phi, CML grid for {moon}')
+            write_phase_grid(store, moon, *build_phase_grid(moon, **kwargs))
+
+    os.replace(tempfile, filename)
+
+
+def write_taa_table(store, planet, taa, time):
+    group = store.require_group('taa').create_group(planet)
+    group.create_dataset('taa', data=taa)
+    group.create_dataset('time', data=time)
+
+
+def write_phase_grid(store, moon, phi, cml, time):
+    group = store.require_group('phase').create_group(moon)
+    group.create_dataset('phi', data=phi)
+    group.create_dataset('cml', data=cml)
+    group.create_dataset('time', data=time, compression='gzip')
+
+
+def table_files():
+    """Files searched for tables, in order"""
+    return (TABLEFILE, os.path.join(kernel_path(), TABLENAME))
+
+
+def read_table(kind, name):
+    """Datasets for an object in the table files as a tuple, or None"""
+    if (kind, name) in _tables:
+        return _tables[kind, name]
+    else:
+        pass
+
+    table = None
+    for filename in table_files():
+        if not os.path.exists(filename):
+            continue
+        with h5py.File(filename, 'r') as store:
+            if (kind in store) and (name in store[kind]):
+                group = store[kind][name]
+                keys = (('taa', 'time') if kind == 'taa'
+                        else ('phi', 'cml', 'time'))
+                table = tuple(group[key][()] for key in keys)
+                break
+            else:
+                pass
+
+    _tables[kind, name] = table
+    return table
+
+
+def taa_time(planet, taa):
+    """Time at which a planet has a true anomaly.
+
+    If the planet is not in the table files, its table is read from the
+    ephemeris cache or computed from SPICE and saved in the cache.
+
+    Parameters
+    ----------
+    planet : str
+    taa : angle quantity
+
+    Returns
+    -------
+    astropy Time in the first orbit after REFERENCE_EPOCH
+    """
+    table = read_table('taa', planet)
+    if table is None:
+        table = cached_taa_table(planet)
+        _tables['taa', planet] = table
+    else:
+        pass
+
+    taa_table, time = table
+    target = taa_table[0] + np.mod(taa.to_value(u.deg) - taa_table[0], 360)
+
+    return REFERENCE_EPOCH + np.interp(target, taa_table, time)*u.s
+
+
+def phase_time(moon, phi, cml):
+    """Time at which a moon has orbital phase phi and its planet has
+    sub-solar longitude cml.
+
+    Parameters
+    ----------
+    moon : str
+    phi, cml : angle quantity
+
+    Returns
+    -------
+    astropy Time of the nearest grid cell that was reached
+
+    Raises
+    ------
+    FileNotFoundError
+        If none of the table files have a grid for the moon
+    """
+    table = read_table('phase', moon)
+    if table is None:
+        raise FileNotFoundError(f'No phi, CML grid for {moon} in '
+                                f'{" or ".join(table_files())}. Run python -m '
+                                'nexoclom2.solarsystem.kernel_store prefetch '
+                                '--tables')
+    else:
+        pass
+
+    phi_grid, cml_grid, time = table
+    dphi = np.abs(np.mod(phi_grid - phi.to_value(u.deg) + 180, 360) - 180)
+    dcml = np.abs(np.mod(cml_grid - cml.to_value(u.deg) + 180, 360) - 180)
+    distance = np.hypot(dphi[:,np.newaxis], dcml[np.newaxis,:])
+    distance[np.isnan(time)] = np.inf
+    i, j = np.unravel_index(np.argmin(distance), distance.shape)
+
+    return REFERENCE_EPOCH + time[i, j]*u.s
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m nexoclom2.solarsystem.modeltime_tables',
+        description='Compute the tables used by find_modeltime')
+    parser.add_argument('--planets', nargs='*', default=PLANETS)
+    parser.add_argument('--moons', nargs='*', default=MOONS)
+    parser.add_argument('--resolution', type=float, default=1.,
+                        help='Size of the phi, CML grid cells in degrees')
+    parser.add_argument('--filename', default=TABLEFILE)
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Compute tables already in the file again')
+    args = parser.parse_args(argv)
+
+    build_modeltime_tables(args.planets, args.moons, args.filename,
+                           args.overwrite, resolution=args.resolution*u.deg)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -25,6 +25,20 @@ class NexoclomConfig:
     
     ``user``: username (Required if not set as an environment variable).
 
+    ``spice_kernels``: Directory with the SPICE kernels (Optional). Defaults to
+    ``savepath/spice_kernels``. See nexoclom2.solarsystem.kernel_store.
+
+    ``ephemeris_cache_size``: Maximum size in MB of the cache of ephemeris
+    tables (Optional). Defaults to 500. Set to 0 to turn off the cache.
+
+    ``final_state_buffer``: Number of packets buffered before the final
+    states are written to disk while a model runs (Optional). Defaults to
+    100000.
+
+    ``output_chunk_size``, ``output_compression``, ``output_float32``,
+    ``output_read_cache``: How model outputs are stored (Optional). See
+    nexoclom2.particle_tracking.storage_layout.StorageLayout.
+
     Parameters
     ----------
     None
@@ -23,6 +23,10 @@ class DatabaseOperations:
     """
     def __init__(self):
         config = NexoclomConfig()
+        if not os.path.exists(config.savepath):
+            os.makedirs(config.savepath)
+        else:
+            pass
         self.db_path = os.path.join(config.savepath, config.database)
         
     @classmethod
@@ -19,6 +19,14 @@ class ConfigfileError(Exception):
         super().__init__(self.message)
 
 
+class KernelError(Exception):
+    """Raised when SPICE kernels are missing or do not match the manifest"""
+    def __init__(self, expression, message):
+        self.expression = expression
+        self.message = message
+        super().__init__(self.message)
+
+
 class OutOfRangeError(Exception):
     """Raised when an value in an input file is out of specified range"""
     def __init__(self, expression, param, rng, include_min=True, include_max=True):
@@ -0,0 +1,98 @@
+import os
+import time
+import tracemalloc
+import numpy as np
+from nexoclom2 import Input, Output, path
+from nexoclom2.particle_tracking.starting_point import StartingPoint
+from nexoclom2.particle_tracking.state_vectors import StateVector
+from nexoclom2.particle_tracking.rk5_integrator import rk5Integrator
+
+
+def benchmark_integrator(inputname, n_packets=10000, n_steps=10,
+                         step_size=100.):
+    """Measure the speed of a single rk5 step in packet-steps per second.
+
+    Parameters
+    ----------
+    inputname: str
+        Name of an input file in tests/test_data/inputfiles
+    n_packets: int
+        Number of packets to step
+    n_steps: int
+        Number of times the step is repeated
+    step_size: float
+        Step size in seconds
+
+    Returns
+    -------
+    Packet-steps per second
+    """
+    inputfile = os.path.join(os.path.dirname(path), 'tests', 'test_data',
+                             'inputfiles', inputname)
+    inputs = Input(inputfile)
+
+    # Setting up the Output with no packets does not run the model
+    output = Output(inputs, 0)
+    startpoint = StartingPoint(output, n_packets)
+    state = StateVector(output, startpoint)
+    h = np.zeros(n_packets) + step_size
+
+    integrator = rk5Integrator()
+    integrator.step(state, output, h)
+
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        integrator.step(state, output, h)
+    elapsed = time.perf_counter() - start
+
+    rate = n_packets*n_steps/elapsed
+    print(f'{inputname}: {n_packets} packets, {rate:0.0f} packet-steps/s')
+
+    return rate
+
+
+def benchmark_memory(inputname, n_packets=10000, step_size=100.):
+    """Measure the memory used by a single rk5 step.
+
+    The stage workspace is allocated by the first step, so the second step
+    shows what is allocated per step once the workspace exists.
+
+    Returns
+    -------
+    Peak memory (bytes) above the starting state during the first and the
+    second step
+    """
+    inputfile = os.path.join(os.path.dirname(path), 'tests', 'test_data',
+                             'inputfiles', inputname)
+    inputs = Input(inputfile)
+    output = Output(inputs, 0)
+    startpoint = StartingPoint(output, n_packets)
+    state = StateVector(output, startpoint)
+    h = np.zeros(n_packets) + step_size
+    integrator = rk5Integrator()
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(2):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        integrator.step(state, output, h)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+    tracemalloc.stop()
+
+    state_size = state.X.nbytes + state.V.nbytes + state.time.nbytes
+    print(f'{inputname}: {n_packets} packets, state = {state_size/1e6:0.1f} MB, '
+          f'first step = {peaks[0]/1e6:0.1f} MB, '
+          f'next step = {peaks[1]/1e6:0.1f} MB')
+
+    return peaks
+
+
+if __name__ == '__main__':
+    for inputname in ('Mercury_Mercury_variable_time.input',
+                      'Mercury_Sun_variable_time.input',
+                      'Io_Jupiter.input'):
+        for n_packets in (1000, 100000):
+            benchmark_integrator(inputname, n_packets)
+            benchmark_memory(inputname, n_packets)
@@ -0,0 +1,133 @@
+import os
+import time
+import tempfile
+import numpy as np
+import h5py
+from nexoclom2.particle_tracking.storage_layout import StorageLayout
+
+
+FINAL_KEYS = ['time', 'x', 'y', 'z', 'vx', 'vy', 'vz', 'frac', 'escaped',
+              'ionized', 'packet_number', 'iteration', 'hit/Mercury']
+
+# Columns read by ModelImage
+IMAGE_KEYS = ['time', 'x', 'y', 'z', 'vx', 'vy', 'vz', 'frac']
+
+
+def final_state(n_packets, first=0, seed=0):
+    """Made up final state that looks like a model output"""
+    rng = np.random.default_rng(seed + first)
+    number = np.arange(first, first + n_packets)
+    r = 1 + rng.exponential(2, n_packets)
+    theta = rng.uniform(0, 2*np.pi, n_packets)
+    columns = {'time': -rng.uniform(0, 1e5, n_packets),
+               'x': r*np.cos(theta),
+               'y': r*np.sin(theta),
+               'z': rng.normal(0, 0.5, n_packets),
+               'vx': rng.normal(0, 2, n_packets),
+               'vy': rng.normal(0, 2, n_packets),
+               'vz': rng.normal(0, 2, n_packets),
+               'frac': np.exp(-rng.uniform(0, 3, n_packets)),
+               'escaped': np.where(r > 10, 1., 0.),
+               'ionized': rng.uniform(0, 0.1, n_packets),
+               'packet_number': number,
+               'iteration': number//1000000,
+               'hit/Mercury': np.zeros(n_packets)}
+    return columns
+
+
+def write_file(filename, n_packets, layout=None, block=1000000):
+    """Write a final state in blocks like the FinalStateWriter.
+
+    With layout=None, the datasets are made the way they were before
+    StorageLayout: h5py's default chunks and dtype and no compression.
+    """
+    with h5py.File(filename, 'w') as store:
+        for key in FINAL_KEYS:
+            if layout is None:
+                store.create_dataset(f'final_state/{key}', shape=(0, ),
+                                     maxshape=(None, ), dtype='f4')
+            else:
+                layout.create(store, f'final_state/{key}')
+
+        for first in range(0, n_packets, block):
+            columns = final_state(min(block, n_packets - first), first)
+            for key, data in columns.items():
+                dataset = store[f'final_state/{key}']
+                old_len = dataset.shape[0]
+                dataset.resize((old_len + len(data), ))
+                dataset[old_len:] = data
+
+
+def read_file(filename, layout=None, chunksize=1000000):
+    """Read the columns used by ModelImage in chunks"""
+    if layout is None:
+        store = h5py.File(filename, 'r')
+    else:
+        store = layout.open(filename)
+
+    n_packets = store['final_state/time'].shape[0]
+    total = 0.
+    for ct in range(0, n_packets, chunksize):
+        if layout is None:
+            # ModelImage used to index with an array
+            ind = np.arange(ct, min(ct+chunksize, n_packets))
+        else:
+            ind = slice(ct, min(ct+chunksize, n_packets))
+        for key in IMAGE_KEYS:
+            total += store[f'final_state/{key}'][ind][0]
+    store.close()
+
+    return total
+
+
+def benchmark_storage(n_packets=10000000, layouts=None, path=None):
+    """Size, write time, and read throughput of model outputs.
+
+    Parameters
+    ----------
+    n_packets : int
+        Number of packets in the final state
+    layouts : dict, optional
+        Name and StorageLayout (or None for the old layout) to compare
+    path : str, optional
+        Directory for the test files. Defaults to a temporary directory.
+
+    Returns
+    -------
+    dict with the size (MB), write time (s), and read rate (packets/s) for
+    each layout
+    """
+    if layouts is None:
+        layouts = {'old': None,
+                   'none': StorageLayout(compression='none'),
+                   'none, float32': StorageLayout(compression='none',
+                                                  float32=True),
+                   'lzf': StorageLayout(compression='lzf'),
+                   'gzip': StorageLayout(compression='gzip')}
+    else:
+        pass
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=path) as tempdir:
+        for name, layout in layouts.items():
+            filename = os.path.join(tempdir, 'benchmark.h5')
+
+            start = time.perf_counter()
+            write_file(filename, n_packets, layout)
+            write_time = time.perf_counter() - start
+            size = os.path.getsize(filename)/1e6
+
+            start = time.perf_counter()
+            read_file(filename, layout)
+            read_rate = n_packets/(time.perf_counter() - start)
+
+            print(f'{name:>14}: {size:7.0f} MB, write = {write_time:5.1f} s, '
+                  f'read = {read_rate/1e6:5.1f} million packets/s')
+            results[name] = size, write_time, read_rate
+            os.remove(filename)
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_storage()
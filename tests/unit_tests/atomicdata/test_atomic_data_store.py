@@ -0,0 +1,122 @@
+import os
+import glob
+import pickle
+import numpy as np
+import astropy.units as u
+import pytest
+from astropy.table import QTable
+from nexoclom2 import path
+from nexoclom2.atomicdata import Atom
+from nexoclom2.atomicdata.atomic_data_store import (read_gvalues,
+                                                    read_photorates,
+                                                    read_eimp,
+                                                    read_charge_exchange)
+
+
+datapath = os.path.join(path, 'data')
+
+
+@pytest.mark.atomicdata
+def test_atomic_data_store():
+    """The compiled store has the same data as the source files.
+    
+    If this fails, run python -m nexoclom2.atomicdata.atomic_data_store
+    """
+    for datafile in glob.glob(os.path.join(datapath, 'gvalues', '*.ecsv')):
+        species = os.path.basename(datafile)[:-5]
+        source = QTable.read(datafile)
+        stored = read_gvalues(species)
+        assert stored.colnames == source.colnames
+        assert np.all(stored.meta['wavelengths'] == source.meta['wavelengths'])
+        for col in source.colnames:
+            assert np.array_equal(stored[col], source[col])
+    assert read_gvalues('Xx') is None
+    
+    photorates = QTable.read(os.path.join(datapath, 'photorates.ecsv'))
+    for species in set(photorates['species']):
+        sub = photorates[photorates['species'] == species]
+        stored = read_photorates(species)
+        assert [reaction for reaction, _ in stored] == list(sub['reaction'])
+        assert all(rate == row for (_, rate), row in zip(stored, sub['rate']))
+    
+    for ratefile in glob.glob(os.path.join(datapath, 'EImpRates', '*.pkl')):
+        with open(ratefile, 'rb') as file:
+            source = pickle.load(file)
+        symbol, charge = os.path.basename(ratefile)[:-4].split('_')
+        stored = read_eimp(symbol.title(), int(charge)-1)
+        assert stored.keys() == source.keys()
+        for key in source:
+            assert np.array_equal(stored[key], source[key])
+    
+    for chxfile in glob.glob(os.path.join(datapath, 'ChXRates', '*.pkl')):
+        with open(chxfile, 'rb') as file:
+            source = pickle.load(file)
+        stored = read_charge_exchange(os.path.basename(chxfile)[:-4])
+        assert stored.keys() == source.keys()
+        for ion in source:
+            for key, value in source[ion].items():
+                if isinstance(value, str) or (value is None):
+                    assert stored[ion][key] == value
+                else:
+                    assert np.array_equal(stored[ion][key], value)
+
+
+@pytest.mark.atomicdata
+def test_Atom_registry():
+    """Atoms of a species share their data tables"""
+    Atom.clear_registry()
+    na = Atom('Na')
+    other = Atom('Na')
+    assert other is not na
+    assert other.gvalues is na.gvalues
+    assert other.charge_exchange is na.charge_exchange
+    assert Atom('Fe').photo_rate.unit == 1/u.s
+    
+    # Changing the photoionization rate only changes one Atom
+    rate = na.photo_rate
+    na.photo_rate *= 2
+    assert na.photo_rate == 2*rate
+    assert other.photo_rate == rate
+    assert Atom('Na').photo_rate == rate
+    assert set(na.charge_exchange.keys()) == {'Na+'}
+    assert Atom('S+').photo_reactions is None
+
+
+@pytest.mark.atomicdata
+def test_rate_tables_loaded():
+    """Atoms use the electron impact and charge exchange tables in data/"""
+    Atom.clear_registry()
+    with open(os.path.join(datapath, 'EImpRates', 'S_1.pkl'), 'rb') as file:
+        source = pickle.load(file)
+    sulfur = Atom('S')
+    assert 7727*u.AA in sulfur.wavelengths
+    assert sulfur.eimp_emission.wavelengths == (7727*u.AA, )
+    assert np.array_equal(sulfur.eimp_emission.kappa, source['kappa_emiss'])
+    assert np.array_equal(sulfur.eimp_ionization.kappa, source['kappa_ion'])
+    T_e = source['T_e'][100]
+    assert sulfur.eimp_ionization.ratecoef(T_e) == source['kappa_ion'][100]
+    
+    with open(os.path.join(datapath, 'EImpRates', 'NA_1.pkl'), 'rb') as file:
+        source = pickle.load(file)
+    assert np.array_equal(Atom('Na').eimp_ionization.kappa,
+                          source['kappa_ion'])
+    
+    ions = {'Na': {'Na+'}, 'O': {'O+', 'S+', 'S++'}, 'S': {'O+', 'S+'}}
+    for neutral, names in ions.items():
+        with open(os.path.join(datapath, 'ChXRates', f'{neutral}.pkl'),
+                  'rb') as file:
+            source = pickle.load(file)
+        reactions = Atom(neutral).charge_exchange
+        assert set(reactions.keys()) == names
+        for ion in names:
+            params = source[ion]
+            v_rel = params['v_rel'][3]
+            if params['T_i'] is None:
+                expected = params['kappa'][3]
+                T_i = None
+            else:
+                expected = params['kappa'][3, 4]
+                T_i = params['T_i'][4]
+            assert u.isclose(reactions[ion].ratecoef(v_rel, T_i),
+                             expected.to(u.cm**3/u.s))
+    Atom.clear_registry()
@@ -15,6 +15,8 @@ Test cases:
 8: Included includes moon of different center, returns InputFileError
 9: Startpoint not included, returns InputFileError
 10: Invalid center, returns InputFileError
+11: Keplerian ephemeris
+12: Keplerian ephemeris for the Jovian system, returns InputFileError
 """
 import pytest
 from nexoclom2.solarsystem import SSObject
@@ -27,7 +29,8 @@ inputs = [{'center': 'Mercury', 'num': 0}]
 corrects = [{'__name__': 'Geometry',
              'center': 'Mercury',
              'startpoint': 'Mercury',
-             'included': ('Mercury', )}]
+             'included': ('Mercury', ),
+             'ephemeris': 'spice'}]
 results = [True]
 
 # Test case 1
@@ -45,7 +48,8 @@ inputs.append({'center': 'Jupiter',
 corrects.append({'__name__': 'Geometry',
                  'center': 'Jupiter',
                  'startpoint': 'Io',
-                 'included': ('Jupiter', 'Io')})
+                 'included': ('Jupiter', 'Io'),
+                 'ephemeris': 'spice'})
 results.append(True)
 
 # Test case 3
@@ -56,7 +60,8 @@ inputs.append({'center': 'Jupiter',
 corrects.append({'__name__': 'Geometry',
                  'center': 'Jupiter',
                  'startpoint': 'Io',
-                 'included': ('Jupiter', 'Io', 'Europa')})
+                 'included': ('Jupiter', 'Io', 'Europa'),
+                 'ephemeris': 'spice'})
 results.append(True)
 
 # Test case 4
@@ -116,7 +121,26 @@ inputs.append({'center': 'Fakecenter',
 corrects.append(InputfileError)
 results.append(None)
 
-# Test case 10
+# Test case 11
+inputs.append({'center': 'Saturn',
+               'startpoint': 'Enceladus',
+               'ephemeris': 'Kepler',
+               'num': 11})
+corrects.append({'__name__': 'Geometry',
+                 'center': 'Saturn',
+                 'startpoint': 'Enceladus',
+                 'included': ('Saturn', 'Enceladus'),
+                 'ephemeris': 'kepler'})
+results.append(True)
+
+# Test case 12
+inputs.append({'center': 'Jupiter',
+               'startpoint': 'Io',
+               'ephemeris': 'kepler',
+               'num': 12})
+corrects.append(InputfileError)
+results.append(None)
+
 
 @pytest.mark.initial_state
 @pytest.mark.parametrize('gparams, correct, result',
@@ -51,6 +51,42 @@ def test_Integrator_constant_stepsize(objname):
     import sys; sys.exit()
     
     
+
+
+@pytest.mark.particle_tracking
+@pytest.mark.parametrize('module', ['ConstantIntegrator', 'VariableIntegrator'])
+def test_Integrator_close(module, monkeypatch):
+    """The integrator's thread pool is shut down when a step fails"""
+    import importlib
+    from types import SimpleNamespace
+    integrators = importlib.import_module(
+        f'nexoclom2.particle_tracking.{module}')
+
+    closed = []
+    class FailingIntegrator:
+        def __init__(self, n_packets, n_threads):
+            pass
+        def step(self, state, output, step_size):
+            raise RuntimeError('step failed')
+        def close(self):
+            closed.append(True)
+    monkeypatch.setattr(integrators, 'rk5Integrator', FailingIntegrator)
+
+    class State:
+        time = -np.ones(3)
+        frac = np.ones(3)
+        def __len__(self):
+            return 3
+    options = SimpleNamespace(step_size=1*u.s, resolution=1e-3)
+    output = SimpleNamespace(inputs=SimpleNamespace(options=options),
+                             n_threads=2,
+                             save_final_state=lambda state: None)
+
+    with pytest.raises(RuntimeError):
+        getattr(integrators, module)(output, State())
+    assert closed == [True]
+
+
 if __name__ == '__main__':
     for objname in objects:
         test_Integrator_constant_stepsize(objname)
@@ -1,3 +1,6 @@
+import os
+import numpy as np
+import h5py
 import pytest
 from nexoclom2 import Input, Output, path, SSObject
 
@@ -20,6 +23,83 @@ def test_Output_iterations(basic_inputs):
     assert start.shape[0] == 200
     assert initial.shape[0] == 200
 
+
+@pytest.mark.particle_tracking
+def test_Output_parallel_iterations():
+    """Iterations run in a process pool are merged in iteration order"""
+    inputs = Input(os.path.join(os.path.dirname(path), 'tests', 'test_data',
+                                'inputfiles',
+                                'Mercury_Mercury_variable_time.input'))
+    output = Output(inputs, 400, n_iterations=4, overwrite=True, n_workers=2)
+    assert output.completed_packets == 400
+    assert output.completed_iterations == 4
+    assert not os.path.exists(output.savefile+'_temp')
+    
+    with h5py.File(output.savefile, 'r') as store:
+        iteration = store['starting_point/iteration'][:]
+        packet_number = store['starting_point/packet_number'][:]
+    assert np.all(np.diff(iteration) >= 0)
+    assert np.array_equal(packet_number, np.arange(400))
+    for it in range(4):
+        assert not os.path.exists(f'{output.savefile}_temp{it}')
+
+
+@pytest.mark.particle_tracking
+def test_Output_iterations_reproducible():
+    """The same packets are produced for any number of workers"""
+    inputs = Input(os.path.join(os.path.dirname(path), 'tests', 'test_data',
+                                'inputfiles',
+                                'Mercury_Mercury_variable_time.input'))
+    inputs.options.random_seed = 42
+    
+    starts = []
+    for n_workers in (1, 3):
+        output = Output(inputs, 300, n_iterations=3, overwrite=True,
+                        n_workers=n_workers)
+        with h5py.File(output.savefile, 'r') as store:
+            starts.append(np.column_stack([store[f'starting_point/{key}'][:]
+                                           for key in ('x', 'y', 'z', 'vx',
+                                                       'vy', 'vz')]))
+            assert int(store.attrs['random_entropy']) == 42
+    assert np.array_equal(starts[0], starts[1])
+    
+    # A resumed run continues the same sequence
+    output = Output(inputs, 200, n_iterations=2, overwrite=True)
+    output = Output(inputs, 300, n_iterations=1)
+    with h5py.File(output.savefile, 'r') as store:
+        resumed = np.column_stack([store[f'starting_point/{key}'][:]
+                                   for key in ('x', 'y', 'z', 'vx', 'vy', 'vz')])
+    assert np.array_equal(resumed, starts[0])
+
+
+@pytest.mark.particle_tracking
+def test_Output_refill():
+    """Refilling the integrator from later iterations gives the same result"""
+    inputs = Input(os.path.join(os.path.dirname(path), 'tests', 'test_data',
+                                'inputfiles',
+                                'Mercury_Mercury_variable_time.input'))
+    inputs.options.random_seed = 42
+    
+    finals = []
+    for refill in (0, 0.5):
+        output = Output(inputs, 300, n_iterations=3, overwrite=True,
+                        refill=refill)
+        assert output.completed_packets == 300
+        assert output.completed_iterations == 3
+        with h5py.File(output.savefile, 'r') as store:
+            iteration = store['final_state/iteration'][:]
+            packet_number = store['final_state/packet_number'][:]
+            assert np.all(np.diff(iteration) >= 0)
+            assert np.all(np.diff(packet_number) > 0)
+            finals.append(np.column_stack([store[f'final_state/{key}'][:]
+                                           for key in ('time', 'x', 'y', 'z',
+                                                       'vx', 'vy', 'vz',
+                                                       'frac')]))
+        for it in range(3):
+            assert not os.path.exists(f'{output.savefile}_temp{it}')
+    assert np.array_equal(finals[0], finals[1])
+
+
 if __name__ == '__main__':
     inputs = Input('/Users/mburger/Work/Research/NeutralCloudModel/nexoclom2/'
                    'tests/test_data/inputfiles/Mercury_Mercury_constant.input')
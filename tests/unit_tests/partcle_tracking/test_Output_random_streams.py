@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from nexoclom2.particle_tracking.Output import iteration_randgen
+
+
+@pytest.mark.particle_tracking
+@pytest.mark.parametrize('entropy', [0, 12345, 2**100 + 7])
+def test_iteration_randgen(entropy):
+    """Each iteration has a reproducible stream independent of the others"""
+    first = iteration_randgen(entropy, 3).random(100)
+    
+    # Same entropy and iteration -> same stream, regardless of what else
+    # has been drawn
+    iteration_randgen(entropy, 2).random(1000)
+    assert np.array_equal(iteration_randgen(entropy, 3).random(100), first)
+    
+    # Different iterations and different entropy -> different streams
+    assert not np.array_equal(iteration_randgen(entropy, 4).random(100), first)
+    assert not np.array_equal(iteration_randgen(entropy+1, 3).random(100),
+                              first)
@@ -0,0 +1,79 @@
+import numpy as np
+import h5py
+import pytest
+from nexoclom2.particle_tracking.columns import ColumnView
+
+
+@pytest.fixture
+def outputfile(tmp_path):
+    filename = str(tmp_path/'output.h5')
+    with h5py.File(filename, 'w') as store:
+        # Contiguous
+        store.create_dataset('final_state/time', data=-np.arange(1000.))
+        # Chunked
+        store.create_dataset('final_state/x', data=np.arange(1000.)*2,
+                             chunks=(64, ), maxshape=(None, ))
+        store.create_dataset('final_state/hit/Mercury', data=np.arange(1000),
+                             chunks=(64, ), compression='gzip')
+        store['final_state'].attrs['unit'] = 'R_Mercury'
+
+    return filename
+
+
+@pytest.mark.particle_tracking
+def test_column_view_selection(outputfile):
+    """Consecutive rows are selected with slices"""
+    assert ColumnView(outputfile, 'final_state').selection == slice(0, 1000)
+    mask = np.zeros(1000, dtype=bool)
+    mask[100:200] = True
+    view = ColumnView(outputfile, 'final_state', mask)
+    assert view.selection == slice(100, 200)
+    assert len(view) == 100
+    assert view.attrs['unit'] == 'R_Mercury'
+
+    view = ColumnView(outputfile, 'final_state', [5, 3, -1])
+    assert np.all(view.selection == [5, 3, 999])
+    assert np.all(view.read('x') == [10, 6, 1998])
+
+    sub = view[1:]
+    assert np.all(sub.read('time') == [-3, -999])
+    assert len(ColumnView(outputfile, 'final_state', np.zeros(1000, bool))) == 0
+
+
+@pytest.mark.particle_tracking
+def test_column_view_subsets(outputfile):
+    """Subsets of slices are slices. Other subsets select the same rows as
+    indexing the column."""
+    view = ColumnView(outputfile, 'final_state', slice(100, 900, 2))
+    column = np.arange(1000)[100:900:2]
+    assert view[10:-10:3].selection == slice(120, 880, 6)
+    assert np.all(view[10:-10:3].read('x') == 2*column[10:-10:3])
+    assert np.all(view[::-1].read('x') == 2*column[::-1])
+    assert np.all(view[::-1][5:50:7].read('x') == 2*column[::-1][5:50:7])
+    assert np.all(view[[3, -1, 0]].read('x') == 2*column[[3, -1, 0]])
+    mask = column % 3 == 0
+    assert np.all(view[mask].read('hit/Mercury') == column[mask])
+    assert len(view[500:]) == 0
+
+
+@pytest.mark.particle_tracking
+def test_column_view_read(outputfile):
+    """Columns are memory mapped or read a block at a time"""
+    view = ColumnView(outputfile, 'final_state', slice(10, 20))
+    time = view.read('time')
+    assert isinstance(time, np.memmap)
+    assert np.all(time == -np.arange(10., 20.))
+    assert not isinstance(view.read('x'), np.memmap)
+
+    # Changes to mapped columns are not written to the file
+    time -= 1
+    assert np.all(time == -np.arange(11., 21.))
+    assert np.all(view.read('time') == -np.arange(10., 20.))
+
+    rng = np.random.default_rng(0)
+    rows = rng.choice(1000, 50, replace=False)
+    view = ColumnView(outputfile, 'final_state', rows)
+    view.block = 16
+    assert np.all(view.read('time') == -rows)
+    assert np.all(view.read('x') == 2*rows)
+    assert np.all(view.read('hit/Mercury') == rows)
@@ -20,6 +20,9 @@ import numpy as np
 import pytest
 import astropy.units as u
 from nexoclom2 import Input, Output, path
+from nexoclom2.particle_tracking.starting_point import StartingPoint
+from nexoclom2.particle_tracking.state_vectors import StateVector
+from nexoclom2.particle_tracking.rk5_integrator import rk5Integrator
 import matplotlib.pyplot as plt
 from astropy.visualization import quantity_support
 quantity_support()
@@ -100,9 +103,75 @@ def test_energy_conserve(center):
     print(frameinfo.filename, frameinfo.lineno)
     from IPython import embed; embed()
     import sys; sys.exit()
+
+
+
+fsal_inputs = {'Sun': 'Mercury_Sun_variable_time.input',
+               'Jupiter': 'Io_Jupiter.input'}
+
+
+@pytest.mark.particle_tracking
+@pytest.mark.parametrize('center', centers)
+def test_fsal_reuse(center):
+    """Stage 0 derivatives are reused when a step is retried"""
+    inputs = Input(os.path.join(os.path.dirname(path), 'tests', 'test_data',
+                                'inputfiles', fsal_inputs[center]))
+    inputs.forces.radpres = False
+    inputs.forces.gravity = True
+    output = Output(inputs, 0)
+    
+    state = StateVector(output, StartingPoint(output, npackets))
+    h = np.zeros(npackets) + 100.
+    integrator = rk5Integrator(npackets)
     
+    result, _ = integrator.step(state, output, h)
+    X, V = result.X.copy(), result.V.copy()
+    assert integrator.n_evaluations == 6*npackets
+    assert np.all(np.isnan(result.ioniz))
+    assert np.all(np.isfinite(state.ioniz))
+    
+    # Retrying the same step reuses the stage 0 derivatives
+    result, _ = integrator.step(state, output, h)
+    assert integrator.n_evaluations == 11*npackets
+    assert np.array_equal(result.X, X)
+    assert np.array_equal(result.V, V)
+    
+    # Reused derivatives give the same answer as recomputed derivatives
+    state.ioniz[:] = np.nan
+    result, _ = integrator.step(state, output, h)
+    assert integrator.n_evaluations == 17*npackets
+    assert np.array_equal(result.X, X)
+    assert np.array_equal(result.V, V)
+
+
+
+@pytest.mark.particle_tracking
+@pytest.mark.parametrize('center', centers)
+def test_threaded_step(center):
+    """Splitting a stage across threads does not change the result"""
+    inputs = Input(os.path.join(os.path.dirname(path), 'tests', 'test_data',
+                                'inputfiles', fsal_inputs[center]))
+    output = Output(inputs, 0)
+    state = StateVector(output, StartingPoint(output, npackets))
+    h = np.zeros(npackets) + 100.
+    
+    results = []
+    for n_threads in (1, 4):
+        integrator = rk5Integrator(npackets, n_threads)
+        integrator.min_chunk = 100
+        state.ioniz[:] = np.nan
+        result, delta = integrator.step(state, output, h)
+        results.append((result.X.copy(), result.V.copy(), result.frac.copy(),
+                        delta.max()))
+        assert integrator.n_evaluations == 6*npackets
+        integrator.close()
+        
+    for serial, threaded in zip(*results):
+        assert np.array_equal(serial, threaded)
     
     
 if __name__ == '__main__':
     for center in centers:
         test_energy_conserve(center)
+        test_fsal_reuse(center)
+        test_threaded_step(center)
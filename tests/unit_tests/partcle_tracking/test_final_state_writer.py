@@ -0,0 +1,75 @@
+import numpy as np
+import h5py
+import pytest
+from nexoclom2.particle_tracking.final_state_writer import FinalStateWriter
+
+
+class Packets:
+    """The parts of a StateVector that are saved"""
+    def __init__(self, n, start):
+        number = np.arange(start, start + n)
+        self.time = -number.astype(float)
+        self.X = np.column_stack([number, 2*number, 3*number]).astype(float)
+        self.V = -self.X
+        self.frac = np.ones(n)
+        self.escaped = np.zeros(n)
+        self.hit = {'Mercury': number % 2}
+        self.ionized = np.zeros(n)
+        self.packet_number = number
+        self.iteration = np.zeros(n)
+        self.accel = np.zeros((n, 3))
+        self.ioniz = np.zeros(n)
+
+    def __len__(self):
+        return len(self.time)
+
+
+def make_tempfile(filename):
+    with h5py.File(filename, 'w') as store:
+        for key in ['time', 'x', 'y', 'z', 'vx', 'vy', 'vz', 'frac',
+                    'escaped', 'ionized', 'packet_number', 'iteration']:
+            store.create_dataset(f'final_state/{key}', shape=(0, ),
+                                 maxshape=(None, ))
+        store.create_dataset('final_state/hit/Mercury', shape=(0, ),
+                             maxshape=(None, ))
+
+
+@pytest.mark.particle_tracking
+@pytest.mark.parametrize('buffer_size', [1, 7, 1000])
+def test_final_state_writer(tmp_path, buffer_size):
+    """Packets are written in the order saved whatever the buffer size"""
+    filename = tmp_path/'output_temp'
+    make_tempfile(filename)
+
+    sizes = [5, 0, 12, 1, 30]
+    with FinalStateWriter(filename, buffer_size) as writer:
+        start = 0
+        for size in sizes:
+            packets = Packets(size, start)
+            writer.write(packets)
+            # Later changes to the state are not saved
+            packets.X[:] = np.nan
+            start += size
+
+    n = sum(sizes)
+    with h5py.File(filename, 'r') as store:
+        assert np.all(store['final_state/packet_number'][:] == np.arange(n))
+        assert np.all(store['final_state/y'][:] == 2*np.arange(n))
+        assert np.all(store['final_state/vz'][:] == -3*np.arange(n))
+        assert np.all(store['final_state/hit/Mercury'][:] == np.arange(n) % 2)
+        assert 'accel' not in store['final_state']
+
+
+@pytest.mark.particle_tracking
+def test_final_state_writer_error(tmp_path):
+    """Errors in the background thread are raised in the caller"""
+    filename = tmp_path/'output_temp'
+    make_tempfile(filename)
+
+    packets = Packets(3, 0)
+    packets.hit['Jupiter'] = np.zeros(3)
+    writer = FinalStateWriter(filename, 1)
+    writer.write(packets)
+    with pytest.raises(KeyError):
+        writer.close()
+    assert not writer._thread.is_alive()
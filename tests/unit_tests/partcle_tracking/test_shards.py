@@ -0,0 +1,116 @@
+import os
+import shutil
+import numpy as np
+import h5py
+import astropy.units as u
+from astropy.time import Time
+import pytest
+from types import SimpleNamespace
+from nexoclom2.particle_tracking import shards
+from nexoclom2.particle_tracking.starting_point_saved import StartingPointSaved
+from nexoclom2.particle_tracking.storage_layout import StorageLayout
+
+
+def make_iteration(filename, iteration, n_packets, n_final):
+    """File with the starting_point and final_state of an iteration"""
+    layout = StorageLayout(chunk_size=16)
+    first = iteration*n_packets
+    with h5py.File(filename, 'w') as store:
+        layout.create(store, 'starting_point/time', np.zeros(n_packets))
+        layout.create(store, 'starting_point/packet_number',
+                      np.arange(first, first + n_packets))
+        layout.create(store, 'starting_point/iteration',
+                      np.zeros(n_packets) + iteration)
+        store['starting_point'].attrs['frame'] = 'MERCURYSOLAR'
+        store.attrs['random_entropy'] = '1234'
+        layout.create(store, 'final_state/time', np.zeros(n_final) - first)
+        layout.create(store, 'final_state/hit/Mercury',
+                      np.zeros(n_final) + iteration)
+
+
+@pytest.mark.particle_tracking
+def test_add_shard(tmp_path):
+    """Iterations are joined by virtual datasets without copying"""
+    savefile = str(tmp_path/'1.h5')
+    tempfile = str(tmp_path/'1.h5_temp')
+
+    # Output saved before shards
+    make_iteration(savefile, 0, 10, 20)
+    for iteration, n_final in ((1, 5), (2, 0), (3, 7)):
+        make_iteration(tempfile, iteration, 10, n_final)
+        shards.add_shard(savefile, tempfile, iteration)
+        assert not os.path.exists(tempfile)
+
+    directory = shards.shard_directory(savefile)
+    assert sorted(os.listdir(directory)) == [
+        'iteration000001.h5', 'iteration000002.h5', 'iteration000003.h5',
+        'legacy.h5']
+
+    # Shards are found relative to the savefile
+    shutil.move(tmp_path, tmp_path.parent/'moved')
+    savefile = str(tmp_path.parent/'moved'/'1.h5')
+    assert shards.is_sharded(savefile)
+    with h5py.File(savefile, 'r') as store:
+        assert np.all(store['starting_point/packet_number'][:] ==
+                      np.arange(40))
+        assert store['starting_point/iteration'][-1] == 3
+        assert store['final_state/time'].shape == (32, )
+        hit = store['final_state/hit/Mercury'][:]
+        assert np.all(hit == [0]*20 + [1]*5 + [3]*7)
+        assert store['starting_point'].attrs['frame'] == 'MERCURYSOLAR'
+        assert store.attrs['random_entropy'] == '1234'
+
+    shards.remove(savefile)
+    assert not os.path.exists(savefile)
+    assert not os.path.exists(shards.shard_directory(savefile))
+    shutil.rmtree(tmp_path.parent/'moved')
+
+
+@pytest.mark.particle_tracking
+def test_iso_ut(tmp_path):
+    """Shards with start times saved as ISO strings are not changed when
+    joined with shards that have seconds. The strings are converted when the
+    start times are read."""
+    savefile = str(tmp_path/'1.h5')
+    tempfile = str(tmp_path/'1.h5_temp')
+    epoch = Time('2024-06-01T00:00:00.123456789', precision=9)
+    seconds = -np.linspace(0, 1000, 10)
+
+    make_iteration(savefile, 0, 10, 0)
+    with h5py.File(savefile, 'a') as store:
+        store.create_dataset('starting_point/ut', maxshape=(None, ),
+                             data=list((epoch + seconds*u.s).iso),
+                             dtype=h5py.string_dtype())
+
+    for iteration in (1, 2):
+        make_iteration(tempfile, iteration, 10, 0)
+        with h5py.File(tempfile, 'a') as store:
+            StorageLayout().create(store, 'starting_point/ut',
+                                   seconds + iteration)
+            store['starting_point'].attrs['ut_epoch'] = epoch.isot
+            store['starting_point'].attrs['ut_scale'] = epoch.scale
+        shards.add_shard(savefile, tempfile, iteration)
+
+    legacy = os.path.join(shards.shard_directory(savefile), shards.LEGACY_SHARD)
+    with h5py.File(legacy, 'r') as store:
+        assert store['starting_point/ut'].dtype.kind == 'O'
+        assert 'ut_epoch' not in store['starting_point'].attrs
+
+    with h5py.File(savefile, 'r') as store:
+        ut = store['starting_point/ut'][:]
+        iso = store['starting_point/ut_iso'][:]
+        assert store['starting_point'].attrs['ut_epoch'] == epoch.isot
+    assert np.all(np.isnan(ut[:10]))
+    assert np.all(ut[10:] == np.concatenate([seconds + 1, seconds + 2]))
+    assert np.all(iso[:10] == [x.encode() for x in (epoch + seconds*u.s).iso])
+
+    output = SimpleNamespace(savefile=savefile, layout=None,
+                             objects={'Mercury': SimpleNamespace(unit=u.km)},
+                             startpoint='Mercury')
+    start = StartingPointSaved(output)
+    # ISO strings are rounded to ms
+    assert np.allclose((start.ut - epoch).to_value(u.s),
+                       np.concatenate([seconds, seconds + 1, seconds + 2]),
+                       atol=1e-3)
+    assert np.allclose((StartingPointSaved(output, iteration=2).ut -
+                        epoch).to_value(u.s), seconds + 2, atol=1e-6)
@@ -0,0 +1,45 @@
+import numpy as np
+import h5py
+import pytest
+from nexoclom2.particle_tracking.storage_layout import StorageLayout
+
+
+@pytest.mark.particle_tracking
+def test_storage_layout(tmp_path):
+    """Datasets are chunked, compressed, and typed by column"""
+    layout = StorageLayout(chunk_size=100, compression='gzip', float32=True)
+    filename = tmp_path/'output.h5'
+    with h5py.File(filename, 'w') as store:
+        time = layout.create(store, 'final_state/time', np.arange(250.))
+        vx = layout.create(store, 'final_state/vx')
+        number = layout.create(store, 'final_state/packet_number',
+                               np.arange(250))
+        hit = layout.create(store, 'final_state/hit/Mercury')
+        ut = layout.create(store, 'starting_point/ut', ['2024-01-01'],
+                           dtype=h5py.string_dtype())
+
+        assert time.dtype == np.float64
+        assert vx.dtype == np.float32
+        assert hit.dtype == np.float32
+        assert number.dtype == np.int64
+        assert store['final_state/packet_number'][-1] == 249
+        assert time.chunks == (100, )
+        assert time.compression == 'gzip'
+        assert time.shuffle
+        assert ut[0].decode() == '2024-01-01'
+
+        vx.resize((300, ))
+        vx[:] = 1.5
+
+    with layout.open(filename) as store:
+        assert np.all(store['final_state/vx'][:] == 1.5)
+        assert np.all(store['final_state/time'][:] == np.arange(250.))
+
+    layout = StorageLayout(compression='none', float32=False)
+    assert layout.dtype('vx') == np.float64
+    assert layout.dtype('iteration') == np.int32
+    with h5py.File(filename, 'w') as store:
+        assert layout.create(store, 'final_state/x').compression is None
+
+    with pytest.raises(ValueError):
+        StorageLayout(compression='zstd')
@@ -21,8 +21,10 @@ results = [({'object': 'Mercury',
              'naifid': 199,
              '_solar_frame': 'MERCURYSOLAR',
              '_surf_frame': 'IAU_MERCURY',
-             '_method': 'INTERCEPT/ELLIPSOID'}, 1, True),
-           ({'object':'Hst', 'type':'Unknown', 'naifid':-48}, 0, False),
+             '_method': 'INTERCEPT/ELLIPSOID',
+             'ephemeris': 'spice'}, 1, True),
+           ({'object':'Hst', 'type':'Unknown', 'naifid':-48,
+             'ephemeris': 'spice'}, 0, False),
            ({'object': 'Jupiter',
              'orbits': 'Sun',
              'radius': 71492*u.km,
@@ -43,7 +45,8 @@ results = [({'object': 'Mercury',
              'delta_offset': 0.12*71492*u.km,
              '_solar_frame': 'JUPITERSOLAR',
              '_surf_frame': 'IAU_JUPITER',
-             '_method': 'INTERCEPT/ELLIPSOID'}, 5, False),
+             '_method': 'INTERCEPT/ELLIPSOID',
+             'ephemeris': 'spice'}, 5, False),
            ({'object': 'Enceladus',
              'orbits': 'Saturn',
              'radius': 256.6*u.km,
@@ -60,8 +63,9 @@ results = [({'object': 'Mercury',
              'naifid': 602,
              '_solar_frame': 'ENCELADUSSOLAR',
              '_surf_frame': 'IAU_ENCELADUS',
-             '_method': 'INTERCEPT/ELLIPSOID'}, 1, False),
-           ({'object': 'Fake', 'type': 'Unknown'}, 0, False)]
+             '_method': 'INTERCEPT/ELLIPSOID',
+             'ephemeris': 'spice'}, 1, False),
+           ({'object': 'Fake', 'type': 'Unknown', 'ephemeris': 'spice'}, 0, False)]
 
 @pytest.mark.solarsystem
 @pytest.mark.parametrize('obj, result_', zip(objects, results))
@@ -0,0 +1,50 @@
+import json
+import importlib
+import astropy.units as u
+import pytest
+from nexoclom2.solarsystem import SSObject
+from nexoclom2.solarsystem.SSObject import _constants_key
+
+
+@pytest.fixture
+def constants_file(tmp_path, monkeypatch):
+    """Save the constants in a temporary file instead of the savepath"""
+    filename = str(tmp_path / 'ssobject_constants.json')
+    module = importlib.import_module('nexoclom2.solarsystem.SSObject')
+    monkeypatch.setattr(module, '_constants_file', lambda: filename)
+    SSObject.clear_registry()
+    yield filename
+    SSObject.clear_registry()
+
+
+@pytest.mark.solarsystem
+def test_SSObject_registry(constants_file):
+    """Objects are computed once per process and copies are independent"""
+    # Constants saved by an earlier run, so SPICE is not needed
+    constants = {'Mercury': {'radius': 2440.53, 'GM': 22032.0645,
+                             'GM_center': 1.3271244e11,
+                             'e': 0.20563016180610344,
+                             'a': (0.387098*u.au).to_value(u.km),
+                             'orbperiod': (87.9687*u.d).to_value(u.s)}}
+    with open(constants_file, 'w') as file:
+        json.dump({'key': _constants_key(), 'objects': constants}, file)
+    
+    mercury = SSObject('Mercury')
+    assert mercury.type == 'Planet'
+    assert mercury.radius == 2440.53*u.km
+    assert u.isclose(mercury.a, 0.387098*u.au)
+    assert u.isclose(mercury.orbperiod, 87.9687*u.d)
+    assert mercury.naifid == 199
+    
+    # Changing one object does not change others
+    mercury.GM = mercury.GM.to(mercury.unit**3/u.s**2)
+    mercury.radius = mercury.radius.to(mercury.unit)
+    other = SSObject('mercury')
+    assert other is not mercury
+    assert other.GM.unit == u.km**3/u.s**2
+    assert other.radius == 2440.53*u.km
+    assert other.unit is mercury.unit
+    
+    hst = SSObject('HST')
+    assert hst.type == 'Unknown'
+    assert hst.naifid == -48
@@ -0,0 +1,85 @@
+import numpy as np
+import astropy.units as u
+from astropy.time import Time, TimeDelta
+import spiceypy as spice
+import pytest
+from nexoclom2.solarsystem import SSObject, SSPosition
+from nexoclom2.solarsystem.load_kernels import SpiceKernels
+from nexoclom2.initial_state.geometry.GeometryTime import GeometryTime
+
+
+# Made up rotation models with the same form as those in pck00011.tpc:
+# Jupiter and Io with nutation and precession terms, Enceladus with
+# quadratic phase angles, and Venus, which rotates retrograde.
+PCK = '''KPL/PCK
+\\begindata
+BODY599_POLE_RA = ( 268.056595 -0.006499 0. )
+BODY599_POLE_DEC = ( 64.495303 0.002413 0. )
+BODY599_PM = ( 284.95 870.5360000 0. )
+BODY599_NUT_PREC_RA = ( 0.000117 0.000938 0.001432 )
+BODY599_NUT_PREC_DEC = ( 0.000050 0.000404 0.000617 )
+BODY5_NUT_PREC_ANGLES = ( 99.360714 4850.4046 175.895369 1191.9605
+                          300.323162 262.5475 )
+BODY501_POLE_RA = ( 268.05 -0.009 0. )
+BODY501_POLE_DEC = ( 64.50 0.003 0. )
+BODY501_PM = ( 200.39 203.4889538 0. )
+BODY501_NUT_PREC_RA = ( 0. 0.094 0.024 )
+BODY501_NUT_PREC_DEC = ( 0. 0.040 0.011 )
+BODY501_NUT_PREC_PM = ( 0. -0.085 -0.022 )
+BODY602_POLE_RA = ( 40.66 -0.036 0. )
+BODY602_POLE_DEC = ( 83.52 -0.004 0. )
+BODY602_PM = ( 6.32 262.7318996 0. )
+BODY602_NUT_PREC_RA = ( 0. 13.56 )
+BODY602_NUT_PREC_DEC = ( 0. -1.53 )
+BODY602_NUT_PREC_PM = ( 0. -13.48 )
+BODY6_MAX_PHASE_DEGREE = 2
+BODY6_NUT_PREC_ANGLES = ( 353.32 75706.7 0. 28.72 75706.7 1.5 )
+BODY299_POLE_RA = ( 272.76 0. 0. )
+BODY299_POLE_DEC = ( 67.16 0. 0. )
+BODY299_PM = ( 160.20 -1.4813688 0. )
+\\begintext
+'''
+
+
+@pytest.mark.solarsystem
+def test_body_fixed_matrices(tmp_path):
+    """Batched rotation matrices agree with spice.pxform"""
+    pck = tmp_path/'test.tpc'
+    pck.write_text(PCK)
+    spice.furnsh(str(pck))
+    try:
+        times_et = np.linspace(-3e9, 3e9, 25)
+        for naifid, frame in ((599, 'IAU_JUPITER'), (501, 'IAU_IO'),
+                              (602, 'IAU_ENCELADUS'), (299, 'IAU_VENUS')):
+            matrices = SSPosition.body_fixed_matrices(naifid, frame, times_et)
+            expected = np.array([spice.pxform('J2000', frame, et)
+                                 for et in times_et])
+            assert matrices.shape == (len(times_et), 3, 3)
+            assert np.allclose(matrices, expected, atol=1e-12)
+    finally:
+        spice.unload(str(pck))
+
+
+@pytest.mark.solarsystem
+@pytest.mark.parametrize('objname', ['Jupiter', 'Venus', 'Io'])
+def test_subsolar_point(objname):
+    """Subsolar longitude and latitude agree with spice.subslr and
+    spice.recpgr, including for Venus, which rotates retrograde"""
+    obj = SSObject(objname)
+    geometry = GeometryTime({'center': objname, 'startpoint': objname,
+                             'modeltime': '2024-12-01T00:00:00'})
+    position = SSPosition(obj, geometry, 10*u.d)
+
+    kernels = SpiceKernels(objname)
+    for i in np.linspace(0, len(position._times)-1, 7).astype(int):
+        time = position.endtime + TimeDelta(position._times[i]*u.s)
+        et = spice.str2et(time.iso)
+        point, _, _ = spice.subslr('INTERCEPT/ELLIPSOID', obj.object, et,
+                                   f'IAU_{obj.object.upper()}', 'None',
+                                   obj.object)
+        lon, lat, _ = spice.recpgr(obj.object, point, obj.radius.value, 0.)
+
+        dlon = np.mod(position._ss_lon[i] - lon + np.pi, 2*np.pi) - np.pi
+        assert np.isclose(dlon, 0, atol=1e-6)
+        assert np.isclose(position._ss_lat[i], lat, atol=1e-6)
+    kernels.unload()
@@ -0,0 +1,30 @@
+import numpy as np
+import spiceypy as spice
+import pytest
+from nexoclom2.solarsystem import SSPosition
+
+
+@pytest.mark.solarsystem
+def test_true_anomaly():
+    """Vectorized true anomaly agrees with spice.oscltx"""
+    mu = 1.32712440041e11
+    rng = np.random.default_rng(0)
+    state = np.zeros((500, 6))
+    state[:,:3] = rng.normal(size=(500, 3))*rng.uniform(3e7, 8e8, (500, 1))
+    r = np.linalg.norm(state[:,:3], axis=1)[:,np.newaxis]
+    vcirc = np.sqrt(mu/r)
+    state[:,3:] = rng.normal(size=(500, 3))*vcirc*0.7
+    bound = (np.sum(state[:,3:]**2, axis=1)/2 - mu/r[:,0]) < 0
+    state = state[bound]
+    
+    taa = SSPosition.true_anomaly(state, mu)
+    expected = np.array([spice.oscltx(st, 0., mu)[8] for st in state])
+    diff = np.mod(taa - expected + np.pi, 2*np.pi) - np.pi
+    assert np.all((taa >= 0) & (taa < 2*np.pi))
+    assert np.allclose(diff, 0, atol=1e-9)
+
+
+@pytest.mark.solarsystem
+def test_continuous():
+    angle = np.mod(np.linspace(0, 6*np.pi, 100), 2*np.pi)
+    assert np.allclose(SSPosition.continuous(angle), np.linspace(0, 6*np.pi, 100))
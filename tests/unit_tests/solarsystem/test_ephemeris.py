@@ -0,0 +1,83 @@
+import numpy as np
+import astropy.units as u
+from astropy.time import Time
+import pytest
+from nexoclom2.solarsystem import SSObject, SSPosition, Ephemeris
+from nexoclom2.solarsystem.ephemeris import (hermite_coefficients,
+                                             evaluate_polynomials)
+from load_object_geometry import load_object_geometries
+
+
+objnames = 'Mercury', 'Io'
+
+
+@pytest.mark.solarsystem
+@pytest.mark.parametrize('objname', objnames)
+def test_ephemeris(objname):
+    """The stacked table gives the same values as the SSPosition tables"""
+    obj = SSObject(objname)
+    center = obj if obj.type == 'Planet' else SSObject(obj.orbits)
+    runtime = obj.orbperiod.to(u.s)
+    geometry, _, objpos = load_object_geometries(objname, center.object,
+                                                 Time('2024-12-01'), runtime,
+                                                 'time')
+    positions = {objname: objpos}
+    if center.object != objname:
+        positions[center.object] = SSPosition(center, geometry, runtime)
+    else:
+        pass
+    ephemeris = Ephemeris(positions)
+    
+    # Include times outside the table
+    rng = np.random.default_rng(0)
+    times = -rng.uniform(-0.1, 1.1, 1000)*runtime.value
+    values = ephemeris(times)
+    for name, pos in positions.items():
+        assert np.allclose(values.X(name), pos.X_value(times),
+                           rtol=1e-12, atol=1e-12)
+        assert np.allclose(values.V(name), pos.V_value(times),
+                           rtol=1e-12, atol=1e-15)
+        assert np.allclose(values.sun_dir(name), pos.sun_dir_value(times),
+                           rtol=1e-12, atol=1e-12)
+        assert np.allclose(values.r_sun(name), pos.r_sun_value(times),
+                           rtol=1e-12, atol=0)
+        assert np.allclose(values.drdt_sun(name), pos.drdt_sun_value(times),
+                           rtol=1e-12, atol=1e-15)
+        
+        X = values.X(name) + rng.normal(0, 2, (1000, 3))
+        radius = obj.radius.to_value(pos.unit) if name == objname else 1.
+        # Rounding can only matter for packets on the edge of the shadow
+        same = (values.out_of_shadow(name, radius, X) ==
+                pos.out_of_shadow_value(radius, X, times))
+        assert same.mean() > 0.999
+
+
+@pytest.mark.solarsystem
+def test_hermite_interpolation():
+    """Hermite interpolation of a circular orbit meets the error estimate
+    used by SSPosition.n_samples"""
+    radius, period = 421700., 1.769*86400
+    angvel = 2*np.pi/period
+    runtime = 10*period
+    orbit = lambda t: (radius*np.column_stack([np.cos(angvel*t),
+                                               np.sin(angvel*t)]),
+                       radius*angvel*np.column_stack([-np.sin(angvel*t),
+                                                      np.cos(angvel*t)]))
+    
+    tolerance = 0.1
+    step = (384*tolerance/radius)**0.25/angvel
+    ntimes = int(np.ceil(runtime/step)) + 1
+    times = np.linspace(-runtime, 0, ntimes)
+    X, V = orbit(times)
+    coefs, deriv = hermite_coefficients(X, V, times[1]-times[0])
+    
+    # Reproduces the samples
+    assert np.allclose(evaluate_polynomials(coefs, times[0], times[1]-times[0],
+                                            times), X, rtol=0, atol=1e-6)
+    
+    t = -np.random.default_rng(0).uniform(0, runtime, 10000)
+    X_true, V_true = orbit(t)
+    X_interp = evaluate_polynomials(coefs, times[0], times[1]-times[0], t)
+    V_interp = evaluate_polynomials(deriv, times[0], times[1]-times[0], t)
+    assert np.abs(X_interp - X_true).max() < tolerance
+    assert np.abs(V_interp - V_true).max() < 1e-3*radius*angvel
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import pytest
+from nexoclom2.solarsystem.ephemeris_cache import EphemerisCache
+
+
+@pytest.mark.solarsystem
+def test_ephemeris_cache(tmp_path):
+    """Tables are returned unchanged and old entries are evicted"""
+    cache = EphemerisCache(path=tmp_path)
+
+    key = cache.key(object='Mercury', center='Mercury', ntimes=10)
+    assert key == cache.key(ntimes=10, center='Mercury', object='Mercury')
+    assert key != cache.key(object='Mercury', center='Mercury', ntimes=11)
+    assert cache.get(key) is None
+
+    rng = np.random.default_rng(0)
+    tables = {'X': rng.random((10, 3)), 'r_sun': rng.random(10)}
+    cache.put(key, tables)
+    cached = cache.get(key)
+    assert set(cached.keys()) == set(tables.keys())
+    for name, table in tables.items():
+        assert np.array_equal(cached[name], table)
+
+    # Damaged entries are treated as missing
+    with open(cache.filename(key), 'w') as file:
+        file.write('not hdf5')
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.filename(key))
+
+    # Only the most recently used entries are kept
+    size = 8e-6*1e5
+    small = EphemerisCache(max_size=2.5*size, path=tmp_path)
+    keys = [small.key(ntimes=n) for n in range(4)]
+    for i, key in enumerate(keys):
+        small.put(key, {'X': np.full(100000, float(i))})
+        os.utime(small.filename(key), (i, i))
+    assert [os.path.exists(small.filename(key)) for key in keys] == [
+        False, False, True, True]
+
+    # A cache size of 0 disables the cache
+    off = EphemerisCache(max_size=0, path=tmp_path)
+    off.put(keys[3], {'X': np.zeros(10)})
+    assert off.get(keys[3]) is None
@@ -1,13 +1,10 @@
-import os
 import numpy as np
 import astropy.units as u
-from astropy.time import Time
-import pickle
 from nexoclom2.solarsystem.find_modeltime import find_modeltime
+from nexoclom2.solarsystem.modeltime_tables import read_table, REFERENCE_EPOCH
 from nexoclom2.initial_state import GeometryTime, GeometryNoTime
 from nexoclom2.math.mod_close import mod_close
 from nexoclom2.solarsystem import SSObject, SSPosition
-from nexoclom2 import path
 import matplotlib.pyplot as plt
 import pytest
 import warnings
@@ -74,11 +71,16 @@ def test_find_io_model_time(phi, cml):
 
 @pytest.mark.solarsystem
 def test_io_modeltime():
-    datafile = os.path.join(path, 'data', 'jupiter_io_times.pkl')
-    with open(datafile, 'rb') as file:
-        phi, cml, timegrid = pickle.load(file)
+    table = read_table('phase', 'Io')
+    if table is None:
+        pytest.skip('No phi, CML grid for Io. Run python -m '
+                    'nexoclom2.solarsystem.kernel_store prefetch --tables')
+    else:
+        pass
+    phi, cml, timegrid = table
+    phi, cml = phi*u.deg, cml*u.deg
     
-    q = np.where(timegrid != 0)
+    q = np.where(~np.isnan(timegrid))
     
     nums = np.random.randint(0, len(q[0]), 10)
     for i in nums:
@@ -86,7 +88,8 @@ def test_io_modeltime():
         p, c = phi[q[0][i]], cml[q[1][i]]
         params = {'startpoint': 'Io',
                   'center': 'Jupiter',
-                  'modeltime': timegrid[q[0][i], q[1][i]].iso}
+                  'modeltime': (REFERENCE_EPOCH +
+                                timegrid[q[0][i], q[1][i]]*u.s).iso}
         geometry = GeometryTime(params)
         io = SSObject('Io')
         jupiter = SSObject('jupiter')
@@ -0,0 +1,137 @@
+import copy
+import time
+import threading
+import numpy as np
+import astropy.units as u
+from astropy.time import Time, TimeDelta
+import spiceypy as spice
+import pytest
+from scipy.spatial.transform import Rotation
+from nexoclom2.solarsystem import SSObject
+from nexoclom2.solarsystem import frames
+from nexoclom2.solarsystem.frames import Frame
+from nexoclom2.solarsystem.load_kernels import SpiceKernels
+from nexoclom2.solarsystem.ephemeris_cache import EphemerisCache
+
+
+objnames = 'Mercury', 'Io'
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    """Use an empty ephemeris cache that is removed after the test"""
+    def cache():
+        return EphemerisCache(path=tmp_path)
+    monkeypatch.setattr(frames, 'EphemerisCache', cache)
+    Frame.clear_registry()
+    yield tmp_path
+    Frame.clear_registry()
+
+
+@pytest.mark.solarsystem
+@pytest.mark.parametrize('objname', objnames)
+def test_frame_rotation(objname):
+    """Interpolated rotations agree with SPICE and batched rotations agree
+    with single rotations"""
+    obj = SSObject(objname)
+    modeltime = Time('2024-12-01')
+    runtime = (10*u.d).to(u.s)
+    frame = Frame(obj, f'{obj.iau_frame}', modeltime, runtime)
+    
+    rng = np.random.default_rng(0)
+    times = -rng.uniform(0, 1, 100)*runtime
+    X = rng.normal(0, 1, (100, 3))*obj.unit
+    V = rng.normal(0, 1, (100, 3))*u.km/u.s
+    
+    X_j2000, V_j2000 = frame.rotate(times, 'J2000', X, V)
+    assert X_j2000.unit == X.unit
+    assert np.allclose(X_j2000, frame.rotation(times, X, 'J2000'))
+    assert np.allclose(V_j2000, frame.to_j2000(times, V))
+    
+    # Rotations preserve lengths
+    assert np.allclose(np.linalg.norm(X_j2000, axis=1),
+                       np.linalg.norm(X, axis=1))
+    
+    kernels = SpiceKernels(objname)
+    ets = spice.str2et((modeltime + TimeDelta(times)).iso)
+    for i, et in enumerate(ets):
+        matrix = spice.pxform(obj.iau_frame, 'J2000', et)
+        assert np.allclose(X_j2000[i].value, matrix @ X[i].value, atol=1e-4)
+    kernels.unload()
+
+
+@pytest.mark.solarsystem
+def test_frame_registry(monkeypatch, cache_path):
+    """Rotations are computed once, only for the frames used, and are
+    reused from the cache in later processes"""
+    calls = []
+    def matrices(self, key):
+        calls.append(key)
+        angle = np.linspace(0, 1, len(self.times_delta))
+        return Rotation.from_rotvec(np.outer(angle, [0, 0, 1])).as_matrix()
+    monkeypatch.setattr(Frame, '_spice_matrices', matrices)
+    
+    mercury = copy.copy(SSObject('Mercury', 'kepler'))
+    mercury.ephemeris = 'spice'
+    modeltime = Time('2024-12-01')
+    runtime = 1000*u.s
+    
+    frame = Frame(mercury, mercury.iau_frame, modeltime, runtime)
+    X = np.array([[1., 0, 0]])
+    X_solar = frame.rotation(-1000*u.s, X, mercury.solar_frame)
+    assert calls == ['SOLAR']
+    
+    # Magnetic frames are only defined for Jupiter
+    assert np.allclose(frame.to_mag(-500*u.s, X), X)
+    assert calls == ['SOLAR']
+    
+    # Shared by other Frames with the same parameters
+    other = Frame(mercury, mercury.iau_frame, modeltime, runtime)
+    assert np.allclose(other.rotation(-1000*u.s, X, 'J2000'),
+                       [[1, 0, 0]])
+    assert np.allclose(other.to_solar(-1000*u.s, X), X_solar)
+    assert calls == ['SOLAR', 'J2000']
+    
+    # Read from the cache in a new process
+    Frame.clear_registry()
+    frame = Frame(mercury, mercury.iau_frame, modeltime, runtime)
+    assert np.allclose(frame.to_solar(-1000*u.s, X), X_solar)
+    assert calls == ['SOLAR', 'J2000']
+
+
+@pytest.mark.solarsystem
+def test_frame_threads(monkeypatch, cache_path):
+    """Rotations used for the first time in several threads are computed
+    once, with one thread at a time in SPICE"""
+    calls = []
+    running = []
+    def matrices(self, key):
+        running.append(key)
+        calls.append(len(running))
+        time.sleep(0.1)
+        running.remove(key)
+        angle = np.linspace(0, 1, len(self.times_delta))
+        return Rotation.from_rotvec(np.outer(angle, [0, 0, 1])).as_matrix()
+    monkeypatch.setattr(Frame, '_spice_matrices', matrices)
+    
+    mercury = copy.copy(SSObject('Mercury', 'kepler'))
+    mercury.ephemeris = 'spice'
+    frame = Frame(mercury, mercury.iau_frame, Time('2024-12-01'), 1000*u.s)
+    X = np.array([[1., 0, 0]])
+    
+    results = [None]*8
+    def rotate(i):
+        key = mercury.solar_frame if i % 2 == 0 else 'J2000'
+        results[i] = frame.rotation(-500*u.s, X, key), key
+    threads = [threading.Thread(target=rotate, args=(i, ))
+               for i in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert calls == [1, 1]
+    assert len(list(cache_path.glob('*.h5'))) == 2
+    assert len(list(cache_path.glob('*.tmp'))) == 0
+    for result, key in results:
+        assert np.allclose(result, frame.rotation(-500*u.s, X, key))
@@ -0,0 +1,111 @@
+import numpy as np
+import astropy.units as u
+import pytest
+from nexoclom2.initial_state.geometry.GeometryNoTime import GeometryNoTime
+from nexoclom2.solarsystem import SSObject, SSPosition, kepler
+from nexoclom2.solarsystem.frames import Frame
+from nexoclom2.solarsystem.find_modeltime import find_modeltime
+
+
+@pytest.mark.solarsystem
+def test_kepler_constants():
+    """Objects are set up from PlanetaryConstants.csv without SPICE"""
+    mercury = SSObject('Mercury', 'kepler')
+    assert mercury.ephemeris == 'kepler'
+    assert mercury.radius == 2440.53*u.km
+    assert u.isclose(mercury.a, 0.387098*u.au)
+    assert mercury.e == 0.205630
+    assert u.isclose(mercury.mass, 0.330103e24*u.kg)
+    assert SSObject('Mercury', 'kepler') is not mercury
+
+    enceladus = SSObject('Enceladus', 'kepler')
+    assert enceladus.type == 'Moon'
+    assert enceladus.e == 0
+    assert u.isclose(enceladus.a.to(u.km), 238037*u.km)
+
+    with pytest.raises(ValueError):
+        SSObject('Mercury', 'horizons')
+
+
+@pytest.mark.solarsystem
+@pytest.mark.parametrize('center', ['Mercury', 'Sun'])
+def test_kepler_planet(center):
+    """Positions, velocities, and angles of a planet at a given TAA"""
+    geometry = GeometryNoTime({'center': center, 'startpoint': 'Mercury',
+                               'taa': '100', 'ephemeris': 'kepler'})
+    geometry.modeltime = find_modeltime(geometry)
+    mercury = SSObject('Mercury', 'kepler')
+    position = SSPosition(mercury, geometry, 20*u.d)
+
+    assert u.isclose(position.taa(0*u.s), 100*u.deg)
+    r_sun = mercury.a*(1 - mercury.e**2)/(1 + mercury.e*np.cos(100*u.deg))
+    assert u.isclose(position.r_sun(0*u.s), r_sun)
+    assert position.drdt_sun(0*u.s) > 0
+    assert position.taa(-10*u.d) < position.taa(0*u.s)
+
+    # Velocities are the time derivatives of the positions
+    t = np.linspace(-19, -1, 10)*u.d
+    dt = 1*u.s
+    if center == 'Sun':
+        velocity = (position.X(t + dt) - position.X(t - dt))/(2*dt)
+        assert u.allclose(position.V(t), velocity, rtol=1e-6)
+        sun_dir = -position.X(t)/position.r(t)[:,np.newaxis]
+        assert np.allclose(position.sun_dir(t), sun_dir, atol=1e-3)
+    else:
+        # Mercury is at the center of its solar frame with the Sun along +x
+        assert np.allclose(position.X(t).value, 0)
+        assert np.allclose(position.sun_dir(t), [1, 0, 0], atol=1e-6)
+
+    # Mercury's axis is not tilted, so the sub-solar longitude changes with
+    # the rotation and the true anomaly
+    rotation = (2*np.pi*u.rad*t/mercury.rotperiod).to_value(u.rad)
+    lon = np.unwrap(position.subsolar_longitude(t).value)
+    taa = np.unwrap(position.taa(t).value)
+    assert np.allclose(np.diff(lon), np.diff(rotation - taa), atol=1e-4)
+    assert np.allclose(position.subsolar_latitude(t).value, 0)
+
+
+@pytest.mark.solarsystem
+def test_kepler_moon():
+    """Orbital phase of a moon at a given phi"""
+    geometry = GeometryNoTime({'center': 'Saturn', 'startpoint': 'Enceladus',
+                               'include': 'Saturn, Enceladus', 'taa': '45',
+                               'phi': '90', 'ephemeris': 'kepler'})
+    geometry.modeltime = find_modeltime(geometry)
+    enceladus = SSObject('Enceladus', 'kepler')
+    position = SSPosition(enceladus, geometry, 1*u.d)
+
+    assert u.isclose(position.phi(0*u.s), 90*u.deg)
+    assert u.isclose(position.taa(0*u.s), 45*u.deg, atol=0.1*u.deg)
+
+    # At phi = 90º the moon is on the -y axis of the planet's solar frame
+    assert u.allclose(position.X(0*u.s), [[0, -1, 0]]*enceladus.a,
+                      atol=1e-6*enceladus.a)
+    speed = 2*np.pi*enceladus.a/enceladus.orbperiod
+    assert u.isclose(position.v(0*u.s), speed, rtol=0.01)
+
+
+@pytest.mark.solarsystem
+def test_kepler_frame():
+    """Rotations are consistent with the Keplerian ephemeris"""
+    geometry = GeometryNoTime({'center': 'Mercury', 'taa': '30',
+                               'ephemeris': 'kepler'})
+    modeltime = find_modeltime(geometry)
+    mercury = SSObject('Mercury', 'kepler')
+    runtime = 10*u.d
+    frame = Frame(mercury, mercury.solar_frame, modeltime, runtime)
+
+    times = np.linspace(-runtime, 0*u.s, 7)
+    t = kepler.epoch_seconds(modeltime) + times.to_value(u.s)
+    xaxis = np.tile([1., 0., 0.], (len(times), 1))
+
+    # The x-axis of the solar frame points toward the Sun
+    sun = -kepler.state(mercury, t)[:,:3]
+    sun /= np.linalg.norm(sun, axis=1)[:,np.newaxis]
+    assert np.allclose(frame.rotation(times, xaxis, 'J2000'), sun, atol=1e-6)
+
+    # The Sun is at the sub-solar point in the IAU frame
+    lon, lat = kepler.subsolar_point(mercury, t)
+    sun_iau = frame.to_iau(times, xaxis)
+    assert np.allclose(sun_iau[:,0], np.cos(lon)*np.cos(lat), atol=1e-6)
+    assert np.allclose(sun_iau[:,1], -np.sin(lon)*np.cos(lat), atol=1e-6)
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from nexoclom2.solarsystem import kernel_store
+from nexoclom2.utilities.exceptions import KernelError
+
+
+@pytest.mark.solarsystem
+def test_kernel_store(tmp_path, monkeypatch):
+    """Kernels are copied from a local source and resolved without network"""
+    source = tmp_path/'source'
+    kernelpath = tmp_path/'spice_kernels'
+    source.mkdir()
+    for name in ('all.tls', 'jup.bsp', 'sat.bsp'):
+        (source/name).write_bytes(name.encode()*100)
+    
+    manifest = tmp_path/'manifest.json'
+    manifest.write_text(json.dumps({'kernels': [
+        {'name': 'all.tls', 'url': None, 'objects': 'all', 'sha256': None},
+        {'name': 'jup.bsp', 'url': None, 'objects': ['Jupiter', 'Io'],
+         'sha256': kernel_store.checksum(source/'jup.bsp')},
+        {'name': 'sat.bsp', 'url': None, 'objects': ['Saturn'],
+         'sha256': '0'*64}]}))
+    monkeypatch.setattr(kernel_store, 'MANIFEST', str(manifest))
+    monkeypatch.setattr(kernel_store, 'kernel_path', lambda: str(kernelpath))
+    
+    # Missing kernels fail immediately
+    with pytest.raises(KernelError):
+        kernel_store.resolve('Io')
+    
+    # Kernels without a checksum in the manifest are only taken on request
+    with pytest.raises(KernelError):
+        kernel_store.prefetch('Io', source=str(source))
+    assert not os.path.exists(kernelpath/'all.tls')
+    assert kernel_store.prefetch('Io', source=str(source),
+                                 unpinned=True) == ['all.tls', 'jup.bsp']
+    assert kernel_store.prefetch('Io', source=str(source)) == []
+    kernels = kernel_store.resolve('Io')
+    assert [os.path.basename(k) for k in kernels[:-1]] == ['all.tls',
+                                                           'jup.bsp']
+    assert os.path.basename(kernels[-1]) == 'nexoclom_frames.tf'
+    assert kernel_store.verify('Io') == {}
+    
+    # Checksums in the manifest are enforced
+    with pytest.raises(KernelError):
+        kernel_store.prefetch('Saturn', source=str(source))
+    assert not os.path.exists(kernelpath/'sat.bsp')
+    
+    # Changed kernels are detected
+    (kernelpath/'jup.bsp').write_bytes(b'changed')
+    with pytest.raises(KernelError):
+        kernel_store.resolve('Io')
+    assert kernel_store.verify('Io') == {'jup.bsp': 'checksum does not match'}
+    
+    # ... and are not accepted again by prefetch
+    with pytest.raises(KernelError):
+        kernel_store.prefetch('Io', source=str(source))
+    assert kernel_store.prefetch('Io', source=str(source),
+                                 overwrite=True, unpinned=True) == [
+        'all.tls', 'jup.bsp']
+    assert len(kernel_store.resolve('Io')) == 3
+
+
+@pytest.mark.solarsystem
+def test_kernel_store_existing(tmp_path, monkeypatch):
+    """Kernels already in the kernel directory are only used after prefetch
+    has checked them, and any leapseconds kernel can be used"""
+    kernelpath = tmp_path/'spice_kernels'
+    kernelpath.mkdir()
+    (kernelpath/'naif0011.tls').write_bytes(b'leapseconds')
+    (kernelpath/'jup.bsp').write_bytes(b'jupiter')
+    
+    manifest = tmp_path/'manifest.json'
+    manifest.write_text(json.dumps({'kernels': [
+        {'name': 'naif0012.tls', 'url': None, 'objects': 'all',
+         'sha256': '1'*64},
+        {'name': 'jup.bsp', 'url': None, 'objects': ['Io'],
+         'sha256': kernel_store.checksum(kernelpath/'jup.bsp')}]}))
+    monkeypatch.setattr(kernel_store, 'MANIFEST', str(manifest))
+    monkeypatch.setattr(kernel_store, 'kernel_path', lambda: str(kernelpath))
+    
+    with pytest.raises(KernelError):
+        kernel_store.resolve('Io')
+    assert kernel_store.prefetch('Io') == ['naif0011.tls', 'jup.bsp']
+    kernels = kernel_store.resolve('Io')
+    assert [os.path.basename(k) for k in kernels[:-1]] == ['naif0011.tls',
+                                                           'jup.bsp']
+    assert kernel_store.verify('Io') == {}
+    
+    # A kernel that does not match the manifest is never used
+    (kernelpath/'jup.bsp').write_bytes(b'saturn')
+    with pytest.raises(KernelError):
+        kernel_store.prefetch('Io')
+    with pytest.raises(KernelError):
+        kernel_store.resolve('Io')
+    
+    # pin writes the checksums into the manifest
+    assert kernel_store.pin('Io') == {
+        'jup.bsp': kernel_store.checksum(kernelpath/'jup.bsp')}
+    assert kernel_store.prefetch('Io') == ['jup.bsp']
+
+
+@pytest.mark.solarsystem
+def test_kernel_store_no_requests():
+    """requests is only imported when a kernel is downloaded"""
+    code = ('import sys; import nexoclom2.solarsystem.kernel_store; '
+            'print("requests" in sys.modules)')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, check=True)
+    assert result.stdout.strip() == 'False'
@@ -0,0 +1,36 @@
+import os
+import spiceypy as spice
+import pytest
+from nexoclom2 import path
+from nexoclom2.solarsystem.load_kernels import KernelManager
+
+
+@pytest.mark.solarsystem
+def test_KernelManager():
+    """Kernels are loaded once and unloaded only when asked"""
+    kernel = os.path.join(path, 'data', 'nexoclom_frames.tf')
+    manager = KernelManager()
+    n_loaded = spice.ktotal('ALL')
+    
+    first = manager.acquire_files([kernel])
+    second = manager.acquire_files([kernel])
+    assert spice.ktotal('ALL') == n_loaded + 1
+    assert manager.stats['requests'] == 2
+    assert manager.stats['loads'] == 1
+    assert manager.refcount[kernel] == 2
+    
+    # Released kernels stay loaded
+    manager.release(first)
+    manager.release(second)
+    assert manager.refcount[kernel] == 0
+    assert spice.ktotal('ALL') == n_loaded + 1
+    manager.acquire_files([kernel])
+    assert manager.stats['loads'] == 1
+    
+    # Kernels in use are only unloaded with force=True
+    manager.unload()
+    assert spice.ktotal('ALL') == n_loaded + 1
+    manager.unload(force=True)
+    assert spice.ktotal('ALL') == n_loaded
+    assert manager.stats['unloads'] == 1
+    assert manager.loaded == []
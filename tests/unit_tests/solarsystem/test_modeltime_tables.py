@@ -0,0 +1,108 @@
+import numpy as np
+import h5py
+import astropy.units as u
+import pytest
+from nexoclom2.solarsystem import modeltime_tables
+from nexoclom2.solarsystem.ephemeris_cache import EphemerisCache
+from nexoclom2.solarsystem.modeltime_tables import (REFERENCE_EPOCH,
+                                                    write_taa_table,
+                                                    write_phase_grid,
+                                                    build_modeltime_tables,
+                                                    taa_time, phase_time)
+
+
+@pytest.fixture
+def tablefile(tmp_path, monkeypatch):
+    """Tables with a made up planet orbit and moon grid"""
+    filename = tmp_path/'modeltime_tables.hdf5'
+    monkeypatch.setattr(modeltime_tables, 'TABLEFILE', str(filename))
+    monkeypatch.setattr(modeltime_tables, 'kernel_path',
+                        lambda: str(tmp_path/'spice_kernels'))
+    monkeypatch.setattr(modeltime_tables, '_tables', {})
+
+    with h5py.File(filename, 'w') as store:
+        # TAA from 300º to 660º over 100 days
+        time = np.linspace(0, 100, 101)*86400.
+        write_taa_table(store, 'Mercury', np.linspace(300, 660, 101), time)
+
+        phi = np.arange(0, 360, 10) + 5.
+        cml = np.arange(0, 360, 10) + 5.
+        grid = np.arange(36*36, dtype=float).reshape(36, 36)
+        grid[0, 0] = np.nan
+        write_phase_grid(store, 'Io', phi, cml, grid)
+
+    return filename
+
+
+@pytest.mark.solarsystem
+def test_taa_time(tablefile):
+    """Times are interpolated in the TAA table"""
+    assert np.isclose((taa_time('Mercury', 300*u.deg) - REFERENCE_EPOCH).to(u.d),
+                      0*u.d)
+    assert np.isclose((taa_time('Mercury', 30*u.deg) - REFERENCE_EPOCH).to(u.d),
+                      25*u.d)
+    assert np.isclose((taa_time('Mercury', 390*u.deg) - REFERENCE_EPOCH).to(u.d),
+                      25*u.d)
+    assert taa_time('Mercury', 120*u.deg) == taa_time('Mercury', 120*u.deg)
+    assert ('taa', 'Mercury') in modeltime_tables._tables
+
+
+@pytest.mark.solarsystem
+def test_phase_time(tablefile):
+    """The time of the nearest cell that was reached is used"""
+    def seconds(phi, cml):
+        return (phase_time('Io', phi*u.deg, cml*u.deg) -
+                REFERENCE_EPOCH).to_value(u.s)
+
+    assert np.isclose(seconds(15, 25), 1*36 + 2)
+    assert np.isclose(seconds(359, 26), 35*36 + 2)
+    # Cell (0, 0) was not reached, so a neighboring cell is used
+    assert np.isclose(seconds(5, 5), 1) or np.isclose(seconds(5, 5), 36)
+
+    with pytest.raises(FileNotFoundError):
+        phase_time('Europa', 0*u.deg, 0*u.deg)
+
+
+@pytest.mark.solarsystem
+def test_taa_time_cached(tablefile, tmp_path, monkeypatch):
+    """Planets not in the file are computed once and saved in the cache"""
+    calls = []
+    def build(planet):
+        calls.append(planet)
+        return np.linspace(10, 370, 101), np.linspace(0, 100, 101)*86400.
+    monkeypatch.setattr(modeltime_tables, 'build_taa_table', build)
+    monkeypatch.setattr(modeltime_tables, 'EphemerisCache',
+                        lambda: EphemerisCache(path=tmp_path/'cache'))
+
+    t0 = taa_time('Venus', 100*u.deg)
+    assert np.isclose((t0 - REFERENCE_EPOCH).to(u.d), 25*u.d)
+    assert calls == ['Venus']
+
+    # A new process reads the table from the cache
+    monkeypatch.setattr(modeltime_tables, '_tables', {})
+    assert taa_time('Venus', 100*u.deg) == t0
+    assert calls == ['Venus']
+
+
+@pytest.mark.solarsystem
+def test_kernel_path_tables(tablefile, tmp_path, monkeypatch):
+    """Tables missing from the package are computed into the kernel
+    directory once and read from there"""
+    calls = []
+    def build(moon, **kwargs):
+        calls.append(moon)
+        grid = np.arange(36*36, dtype=float).reshape(36, 36) + 1000.
+        return np.arange(0, 360, 10) + 5., np.arange(0, 360, 10) + 5., grid
+    monkeypatch.setattr(modeltime_tables, 'build_phase_grid', build)
+
+    kernelfile = tmp_path/'spice_kernels'/'modeltime_tables.hdf5'
+    kernelfile.parent.mkdir()
+    build_modeltime_tables([], ['Io', 'Europa'], str(kernelfile))
+    build_modeltime_tables([], ['Io', 'Europa'], str(kernelfile))
+    assert calls == ['Io', 'Europa']
+
+    # Tables in the package come first
+    assert np.isclose((phase_time('Io', 15*u.deg, 25*u.deg) -
+                       REFERENCE_EPOCH).to_value(u.s), 1*36 + 2)
+    assert np.isclose((phase_time('Europa', 15*u.deg, 25*u.deg) -
+                       REFERENCE_EPOCH).to_value(u.s), 1000 + 1*36 + 2)
@@ -0,0 +1,35 @@
+import sys
+import subprocess
+import pytest
+
+
+# Seconds allowed for import nexoclom2. Importing everything takes ~2 s.
+IMPORT_BUDGET = 0.5
+
+
+@pytest.mark.utilities
+def test_import_time():
+    """import nexoclom2 is fast and does not import the heavy dependencies"""
+    code = ('import sys, time\n'
+            't0 = time.perf_counter()\n'
+            'import nexoclom2\n'
+            'from nexoclom2 import path\n'
+            'print(time.perf_counter() - t0)\n'
+            'print(",".join(m for m in ("numpy", "astropy", "pandas", "scipy", '
+            '"h5py", "spiceypy", "tinydb") if m in sys.modules))\n')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, check=True)
+    elapsed, modules = result.stdout.split('\n')[:2]
+    assert float(elapsed) < IMPORT_BUDGET
+    assert modules == ''
+
+
+@pytest.mark.utilities
+def test_lazy_attributes():
+    import nexoclom2
+    from nexoclom2 import Input, Output, SSObject
+    from nexoclom2.initial_state.Input import Input as Input_
+    assert Input is Input_
+    assert 'Output' in dir(nexoclom2)
+    with pytest.raises(AttributeError):
+        nexoclom2.not_an_attribute